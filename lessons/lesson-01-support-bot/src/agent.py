@@ -89,7 +89,7 @@ Always be helpful and maintain a positive tone.""",
         return _agent
 
 
-def process_ticket_ai(ticket_id: str, question: str) -> dict:
+async def process_ticket_ai(ticket_id: str, question: str) -> dict:
     """
     Process a support ticket using AI-powered agent.
     Uses Microsoft Agent Framework with GitHub Models.
@@ -104,8 +104,8 @@ def process_ticket_ai(ticket_id: str, question: str) -> dict:
     start_time = time.time()
     
     try:
-        # Run the async agent in sync context
-        answer = asyncio.run(run_agent(question))
+        # Await the shared agent directly on the server's event loop
+        answer = await run_agent(question)
         response_time = time.time() - start_time
         
         print(f"[AI Agent] Ticket {ticket_id} processed in {response_time:.2f}s")
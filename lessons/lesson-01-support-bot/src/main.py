@@ -76,7 +76,7 @@ def health_check():
 
 
 @app.post("/ticket", response_model=TicketResponse)
-def create_ticket(request: TicketRequest):
+async def create_ticket(request: TicketRequest):
     """
     Process a support ticket.
     
@@ -93,7 +93,7 @@ def create_ticket(request: TicketRequest):
     try:
         if ai_enabled:
             # AI-powered processing
-            return process_ticket_ai(ticket_id, request.question)
+            return await process_ticket_ai(ticket_id, request.question)
         else:
             # Manual rule-based processing
             return process_ticket_manual(ticket_id, request.question)
@@ -7,99 +7,64 @@ import asyncio
 import time
 import os
 import json
-from typing import Optional, List, Dict
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from pgvector.psycopg2 import register_vector
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional, List, Dict
 from fastapi import HTTPException
 from agent_framework import ChatAgent
 from agent_framework.openai import OpenAIChatClient
-from openai import OpenAI
+from .embeddings import get_embedding_client
+from .embedding_cache import get_embedding_cache
+from .reduction import get_query_reducer, reduced_model_id
+from .vector_store import get_vector_store
+from .answer_cache import answer_cache_enabled, lookup_answer, store_answer
 
 # Global agent instance
 _agent: Optional[ChatAgent] = None
 _agent_lock = asyncio.Lock()
-_db_connection = None
 
-
-def get_db_connection():
-    """Get or create database connection."""
-    global _db_connection
-    
-    if _db_connection is None or _db_connection.closed:
-        _db_connection = psycopg2.connect(
-            host=os.getenv("POSTGRES_HOST", "localhost"),
-            port=os.getenv("POSTGRES_PORT", "5432"),
-            database=os.getenv("POSTGRES_DB", "techflow"),
-            user=os.getenv("POSTGRES_USER", "techflow_user"),
-            password=os.getenv("POSTGRES_PASSWORD", "techflow_pass_change_in_production")
-        )
-        register_vector(_db_connection)
-    
-    return _db_connection
+# Search results recorded by tool calls during the current request
+_retrievals: ContextVar[Optional[List[Dict]]] = ContextVar("retrievals", default=None)
 
 
 def generate_embedding(text: str) -> List[float]:
     """
     Generate embedding for a query using the same provider as indexing.
     
+    With EMBEDDING_REDUCTION set, the query goes through the same
+    truncation or PCA projection as the stored chunks.
+    
     Args:
         text: Text to embed
         
     Returns:
         Embedding vector
     """
-    embedding_provider = os.getenv("EMBEDDING_PROVIDER", "github").lower()
+    # Shared client keeps HTTP connections alive between tool calls
+    client = get_embedding_client()
     
-    if embedding_provider == "github":
-        # Use GitHub Models for embeddings
-        client = OpenAI(
-            base_url="https://models.inference.ai.azure.com",
-            api_key=os.getenv("GITHUB_TOKEN")
-        )
-        response = client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
-        return response.data[0].embedding
-    
-    elif embedding_provider == "ollama":
-        import ollama
-        ollama_host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
-        ollama_model = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
-        
-        # Parse host to extract hostname without http://
-        import urllib.parse
-        parsed = urllib.parse.urlparse(ollama_host)
-        host = parsed.netloc or parsed.path
-        
-        response = ollama.Client(host=f"http://{host}").embeddings(
-            model=ollama_model,
-            prompt=text
-        )
-        return response["embedding"]
-    
-    elif embedding_provider == "lmstudio":
-        lmstudio_url = os.getenv("LMSTUDIO_URL", "http://localhost:1234/v1")
-        lmstudio_model = os.getenv("LMSTUDIO_MODEL", "text-embedding-nomic-embed-text-v2")
-        
-        client = OpenAI(
-            base_url=lmstudio_url,
-            api_key="lm-studio"
-        )
-        response = client.embeddings.create(
-            input=text,
-            model=lmstudio_model
-        )
-        return response.data[0].embedding
-    
-    else:
-        raise ValueError(f"Unsupported embedding provider: {embedding_provider}")
+    # Repeated search strings are served from the local LRU or Redis
+    # (full vectors, so a new projection doesn't invalidate them)
+    embedding = get_embedding_cache().get_or_compute(
+        client.provider, client.model, text, client.embed_one
+    )
+    reducer = get_query_reducer(client.provider, client.model)
+    return reducer.reduce_one(embedding) if reducer is not None else embedding
+
+
+def query_embedding_model() -> str:
+    """Id of the vectors generate_embedding returns (provider, model and reduction)."""
+    client = get_embedding_client()
+    return reduced_model_id(f"{client.provider}:{client.model}", get_query_reducer(client.provider, client.model))
 
 
 def search_knowledge_base(query: str, top_k: int = 3) -> List[Dict]:
     """
-    Search the knowledge base using vector similarity.
+    Search the knowledge base.
+    
+    The backend is chosen with VECTOR_BACKEND: pgvector (default), qdrant, or
+    memory (in-process NumPy index). With pgvector, SEARCH_MODE selects pure
+    vector search ("vector") or hybrid lexical + vector search with reciprocal
+    rank fusion ("hybrid", the default).
     
     Args:
         query: User's question
@@ -108,30 +73,45 @@ def search_knowledge_base(query: str, top_k: int = 3) -> List[Dict]:
     Returns:
         List of relevant knowledge chunks with metadata
     """
-    conn = get_db_connection()
-    
-    # Generate embedding for the query
     query_embedding = generate_embedding(query)
     
-    # Search for similar chunks using cosine similarity
-    with conn.cursor(cursor_factory=RealDictCursor) as cur:
-        cur.execute("""
-            SELECT 
-                c.content,
-                c.metadata,
-                d.title,
-                d.filename,
-                1 - (c.embedding <=> %s::vector) as similarity
-            FROM kb_chunks c
-            JOIN kb_documents d ON c.document_id = d.id
-            WHERE c.embedding IS NOT NULL
-            ORDER BY c.embedding <=> %s::vector
-            LIMIT %s
-        """, (query_embedding, query_embedding, top_k))
+    return get_vector_store().search(query_embedding, top_k, query_text=query)
+
+
+def _record_retrieval(query: str, results: List[Dict]):
+    """Remember what a tool call retrieved so the request can cite it."""
+    retrievals = _retrievals.get()
+    if retrievals is not None:
+        retrievals.append({"query": query, "results": results})
+
+
+def collect_sources(retrievals: List[Dict]) -> List[Dict]:
+    """
+    Build the source list from every chunk retrieved during a request.
+    
+    Chunks returned by more than one search are listed once, with their best score.
+    
+    Args:
+        retrievals: Recorded tool call results
         
-        results = cur.fetchall()
+    Returns:
+        Source references sorted by similarity
+    """
+    best: Dict[tuple, Dict] = {}
+    for retrieval in retrievals:
+        for chunk in retrieval["results"]:
+            key = (chunk["filename"], chunk["chunk_index"])
+            similarity = round(chunk["similarity"], 3)
+            if key not in best or similarity > best[key]["similarity"]:
+                best[key] = {
+                    "title": chunk["title"],
+                    "filename": chunk["filename"],
+                    "similarity": similarity,
+                    # Other documents with the same (deduplicated) text
+                    **({"also_in": list(chunk["also_in"])} if chunk.get("also_in") else {})
+                }
     
-    return [dict(row) for row in results]
+    return sorted(best.values(), key=lambda source: source["similarity"], reverse=True)
 
 
 async def search_knowledge_base_tool(query: str, top_k: int = 3) -> str:
@@ -159,7 +139,9 @@ async def search_knowledge_base_tool(query: str, top_k: int = 3) -> str:
     top_k = max(1, min(top_k, 5))
     
     try:
-        results = search_knowledge_base(query, top_k)
+        # Embedding and DB calls are blocking - keep them off the event loop
+        results = await asyncio.to_thread(search_knowledge_base, query, top_k)
+        _record_retrieval(query, results)
         
         if not results:
             return json.dumps({
@@ -175,7 +157,9 @@ async def search_knowledge_base_tool(query: str, top_k: int = 3) -> str:
                     "content": chunk["content"],
                     "title": chunk["title"],
                     "source_file": chunk["filename"],
-                    "relevance_score": round(chunk["similarity"], 3)
+                    "relevance_score": round(chunk["similarity"], 3),
+                    # Other articles containing the same (deduplicated) text
+                    **({"also_in": chunk["also_in"]} if chunk.get("also_in") else {})
                 }
                 for chunk in results
             ],
@@ -272,7 +256,7 @@ Always maintain a professional, friendly tone and format your answers clearly.""
         return _agent
 
 
-async def run_agent_with_tools(question: str) -> tuple[str, List[Dict]]:
+async def run_agent_with_tools(question: str) -> tuple[str, List[Dict], List[Dict]]:
     """
     Run the agent with tool-based RAG - agent decides when to search.
 
@@ -280,12 +264,18 @@ async def run_agent_with_tools(question: str) -> tuple[str, List[Dict]]:
         question: User's question
 
     Returns:
-        Tuple of (answer text, list of tool calls made)
+        Tuple of (answer text, list of tool calls made, search results retrieved)
     """
     agent = await get_agent()
 
-    # Simply ask the question - agent will use tools as needed
-    response = await agent.run(question)
+    # Tool calls made while the agent runs append their results here
+    token = _retrievals.set([])
+    try:
+        # Simply ask the question - agent will use tools as needed
+        response = await agent.run(question)
+        retrievals = _retrievals.get()
+    finally:
+        _retrievals.reset(token)
 
     # Extract the answer text
     if hasattr(response, 'text'):
@@ -307,10 +297,61 @@ async def run_agent_with_tools(question: str) -> tuple[str, List[Dict]]:
                             "arguments": json.loads(tc.function.arguments) if isinstance(tc.function.arguments, str) else tc.function.arguments
                         })
 
-    return answer, tool_calls
+    return answer, tool_calls, retrievals
+
+
+async def check_answer_cache(question: str) -> tuple[Optional[List[float]], Optional[Dict]]:
+    """
+    Look up a cached answer for a paraphrase of the question.
+
+    Args:
+        question: The user's question
+
+    Returns:
+        Tuple of (question embedding, cached entry or None). The embedding is
+        None when the cache is disabled or unavailable.
+    """
+    if not answer_cache_enabled():
+        return None, None
 
+    try:
+        embedding = await asyncio.to_thread(generate_embedding, question)
+        embedding_model = await asyncio.to_thread(query_embedding_model)
+        cached = await asyncio.to_thread(lookup_answer, embedding, embedding_model)
+        return embedding, cached
+    except Exception as e:
+        # A broken cache must never fail the request
+        print(f"[WARN] Answer cache lookup failed: {str(e)}")
+        return None, None
+
+
+async def save_answer(
+    question: str,
+    question_embedding: Optional[List[float]],
+    answer: str,
+    sources: List[Dict],
+    search_queries: List[str]
+):
+    """Store a freshly generated answer in the answer cache."""
+    if question_embedding is None:
+        return
 
-def process_faq_ai(question: str) -> dict:
+    try:
+        embedding_model = await asyncio.to_thread(query_embedding_model)
+        await asyncio.to_thread(
+            store_answer,
+            question,
+            question_embedding,
+            embedding_model,
+            answer,
+            sources,
+            search_queries
+        )
+    except Exception as e:
+        print(f"[WARN] Failed to cache answer: {str(e)}")
+
+
+async def process_faq_ai(question: str) -> dict:
     """
     Process an FAQ question using tool-based RAG AI agent.
 
@@ -325,51 +366,169 @@ def process_faq_ai(question: str) -> dict:
     start_time = time.time()
 
     try:
+        # Paraphrases of recently answered questions skip the agent entirely
+        question_embedding, cached = await check_answer_cache(question)
+        if cached:
+            total_time = time.time() - start_time
+            print(f"[AI-RAG-TOOL] Answer cache hit (similarity {cached['similarity']:.3f}) in {total_time:.2f}s")
+            return {
+                "question": question,
+                "answer": cached["answer"],
+                "mode": "ai-rag-tool",
+                "sources": cached["sources"],
+                "tool_calls": 0,
+                "search_queries": cached["search_queries"] or [],
+                "total_time": round(total_time, 3),
+                "cache_hit": True
+            }
+
         # Let the agent handle the question using tools
-        answer, tool_calls = asyncio.run(run_agent_with_tools(question))
+        answer, tool_calls, retrievals = await run_agent_with_tools(question)
 
         total_time = time.time() - start_time
 
-        # Extract sources from tool calls
-        sources = []
-        search_queries = []
+        # Sources come from what the search tool actually returned - no re-query
+        search_queries = [retrieval["query"] for retrieval in retrievals]
+        sources = collect_sources(retrievals)
 
-        for tc in tool_calls:
-            if tc["tool"] == "search_knowledge_base_tool":
-                query = tc["arguments"].get("query", "")
-                search_queries.append(query)
-
-        # For source tracking, do a quick search with the last query used
-        # (in a production system, you'd capture this from tool results)
-        if search_queries:
-            last_search = search_knowledge_base(search_queries[-1], top_k=3)
-            sources = [
-                {
-                    "title": chunk["title"],
-                    "filename": chunk["filename"],
-                    "similarity": round(chunk["similarity"], 3)
-                }
-                for chunk in last_search
-            ]
+        # Failed searches are not recorded, so fall back to the message history count
+        tool_call_count = max(len(tool_calls), len(retrievals))
 
         print(f"[AI-RAG-TOOL] Question processed in {total_time:.2f}s")
-        print(f"[AI-RAG-TOOL] Tool calls: {len(tool_calls)}")
-        for i, tc in enumerate(tool_calls, 1):
-            if 'arguments' in tc:
-                print(f"  {i}. {tc['tool']}({tc['arguments']})")
-            else:
-                print(f"  {i}. {tc['tool']}")
+        print(f"[AI-RAG-TOOL] Tool calls: {tool_call_count}")
+        for i, query in enumerate(search_queries, 1):
+            print(f"  {i}. search_knowledge_base_tool({query!r})")
+
+        await save_answer(question, question_embedding, answer, sources, search_queries)
 
         return {
             "question": question,
             "answer": answer,
             "mode": "ai-rag-tool",
             "sources": sources,
-            "tool_calls": len(tool_calls),
+            "tool_calls": tool_call_count,
             "search_queries": search_queries,
-            "total_time": round(total_time, 3)
+            "total_time": round(total_time, 3),
+            "cache_hit": False
         }
 
     except Exception as e:
         print(f"[ERROR] AI processing failed: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI processing error: {str(e)}")
+
+
+async def stream_faq_ai(question: str) -> AsyncIterator[Dict]:
+    """
+    Answer an FAQ question incrementally as the agent produces it.
+
+    Yields events as they happen:
+    - tool_call: the agent started a knowledge base search
+    - search: a search finished (query and retrieved sources)
+    - token: a fragment of the answer text
+    - metrics: final timings, search queries, all sources and cache_hit
+    - error: processing failed (always the last event)
+
+    Args:
+        question: The user's question
+
+    Yields:
+        Event dicts with "event" and "data" keys
+    """
+    start_time = time.time()
+    first_token_time = None
+    tool_call_count = 0
+    reported = 0
+
+    token = _retrievals.set([])
+    retrievals = _retrievals.get()
+
+    def new_searches():
+        nonlocal reported
+        events = []
+        for retrieval in retrievals[reported:]:
+            events.append({
+                "event": "search",
+                "data": {
+                    "query": retrieval["query"],
+                    "sources": collect_sources([retrieval])
+                }
+            })
+        reported = len(retrievals)
+        return events
+
+    try:
+        question_embedding, cached = await check_answer_cache(question)
+        if cached:
+            yield {"event": "token", "data": {"text": cached["answer"]}}
+            total_time = time.time() - start_time
+            yield {
+                "event": "metrics",
+                "data": {
+                    "mode": "ai-rag-tool",
+                    "tool_calls": 0,
+                    "search_queries": cached["search_queries"] or [],
+                    "sources": cached["sources"],
+                    "time_to_first_token": round(total_time, 3),
+                    "total_time": round(total_time, 3),
+                    "cache_hit": True
+                }
+            }
+            return
+
+        agent = await get_agent()
+        answer_parts = []
+
+        async for update in agent.run_stream(question):
+            # Tool results land in the request context between updates
+            for event in new_searches():
+                yield event
+
+            for content in getattr(update, "contents", None) or []:
+                # Streamed function calls arrive in fragments; only the first has a name
+                if getattr(content, "type", None) == "function_call" and getattr(content, "name", None):
+                    tool_call_count += 1
+                    yield {"event": "tool_call", "data": {"tool": content.name}}
+
+            text = getattr(update, "text", None)
+            if text:
+                if first_token_time is None:
+                    first_token_time = time.time() - start_time
+                answer_parts.append(text)
+                yield {"event": "token", "data": {"text": text}}
+
+        for event in new_searches():
+            yield event
+
+        total_time = time.time() - start_time
+        print(f"[AI-RAG-TOOL] Streamed answer in {total_time:.2f}s (first token {first_token_time or 0:.2f}s)")
+
+        search_queries = [retrieval["query"] for retrieval in retrievals]
+        sources = collect_sources(retrievals)
+
+        yield {
+            "event": "metrics",
+            "data": {
+                "mode": "ai-rag-tool",
+                "tool_calls": max(tool_call_count, len(retrievals)),
+                "search_queries": search_queries,
+                "sources": sources,
+                "time_to_first_token": round(first_token_time, 3) if first_token_time is not None else None,
+                "total_time": round(total_time, 3),
+                "cache_hit": False
+            }
+        }
+
+        # Cache after the client has the full answer so it adds no latency
+        await save_answer(question, question_embedding, "".join(answer_parts), sources, search_queries)
+
+    except Exception as e:
+        print(f"[ERROR] AI streaming failed: {str(e)}")
+        yield {"event": "error", "data": {"detail": f"AI processing error: {str(e)}"}}
+
+    finally:
+        try:
+            _retrievals.reset(token)
+        except ValueError:
+            # A generator abandoned by a disconnected client can be closed
+            # from another context; this request's context is discarded anyway
+            pass
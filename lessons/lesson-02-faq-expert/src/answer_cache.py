@@ -0,0 +1,144 @@
+"""
+Semantic answer cache for the FAQ Expert.
+Serves stored answers to paraphrased questions using pgvector similarity.
+"""
+
+import os
+from typing import Dict, List, Optional
+from psycopg2.extras import Json, RealDictCursor
+from .db import db_connection
+
+
+def answer_cache_enabled() -> bool:
+    """Check whether the answer cache is turned on (ANSWER_CACHE_ENABLED)."""
+    return os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+
+
+def lookup_answer(question_embedding: List[float], embedding_model: str) -> Optional[Dict]:
+    """
+    Find a cached answer for a question similar enough to the new one.
+
+    Args:
+        question_embedding: Embedding of the incoming question
+        embedding_model: Provider/model that produced the embedding
+
+    Returns:
+        Cached entry (question, answer, sources, search_queries, similarity) or None
+    """
+    threshold = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ttl = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+    with db_connection() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+        cur.execute("""
+            SELECT
+                id,
+                question,
+                answer,
+                sources,
+                search_queries,
+                1 - (embedding <=> %s::vector) as similarity
+            FROM kb_answer_cache
+            WHERE embedding_model = %s
+              AND created_at > NOW() - make_interval(secs => %s)
+            ORDER BY embedding <=> %s::vector
+            LIMIT 1
+        """, (question_embedding, embedding_model, ttl, question_embedding))
+        row = cur.fetchone()
+
+        if row is None or row["similarity"] < threshold:
+            return None
+
+        cur.execute(
+            "UPDATE kb_answer_cache SET hit_count = hit_count + 1, last_hit_at = NOW() WHERE id = %s",
+            (row["id"],)
+        )
+
+    return dict(row)
+
+
+def store_answer(
+    question: str,
+    question_embedding: List[float],
+    embedding_model: str,
+    answer: str,
+    sources: List[Dict],
+    search_queries: List[str]
+):
+    """
+    Cache an answer so paraphrases of the question can reuse it.
+
+    Answers without sources are not cached: they are usually "I couldn't find
+    that" replies that should be retried once the knowledge base changes.
+
+    Args:
+        question: Original question
+        question_embedding: Embedding of the question
+        embedding_model: Provider/model that produced the embedding
+        answer: Agent answer
+        sources: Sources cited by the answer
+        search_queries: Searches the agent made
+    """
+    if not sources:
+        return
+
+    # Chunks collapsed from other documents (also_in) carry their text too,
+    # so editing any of those files must invalidate the answer
+    cited_files = sorted({
+        filename
+        for source in sources
+        for filename in [source["filename"], *source.get("also_in", [])]
+    })
+    ttl = int(os.getenv("ANSWER_CACHE_TTL", "86400"))
+    max_entries = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+    with db_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO kb_answer_cache
+                (question, embedding, embedding_model, answer, sources, search_queries, cited_files)
+            VALUES (%s, %s::vector, %s, %s, %s, %s, %s)
+        """, (
+            question,
+            question_embedding,
+            embedding_model,
+            answer,
+            Json(sources),
+            Json(search_queries),
+            cited_files
+        ))
+
+        # Lookups scan the cache (the vector column is untyped, so it has no
+        # ANN index): keep it bounded by dropping expired and least recently
+        # used entries
+        cur.execute(
+            "DELETE FROM kb_answer_cache WHERE created_at <= NOW() - make_interval(secs => %s)",
+            (ttl,)
+        )
+        cur.execute("""
+            DELETE FROM kb_answer_cache
+            WHERE id IN (
+                SELECT id FROM kb_answer_cache
+                ORDER BY COALESCE(last_hit_at, created_at) DESC
+                OFFSET %s
+            )
+        """, (max_entries,))
+
+
+def invalidate_answers(cursor, filenames: List[str]) -> int:
+    """
+    Drop cached answers that cite any of the given knowledge base files.
+
+    Runs on the caller's cursor so the indexer can invalidate inside the same
+    transaction that rewrites the document.
+
+    Args:
+        cursor: Open database cursor
+        filenames: Knowledge base file names that changed
+
+    Returns:
+        Number of cached answers removed
+    """
+    cursor.execute(
+        "DELETE FROM kb_answer_cache WHERE cited_files && %s::text[]",
+        (list(filenames),)
+    )
+    return cursor.rowcount
@@ -0,0 +1,149 @@
+"""
+Benchmark the chunkers (CHUNKER=hybrid vs markdown) on the knowledge base.
+Each chunker runs in a fresh process, so cold start (imports, tokenizer
+loading) is measured the way the indexer pays it.
+
+Usage: python -m src.chunk_benchmark [--chunkers hybrid markdown] [--repeat 3] [--json]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+import numpy as np
+
+# Chunks below this many estimated tokens carry little retrievable content
+SMALL_CHUNK_TOKENS = 16
+
+
+def run_chunker(name: str, paths: List[Path], repeat: int) -> Dict:
+    """
+    Chunk every file with one chunker (runs in its own process).
+
+    Args:
+        name: Chunker name (CHUNKER value)
+        paths: Markdown files
+        repeat: Timed passes over the files after the first
+
+    Returns:
+        Timings and chunk quality statistics
+    """
+    os.environ["CHUNKER"] = name
+    started = time.perf_counter()
+    from .chunking import CHUNK_MAX_TOKENS, init_chunk_worker, prepare_document
+    from .tokens import estimate_tokens
+
+    init_chunk_worker()
+    cold_start = time.perf_counter() - started
+
+    documents = [prepare_document(path) for path in paths]
+    first_pass = time.perf_counter() - started - cold_start
+
+    passes = []
+    for _ in range(repeat):
+        pass_started = time.perf_counter()
+        for path in paths:
+            prepare_document(path)
+        passes.append(time.perf_counter() - pass_started)
+    warm = min(passes) if passes else first_pass
+
+    chunks = [chunk for document in documents for chunk in document.chunks]
+    tokens = np.asarray([estimate_tokens(chunk.contextualized) for chunk in chunks] or [0])
+    total_bytes = sum(document.size_bytes for document in documents)
+
+    return {
+        "chunker": name,
+        "cold_start_seconds": round(cold_start, 3),
+        "first_pass_seconds": round(first_pass, 3),
+        "warm_pass_seconds": round(warm, 4),
+        "documents_per_second": round(len(paths) / warm, 1) if warm > 0 else None,
+        "mb_per_second": round(total_bytes / 1024 / 1024 / warm, 2) if warm > 0 else None,
+        "chunks": len(chunks),
+        "tokens_mean": round(float(tokens.mean()), 1),
+        "tokens_p50": int(np.percentile(tokens, 50)),
+        "tokens_p95": int(np.percentile(tokens, 95)),
+        "tokens_max": int(tokens.max()),
+        "over_budget": int((tokens > CHUNK_MAX_TOKENS).sum()),
+        "small_chunks": int((tokens < SMALL_CHUNK_TOKENS).sum()),
+        # Chunks whose embedded text carries their section headings
+        "with_headings": round(
+            sum(1 for chunk in chunks if chunk.contextualized != chunk.text) / max(1, len(chunks)), 3
+        ),
+        # Chunks that cut a fenced code block in two
+        "broken_code_fences": sum(1 for chunk in chunks if chunk.text.count("```") % 2)
+    }
+
+
+def benchmark(chunkers: List[str], paths: List[Path], repeat: int) -> List[Dict]:
+    """Run each chunker in a fresh spawned process; failures are reported, not raised."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for name in chunkers:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            try:
+                results.append(pool.submit(run_chunker, name, paths, repeat).result())
+            except Exception as e:
+                results.append({"chunker": name, "error": str(e)})
+    return results
+
+
+def print_results(results: List[Dict], files: int):
+    """Print results side by side."""
+    rows = [
+        ("Cold start (s)", "cold_start_seconds"),
+        ("First pass (s)", "first_pass_seconds"),
+        ("Warm pass (s)", "warm_pass_seconds"),
+        ("Documents/s", "documents_per_second"),
+        ("MB/s", "mb_per_second"),
+        ("Chunks", "chunks"),
+        ("Tokens mean", "tokens_mean"),
+        ("Tokens p50", "tokens_p50"),
+        ("Tokens p95", "tokens_p95"),
+        ("Tokens max", "tokens_max"),
+        ("Over budget", "over_budget"),
+        (f"Under {SMALL_CHUNK_TOKENS} tokens", "small_chunks"),
+        ("With headings", "with_headings"),
+        ("Broken code fences", "broken_code_fences")
+    ]
+
+    print(f"\n📏 Chunker benchmark: {files} documents\n")
+    print(f"{'':<22}" + "".join(f"{result['chunker']:>14}" for result in results))
+    for label, key in rows:
+        print(f"{label:<22}" + "".join(f"{str(result.get(key, '-')):>14}" for result in results))
+    for result in results:
+        if "error" in result:
+            print(f"\n⚠️  {result['chunker']} failed: {result['error']}")
+    print()
+
+
+def main():
+    """Benchmark the chunkers on the knowledge base."""
+    parser = argparse.ArgumentParser(description="Benchmark the indexer's chunkers")
+    parser.add_argument("--chunkers", nargs="+", default=["hybrid", "markdown"], help="Chunkers to compare")
+    parser.add_argument("--repeat", type=int, default=3, help="Warm passes per chunker (best is reported)")
+    parser.add_argument(
+        "--kb-path",
+        type=Path,
+        default=Path(__file__).parent.parent / "knowledge-base",
+        help="Directory of markdown files"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    paths = sorted(args.kb_path.glob("*.md"))
+    if not paths:
+        raise SystemExit(f"No markdown files found in {args.kb_path}")
+
+    results = benchmark(args.chunkers, paths, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_results(results, len(paths))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Document preprocessing for the indexer: frontmatter parsing and chunking.
+Runs in the indexer process or in pool workers, so everything here returns
+plain picklable data.
+
+CHUNKER selects the chunker: "hybrid" (docling-core HybridChunker, the
+default) or "markdown" (native heading-aware chunker, no tokenizer).
+docling-core is only imported when the hybrid chunker is used.
+"""
+
+import hashlib
+import os
+import time
+import warnings
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Union
+import frontmatter
+from .markdown_chunker import MarkdownChunker
+
+if TYPE_CHECKING:
+    from docling_core.types.doc import DoclingDocument
+
+# Chunker settings; chunker_id() is stored with each document so changing
+# them forces a re-index
+CHUNK_MAX_TOKENS = 512
+CHUNKERS = ("hybrid", "markdown")
+
+# One chunker per process, built by init_chunk_worker()
+_chunker = None
+
+
+@dataclass
+class PreparedChunk:
+    """A chunk ready to embed."""
+    text: str
+    contextualized: str
+    tokens: int
+
+
+@dataclass
+class PreparedDocument:
+    """A parsed and chunked knowledge base file, with how long each step took."""
+    file_path: Path
+    file_hash: str
+    title: str
+    chunks: List[PreparedChunk] = field(default_factory=list)
+    size_bytes: int = 0
+    parse_seconds: float = 0.0
+    chunk_seconds: float = 0.0
+
+
+def content_hash(data: Union[str, bytes]) -> str:
+    """SHA-256 hex digest used to detect changed files and chunks."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunker_name() -> str:
+    """Configured chunker (CHUNKER environment variable)."""
+    name = os.getenv("CHUNKER", "hybrid").lower()
+    if name not in CHUNKERS:
+        raise ValueError(f"Unsupported chunker: {name} (expected one of {', '.join(CHUNKERS)})")
+    return name
+
+
+def chunker_id() -> str:
+    """Identifies the chunker and its settings, e.g. "hybrid:512"."""
+    return f"{chunker_name()}:{CHUNK_MAX_TOKENS}"
+
+
+def markdown_to_docling_document(content: str, title: str) -> "DoclingDocument":
+    """
+    Convert markdown content to a DoclingDocument for HybridChunker.
+
+    Args:
+        content: Markdown content
+        title: Document title
+
+    Returns:
+        DoclingDocument object
+    """
+    from docling_core.types.doc import DoclingDocument, DocItemLabel
+
+    doc = DoclingDocument(name=title)
+
+    # Split content by paragraphs and add as text items
+    paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
+
+    for para in paragraphs:
+        # Detect if it's a heading (starts with #)
+        if para.startswith('#'):
+            label = DocItemLabel.SECTION_HEADER
+        else:
+            label = DocItemLabel.PARAGRAPH
+
+        doc.add_text(text=para, label=label)
+
+    return doc
+
+
+def init_chunk_worker():
+    """Build this process's chunker once (process pool initializer)."""
+    global _chunker
+
+    if _chunker is not None:
+        return
+
+    if chunker_name() == "markdown":
+        _chunker = MarkdownChunker(max_tokens=CHUNK_MAX_TOKENS)
+        return
+
+    # Suppress transformers warning (docling-core imports it for tokenization but we don't need models)
+    warnings.filterwarnings('ignore', message='.*PyTorch.*TensorFlow.*Flax.*')
+    from docling_core.transforms.chunker import HybridChunker
+
+    # Use HybridChunker from docling-core (lightweight, no ML dependencies!)
+    _chunker = HybridChunker(max_tokens=CHUNK_MAX_TOKENS)
+
+
+def prepare_document(file_path: Path) -> PreparedDocument:
+    """
+    Read, parse and chunk one markdown file.
+
+    Args:
+        file_path: Markdown file with optional frontmatter
+
+    Returns:
+        Document with its chunks and the hash of the content they came from
+    """
+    init_chunk_worker()
+
+    started = time.perf_counter()
+    raw = file_path.read_bytes()
+
+    # Parse markdown with frontmatter
+    post = frontmatter.loads(raw.decode('utf-8'))
+
+    # Extract title (from frontmatter or filename)
+    title = post.get('title', file_path.stem.replace("-", " ").title())
+
+    if isinstance(_chunker, MarkdownChunker):
+        # The native chunker works on the markdown itself
+        doc = post.content
+    else:
+        # Convert to DoclingDocument and chunk using HybridChunker
+        doc = markdown_to_docling_document(post.content, title)
+    parsed = time.perf_counter()
+    chunks = [
+        PreparedChunk(
+            text=chunk.text.strip(),
+            # Context-enriched text (headings etc.) is what gets embedded
+            contextualized=_chunker.contextualize(chunk=chunk),
+            tokens=len(chunk.text.split())
+        )
+        for chunk in _chunker.chunk(doc)
+        if chunk.text.strip()
+    ]
+
+    return PreparedDocument(
+        file_path=file_path,
+        file_hash=content_hash(raw),
+        title=title,
+        chunks=chunks,
+        size_bytes=len(raw),
+        parse_seconds=parsed - started,
+        chunk_seconds=time.perf_counter() - parsed
+    )
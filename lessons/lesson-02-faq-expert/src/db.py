@@ -0,0 +1,157 @@
+"""
+PostgreSQL connection pool for the FAQ Expert service.
+Thread-safe pooled connections with health checks and pgvector registration.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+from pgvector.psycopg2 import register_vector
+
+# Global pool instance
+_pool: Optional["BlockingConnectionPool"] = None
+_pool_lock = threading.Lock()
+
+
+class VectorConnection(extensions.connection):
+    """psycopg2 connection that remembers whether pgvector types are registered."""
+
+    vector_registered = False
+
+
+class BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool that waits for a free connection instead of raising.
+
+    psycopg2's pool raises PoolError as soon as maxconn connections are checked
+    out; callers here (FastAPI worker threads) would rather queue for a slot.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, timeout: float, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self.timeout = timeout
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+
+def get_db_pool() -> BlockingConnectionPool:
+    """
+    Get or create the shared connection pool.
+
+    Pool size is configured with POSTGRES_POOL_MIN / POSTGRES_POOL_MAX and the
+    checkout wait with POSTGRES_POOL_TIMEOUT (seconds).
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            _pool = BlockingConnectionPool(
+                minconn=int(os.getenv("POSTGRES_POOL_MIN", "1")),
+                maxconn=int(os.getenv("POSTGRES_POOL_MAX", "10")),
+                timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")),
+                connection_factory=VectorConnection,
+                host=os.getenv("POSTGRES_HOST", "localhost"),
+                port=os.getenv("POSTGRES_PORT", "5432"),
+                database=os.getenv("POSTGRES_DB", "techflow"),
+                user=os.getenv("POSTGRES_USER", "techflow_user"),
+                password=os.getenv("POSTGRES_PASSWORD", "techflow_pass_change_in_production")
+            )
+            print(f"[DB] Connection pool ready (min={_pool.minconn}, max={_pool.maxconn})")
+
+    return _pool
+
+
+def _is_healthy(conn) -> bool:
+    """Check a previously used pooled connection before handing it out."""
+    if conn.closed:
+        return False
+    if conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true":
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        except psycopg2.Error:
+            return False
+    return True
+
+
+def _checkout(pool: BlockingConnectionPool):
+    """Check out a healthy connection with pgvector types registered."""
+    # A pool of size N can hold at most N stale connections
+    for _ in range(pool.maxconn + 1):
+        conn = pool.getconn()
+
+        if not conn.vector_registered:
+            # Fresh connection: registering the vector type doubles as a health check
+            try:
+                conn.autocommit = True
+                register_vector(conn)
+                conn.vector_registered = True
+                return conn
+            except psycopg2.Error:
+                pool.putconn(conn, close=True)
+                continue
+
+        if _is_healthy(conn):
+            return conn
+        pool.putconn(conn, close=True)
+
+    raise psycopg2.OperationalError("No healthy database connection available")
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection for the duration of a `with` block.
+
+    Connections that fail with an OperationalError are discarded rather than
+    returned to the pool, so one dropped socket cannot poison later requests.
+    """
+    pool = get_db_pool()
+    conn = _checkout(pool)
+    discard = False
+
+    try:
+        yield conn
+        if not conn.autocommit:
+            conn.commit()
+    except psycopg2.OperationalError:
+        discard = True
+        raise
+    except Exception:
+        if not conn.closed and not conn.autocommit:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=discard or conn.closed)
+
+
+def close_db_pool():
+    """Close all pooled connections (called on application shutdown)."""
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
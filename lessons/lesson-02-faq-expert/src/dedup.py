@@ -0,0 +1,149 @@
+"""
+Near-duplicate chunk detection (MinHash + LSH) for the indexer.
+Boilerplate repeated across articles (navigation steps, "contact support"
+footers) is stored once: later copies reference the canonical chunk by
+content hash instead of getting their own embedding and HNSW node.
+"""
+
+import hashlib
+import re
+import threading
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+import numpy as np
+
+# Word n-grams compared between chunks
+SHINGLE_WORDS = 3
+# MinHash permutations, split into LSH bands of NUM_PERM / LSH_BANDS rows.
+# 16 bands x 4 rows makes pairs above ~0.5 Jaccard likely candidates; the
+# exact Jaccard check then applies the real threshold.
+NUM_PERM = 64
+LSH_BANDS = 16
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+# Fixed seed: signatures (and band keys stored in chunk metadata) must be
+# identical across runs and processes
+_rng = np.random.default_rng(20240611)
+_PERM_A = _rng.integers(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_WORD = re.compile(r"\w+")
+
+# Resolves band keys to stored canonical chunks: (keys, document to skip)
+# -> [(content_hash, content)]
+CandidateLookup = Callable[[List[str], Optional[str]], List[Tuple[str, str]]]
+
+
+def shingles(text: str) -> Set[int]:
+    """32-bit hashes of the text's word n-grams (case and punctuation ignored)."""
+    words = _WORD.findall(text.lower())
+    grams = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))]
+    return {
+        int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little")
+        for gram in grams if gram
+    }
+
+
+def minhash(shingle_set: Set[int]) -> np.ndarray:
+    """MinHash signature (NUM_PERM values) of a shingle set."""
+    values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+    # a * x + b stays below 2**64 for 32-bit a, b and x
+    hashed = (np.outer(values, _PERM_A) + _PERM_B) % _MERSENNE_PRIME
+    return hashed.min(axis=0)
+
+
+def band_keys(signature: np.ndarray) -> List[str]:
+    """LSH bucket keys: chunks sharing any key are duplicate candidates."""
+    rows = NUM_PERM // LSH_BANDS
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=6).hexdigest()}"
+        for band in range(LSH_BANDS)
+    ]
+
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    """Exact Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class ChunkDeduplicator:
+    """
+    Finds the canonical chunk a new chunk nearly duplicates.
+
+    Candidates come from chunks accepted earlier in this run (kept in
+    memory, so copies in documents indexed together are caught before
+    either is written) and from stored chunks via `lookup`. A candidate
+    only counts when the exact Jaccard similarity of the word n-grams
+    reaches the threshold. Thread-safe: the embed stage calls it while
+    other documents are being written.
+    """
+
+    def __init__(self, threshold: float = 0.9, lookup: Optional[CandidateLookup] = None):
+        """
+        Args:
+            threshold: Minimum Jaccard similarity to collapse a chunk
+            lookup: Resolves band keys to stored canonical chunks
+        """
+        self.threshold = threshold
+        self.lookup = lookup
+        self._lock = threading.Lock()
+        # band key -> [(content_hash, shingles, source)]
+        self._buckets: Dict[str, List[Tuple[str, Set[int], str]]] = defaultdict(list)
+        self.duplicates = 0
+        self.bytes_saved = 0
+
+    def find(self, text: str, source: str, document_id: Optional[str] = None) -> Tuple[Optional[str], List[str]]:
+        """
+        Look for a canonical chunk that text nearly duplicates.
+
+        Chunks from the same source document are never merged, and chunks
+        without any words (a bare "---" rule) are never duplicates.
+
+        Args:
+            text: Chunk text
+            source: Document the chunk belongs to (file path)
+            document_id: Its stored id, if it was indexed before
+
+        Returns:
+            (content hash of the canonical chunk or None, the chunk's band keys)
+        """
+        chunk_shingles = shingles(text)
+        if not chunk_shingles:
+            return None, []
+        keys = band_keys(minhash(chunk_shingles))
+
+        best, best_score = None, self.threshold
+        with self._lock:
+            candidates = [
+                (content_hash, candidate)
+                for key in keys
+                for content_hash, candidate, candidate_source in self._buckets.get(key, ())
+                if candidate_source != source
+            ]
+        for content_hash, candidate in candidates:
+            score = jaccard(chunk_shingles, candidate)
+            if score >= best_score:
+                best, best_score = content_hash, score
+
+        if best is None and self.lookup is not None:
+            for content_hash, content in self.lookup(keys, document_id):
+                score = jaccard(chunk_shingles, shingles(content))
+                if score >= best_score:
+                    best, best_score = content_hash, score
+
+        if best is not None:
+            with self._lock:
+                self.duplicates += 1
+                self.bytes_saved += len(text.encode("utf-8"))
+        return best, keys
+
+    def add(self, content_hash: str, text: str, keys: List[str], source: str):
+        """Make a chunk that will be stored with its own embedding a canonical candidate."""
+        entry = (content_hash, shingles(text), source)
+        if not entry[1]:
+            return
+        with self._lock:
+            for key in keys:
+                self._buckets[key].append(entry)
@@ -0,0 +1,201 @@
+"""
+Two-tier cache for query embeddings.
+In-process LRU (size + TTL eviction) backed by Redis so every replica shares vectors.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Global cache instance
+_cache: Optional["EmbeddingCache"] = None
+_cache_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text so trivially different queries share a cache entry."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(provider: str, model: str, text: str) -> str:
+    """Build the cache key for a (provider, model, normalized text) triple."""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"emb:{provider}:{model}:{digest}"
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: List[float]):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """
+    Query embedding cache with an in-process LRU in front of Redis.
+
+    Redis is optional: if it is disabled or unreachable the cache keeps working
+    with the local tier only and retries Redis after a short cooldown.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        redis_client=None,
+        redis_ttl: int = 0,
+        redis_retry_after: float = 30.0
+    ):
+        self.local = LRUCache(max_size, ttl)
+        self.redis = redis_client
+        self.redis_ttl = redis_ttl
+        self.redis_retry_after = redis_retry_after
+        self._redis_down_until = 0.0
+        self._stats_lock = threading.Lock()
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _redis_available(self) -> bool:
+        return self.redis is not None and time.monotonic() >= self._redis_down_until
+
+    def _redis_failed(self, error: Exception):
+        self._count("redis_errors")
+        self._redis_down_until = time.monotonic() + self.redis_retry_after
+        print(f"[EmbeddingCache] Redis unavailable, using local cache only: {error}")
+
+    def _redis_get(self, key: str) -> Optional[List[float]]:
+        if not self._redis_available():
+            return None
+        try:
+            payload = self.redis.get(key)
+        except Exception as e:
+            self._redis_failed(e)
+            return None
+        if payload is None:
+            return None
+        return array("f", payload).tolist()
+
+    def _redis_set(self, key: str, value: List[float]):
+        if not self._redis_available():
+            return
+        try:
+            self.redis.set(key, array("f", value).tobytes(), ex=self.redis_ttl or None)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def get_or_compute(
+        self,
+        provider: str,
+        model: str,
+        text: str,
+        compute: Callable[[str], List[float]]
+    ) -> List[float]:
+        """
+        Return the cached embedding for text, computing and storing it on a miss.
+
+        Args:
+            provider: Embedding provider name
+            model: Embedding model name
+            text: Text to embed
+            compute: Function that embeds text when neither tier has it
+
+        Returns:
+            Embedding vector
+        """
+        key = cache_key(provider, model, text)
+
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+
+        value = self._redis_get(key)
+        if value is not None:
+            self._count("redis_hits")
+            self.local.set(key, value)
+            return value
+
+        self._count("misses")
+        value = compute(text)
+        self.local.set(key, value)
+        self._redis_set(key, value)
+        return value
+
+    def get_stats(self) -> Dict:
+        """Hit/miss counters and hit rate for the /stats endpoint."""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+        stats["local_entries"] = len(self.local)
+        stats["redis_enabled"] = self.redis is not None
+        return stats
+
+
+def _build_redis_client():
+    """Create a Redis client from REDIS_* settings, or None when disabled."""
+    if os.getenv("EMBEDDING_CACHE_REDIS", "true").lower() != "true":
+        return None
+
+    try:
+        import redis
+    except ImportError:
+        print("[EmbeddingCache] redis package not installed, using local cache only")
+        return None
+
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        password=os.getenv("REDIS_PASSWORD") or None,
+        socket_timeout=float(os.getenv("EMBEDDING_CACHE_REDIS_TIMEOUT", "0.25")),
+        socket_connect_timeout=float(os.getenv("EMBEDDING_CACHE_REDIS_TIMEOUT", "0.25"))
+    )
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get or create the shared query embedding cache."""
+    global _cache
+
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache(
+                    max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+                    ttl=float(os.getenv("EMBEDDING_CACHE_TTL", "3600")),
+                    redis_client=_build_redis_client(),
+                    redis_ttl=int(os.getenv("EMBEDDING_CACHE_REDIS_TTL", "604800"))
+                )
+
+    return _cache
@@ -0,0 +1,265 @@
+"""
+Embedding clients for the FAQ Expert.
+Long-lived, provider-keyed clients that reuse pooled HTTP connections.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import urllib.parse
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from openai import OpenAI, DefaultHttpxClient
+from .tokens import estimate_tokens
+
+# Provider-keyed client registry
+_clients: Dict[str, "EmbeddingClient"] = {}
+_clients_lock = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    """Connection pool limits shared by all embedding HTTP clients."""
+    return httpx.Limits(
+        max_connections=int(os.getenv("EMBEDDING_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("EMBEDDING_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("EMBEDDING_HTTP_KEEPALIVE_EXPIRY", "60"))
+    )
+
+
+def batch_texts(texts: List[str], batch_size: int, token_budget: int) -> List[List[int]]:
+    """
+    Group texts into request batches by count and estimated token budget.
+
+    Args:
+        texts: Texts to embed
+        batch_size: Maximum texts per request
+        token_budget: Maximum estimated tokens per request (a single text
+            larger than the budget gets a batch of its own)
+
+    Returns:
+        Batches of indexes into texts, in order
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= batch_size or current_tokens + tokens > token_budget):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class EmbeddingClient:
+    """Base class for embedding providers."""
+
+    provider: str = ""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed a list of texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            One embedding vector per input text, in input order
+        """
+        raise NotImplementedError
+
+    def embed_one(self, text: str) -> List[float]:
+        """Embed a single text."""
+        return self.embed([text])[0]
+
+    def close(self):
+        """Release pooled HTTP connections."""
+
+
+class OpenAIEmbeddingClient(EmbeddingClient):
+    """OpenAI-compatible embeddings API (GitHub Models, LM Studio)."""
+
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        base_url: str,
+        api_key: Optional[str],
+        max_retries: int = 2
+    ):
+        super().__init__(model)
+        self.provider = provider
+        self.base_url = base_url
+        self.client = OpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            max_retries=max_retries,
+            http_client=DefaultHttpxClient(limits=_http_limits())
+        )
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embeddings.create(input=texts, model=self.model)
+        # The API may return items out of order; index tells us where they belong
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    def close(self):
+        self.client.close()
+
+
+class OllamaEmbeddingClient(EmbeddingClient):
+    """Local Ollama server embeddings."""
+
+    provider = "ollama"
+
+    def __init__(self, model: str, host: str):
+        import ollama
+
+        super().__init__(model)
+        # Accept OLLAMA_HOST with or without a scheme
+        parsed = urllib.parse.urlparse(host)
+        self.host = f"http://{parsed.netloc or parsed.path}"
+        self.client = ollama.Client(host=self.host, limits=_http_limits())
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client.embed(model=self.model, input=texts)
+        return [list(vector) for vector in response["embeddings"]]
+
+    def close(self):
+        self.client.close()
+
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=200_000)
+def _feature_slot(feature: str, dimensions: int) -> Tuple[int, float]:
+    """Bucket and sign of a feature (stable across processes, unlike hash())."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dimensions, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+class LocalEmbeddingClient(EmbeddingClient):
+    """
+    Offline, deterministic embeddings by feature hashing (no model server).
+
+    Words, word bigrams and character trigrams are hashed into a fixed number
+    of signed buckets with sublinear term frequency, then L2-normalized, so
+    cosine similarity tracks lexical overlap (including partial word
+    matches). The same text always gets the same vector, on any machine.
+    Meant for benchmarking and air-gapped development, not answer quality.
+    """
+
+    provider = "local"
+
+    def __init__(self, dimensions: int = 768):
+        # The dimensions are part of the model name, so vectors of different
+        # sizes are never reused or cached interchangeably
+        super().__init__(f"feature-hashing-v1-{dimensions}")
+        self.dimensions = dimensions
+
+    def features(self, text: str) -> Counter:
+        """Words, word bigrams and boundary-marked character trigrams of a text."""
+        words = _WORD.findall(text.lower())
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            marked = f"<{word}>"
+            features.update(f"#{marked[i:i + 3]}" for i in range(len(marked) - 2))
+        return features
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self.features(text)
+            if not features:
+                continue
+            slots, signs = zip(*(_feature_slot(feature, self.dimensions) for feature in features))
+            weights = np.asarray(signs) * (1.0 + np.log(np.fromiter(features.values(), dtype=np.float64)))
+            vectors[row] = np.bincount(slots, weights=weights, minlength=self.dimensions)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1.0, norms)
+        return vectors.tolist()
+
+
+def build_embedding_client(provider: str) -> EmbeddingClient:
+    """
+    Create an embedding client for a provider from environment configuration.
+
+    Args:
+        provider: Embedding provider name (github, ollama, lmstudio, local)
+
+    Returns:
+        Configured EmbeddingClient
+    """
+    if provider == "github":
+        return OpenAIEmbeddingClient(
+            provider="github",
+            model="text-embedding-3-small",
+            base_url="https://models.inference.ai.azure.com",
+            api_key=os.getenv("GITHUB_TOKEN")
+        )
+
+    elif provider == "ollama":
+        return OllamaEmbeddingClient(
+            model=os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text"),
+            host=os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        )
+
+    elif provider == "lmstudio":
+        return OpenAIEmbeddingClient(
+            provider="lmstudio",
+            model=os.getenv("LMSTUDIO_MODEL", "text-embedding-nomic-embed-text-v2"),
+            base_url=os.getenv("LMSTUDIO_URL", "http://localhost:1234/v1"),
+            api_key="lm-studio"  # LM Studio doesn't require a real key
+        )
+
+    elif provider == "local":
+        return LocalEmbeddingClient(dimensions=int(os.getenv("EMBEDDING_DIMENSIONS", "768")))
+
+    else:
+        raise ValueError(f"Unsupported embedding provider: {provider}")
+
+
+def get_embedding_client(provider: Optional[str] = None) -> EmbeddingClient:
+    """
+    Get the shared embedding client for a provider, creating it on first use.
+
+    Args:
+        provider: Embedding provider name (defaults to EMBEDDING_PROVIDER)
+
+    Returns:
+        Long-lived EmbeddingClient for the provider
+    """
+    provider = (provider or os.getenv("EMBEDDING_PROVIDER", "github")).lower()
+
+    client = _clients.get(provider)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(provider)
+            if client is None:
+                client = build_embedding_client(provider)
+                _clients[provider] = client
+                print(f"[Embeddings] Initialized {provider} client with model {client.model}")
+
+    return client
+
+
+def close_embedding_clients():
+    """Close all registered embedding clients."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
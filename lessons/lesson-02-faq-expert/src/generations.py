@@ -0,0 +1,292 @@
+"""
+Blue/green index generations for the pgvector backend.
+A rebuild writes a complete copy of kb_chunks into a shadow table, builds
+and warms its indexes, then swaps it in with a rename, so searches never see
+a half-built index and don't compete with the rebuild's writes.
+"""
+
+import re
+import time
+from typing import Callable, List, Optional
+import psycopg2
+import psycopg2.errors
+
+LIVE_TABLE = "kb_chunks"
+SHADOW_TABLE = "kb_chunks_next"
+PREVIOUS_TABLE = "kb_chunks_prev"
+# Only ever exists inside the rollback transaction
+_SWAP_TABLE = "kb_chunks_swap"
+
+
+class IndexGenerations:
+    """
+    The live chunk table, the shadow table a rebuild writes into, and the
+    previous generation kept for rollback.
+
+    Table, index and constraint names all start with the table name, so a
+    generation keeps the same index names (idx_kb_chunks_embedding, ...)
+    whichever table it was built in. Nothing here commits except promote()
+    and rollback(); callers commit the other steps.
+    """
+
+    def __init__(self, conn):
+        """
+        Args:
+            conn: Indexer connection (not autocommit)
+        """
+        self.conn = conn
+
+    def exists(self, table: str) -> bool:
+        """Whether a generation table exists."""
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+            return cur.fetchone()[0]
+
+    def create_shadow(self):
+        """
+        Create an empty shadow table shaped like the live one.
+
+        Only the constraints are created up front (ON CONFLICT and the
+        foreign key need them); the secondary indexes, HNSW included, are
+        built once the data is loaded, which is much faster than maintaining
+        them row by row.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+            cur.execute(
+                f"CREATE TABLE {SHADOW_TABLE} (LIKE {LIVE_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+            cur.execute("""
+                SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+                WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')
+            """, (LIVE_TABLE,))
+            for name, definition in cur.fetchall():
+                cur.execute(
+                    f"ALTER TABLE {SHADOW_TABLE} ADD CONSTRAINT "
+                    f"{_generation_name(name, LIVE_TABLE, SHADOW_TABLE)} {definition}"
+                )
+
+    def discard_shadow(self):
+        """
+        Drop the shadow table of an abandoned rebuild.
+
+        The rebuild already updated document metadata for content that never
+        went live, so document hashes are cleared and the next run re-checks
+        every document against the live chunks.
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {SHADOW_TABLE}")
+            _reset_document_hashes(cur)
+
+    def carry_over(self, run_id: str) -> int:
+        """
+        Copy live chunks of documents the rebuild did not write into the shadow table.
+
+        Documents that failed or are quarantined keep serving their current
+        chunks in the new generation instead of disappearing from search.
+
+        Args:
+            run_id: The rebuild's indexing run
+
+        Returns:
+            Number of chunks copied
+        """
+        with self.conn.cursor() as cur:
+            cur.execute(f"""
+                INSERT INTO {SHADOW_TABLE} (id, document_id, chunk_index, content, embedding, metadata, created_at)
+                SELECT c.id, c.document_id, c.chunk_index, c.content, c.embedding, c.metadata, c.created_at
+                FROM {LIVE_TABLE} c
+                JOIN kb_documents d ON d.id = c.document_id
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM kb_index_run_documents r
+                    WHERE r.run_id = %s AND r.filepath = d.filepath AND r.status = 'committed'
+                )
+                ON CONFLICT DO NOTHING
+            """, (run_id,))
+            return cur.rowcount
+
+    def build_indexes(self, maintenance_work_mem: Optional[str] = None) -> List[str]:
+        """
+        Build the live table's secondary indexes on the shadow table, then analyze it.
+
+        Index definitions are copied from the live table, so tuned HNSW
+        parameters carry over. Fresh statistics keep the planner from
+        choosing bad plans right after the swap.
+
+        Args:
+            maintenance_work_mem: Memory for the builds (e.g. "1GB"); an HNSW
+                graph that fits builds several times faster
+
+        Returns:
+            Names of the indexes built
+        """
+        with self.conn.cursor() as cur:
+            if maintenance_work_mem:
+                cur.execute("SET LOCAL maintenance_work_mem = %s", (maintenance_work_mem,))
+            cur.execute("""
+                SELECT c.relname, pg_get_indexdef(i.indexrelid)
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE i.indrelid = %s::regclass
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+            """, (LIVE_TABLE,))
+            built = []
+            for name, definition in cur.fetchall():
+                shadow_name = _generation_name(name, LIVE_TABLE, SHADOW_TABLE)
+                definition = definition.replace(
+                    f"INDEX {name} ON", f"INDEX IF NOT EXISTS {shadow_name} ON", 1
+                )
+                definition = re.sub(
+                    rf" ON (ONLY )?(\w+\.)?{LIVE_TABLE} ", rf" ON \g<1>\g<2>{SHADOW_TABLE} ", definition, count=1
+                )
+                cur.execute(definition)
+                built.append(shadow_name)
+            cur.execute(f"ANALYZE {SHADOW_TABLE}")
+        return built
+
+    def warm(self, queries: int) -> Optional[float]:
+        """
+        Pull the shadow table's indexes into memory before it goes live.
+
+        Uses pg_prewarm when the extension is installed, then runs nearest
+        neighbour searches for a sample of stored vectors, which walks the
+        HNSW graph the way live traffic will.
+
+        Args:
+            queries: Number of sample searches
+
+        Returns:
+            Average sample search time in milliseconds (None without vectors)
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")
+            if cur.fetchone():
+                cur.execute("SELECT pg_prewarm(%s::regclass)", (SHADOW_TABLE,))
+                cur.execute(
+                    "SELECT pg_prewarm(indexrelid::regclass) FROM pg_index WHERE indrelid = %s::regclass",
+                    (SHADOW_TABLE,)
+                )
+
+            cur.execute(f"""
+                SELECT embedding FROM {SHADOW_TABLE}
+                WHERE embedding IS NOT NULL
+                ORDER BY random()
+                LIMIT %s
+            """, (queries,))
+            samples = [row[0] for row in cur.fetchall()]
+
+            started = time.perf_counter()
+            for embedding in samples:
+                cur.execute(
+                    f"SELECT id FROM {SHADOW_TABLE} ORDER BY embedding <=> %s LIMIT 5",
+                    (embedding,)
+                )
+                cur.fetchall()
+        if not samples:
+            return None
+        return (time.perf_counter() - started) * 1000 / len(samples)
+
+    def promote(
+        self,
+        lock_timeout: str = "2s",
+        attempts: int = 5,
+        before_commit: Optional[Callable] = None
+    ):
+        """
+        Make the shadow table live in one transaction.
+
+        kb_chunks becomes kb_chunks_prev (replacing the one before) and
+        kb_chunks_next becomes kb_chunks. Searches already running finish on
+        the old generation; the rename needs a brief exclusive lock, so it
+        gives up after lock_timeout and retries rather than queueing every
+        new search behind a long-running one.
+
+        Args:
+            lock_timeout: How long to wait for the lock per attempt
+            attempts: Tries before giving up
+            before_commit: Called with the cursor inside the swap transaction
+        """
+        def swap(cur):
+            cur.execute(f"DROP TABLE IF EXISTS {PREVIOUS_TABLE}")
+            _rename_generation(cur, LIVE_TABLE, PREVIOUS_TABLE)
+            _rename_generation(cur, SHADOW_TABLE, LIVE_TABLE)
+            # Cached answers were generated from the old generation
+            cur.execute("DELETE FROM kb_answer_cache")
+            if before_commit is not None:
+                before_commit(cur)
+
+        self._swap(swap, lock_timeout, attempts)
+
+    def rollback(self, lock_timeout: str = "2s", attempts: int = 5, before_commit: Optional[Callable] = None):
+        """
+        Swap the previous generation back in.
+
+        The rolled-back generation becomes kb_chunks_prev, so rolling back
+        again restores it. Document hashes are cleared so the next run
+        re-checks every document against the restored chunks.
+
+        Args:
+            lock_timeout: How long to wait for the lock per attempt
+            attempts: Tries before giving up
+            before_commit: Called with the cursor inside the swap transaction
+        """
+        if not self.exists(PREVIOUS_TABLE):
+            raise ValueError(f"No previous index generation ({PREVIOUS_TABLE}) to roll back to")
+
+        def swap(cur):
+            _rename_generation(cur, LIVE_TABLE, _SWAP_TABLE)
+            _rename_generation(cur, PREVIOUS_TABLE, LIVE_TABLE)
+            _rename_generation(cur, _SWAP_TABLE, PREVIOUS_TABLE)
+            cur.execute("DELETE FROM kb_answer_cache")
+            _reset_document_hashes(cur)
+            if before_commit is not None:
+                before_commit(cur)
+
+        self._swap(swap, lock_timeout, attempts)
+
+    def _swap(self, swap: Callable, lock_timeout: str, attempts: int):
+        """Run a rename transaction, retrying when the table lock isn't granted in time."""
+        for attempt in range(attempts):
+            try:
+                with self.conn.cursor() as cur:
+                    cur.execute("SET LOCAL lock_timeout = %s", (lock_timeout,))
+                    swap(cur)
+                self.conn.commit()
+                return
+            except psycopg2.errors.LockNotAvailable:
+                self.conn.rollback()
+                if attempt == attempts - 1:
+                    raise
+                print(f"  ⏳ {LIVE_TABLE} is busy, retrying the swap ({attempt + 1}/{attempts})")
+                time.sleep(1)
+            except Exception:
+                self.conn.rollback()
+                raise
+
+
+def _generation_name(name: str, table: str, new_table: str) -> str:
+    """Index or constraint name for another generation table (idx_kb_chunks_x -> idx_kb_chunks_next_x)."""
+    return re.sub(rf"(^|_){table}(?=_|$)", rf"\g<1>{new_table}", name, count=1)
+
+
+def _rename_generation(cur, table: str, new_table: str):
+    """Rename a generation table along with its constraints and indexes."""
+    cur.execute(f"ALTER TABLE {table} RENAME TO {new_table}")
+
+    # Renaming a primary key or unique constraint renames its index too
+    cur.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass", (new_table,))
+    for (name,) in cur.fetchall():
+        renamed = _generation_name(name, table, new_table)
+        if renamed != name:
+            cur.execute(f"ALTER TABLE {new_table} RENAME CONSTRAINT {name} TO {renamed}")
+
+    cur.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", (new_table,))
+    for (name,) in cur.fetchall():
+        renamed = _generation_name(name, table, new_table)
+        if renamed != name:
+            cur.execute(f"ALTER INDEX {name} RENAME TO {renamed}")
+
+
+def _reset_document_hashes(cur):
+    """Make the next incremental run re-check every document."""
+    cur.execute("UPDATE kb_documents SET metadata = metadata - 'content_hash' WHERE metadata ? 'content_hash'")
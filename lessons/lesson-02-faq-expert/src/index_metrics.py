@@ -0,0 +1,116 @@
+"""
+Per-stage timings and counters for indexing runs.
+Collected from every pipeline thread and turned into a JSON run report, so
+runs can be compared and a slow one traced to parsing, chunking, embedding
+or database writes.
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from psycopg2.extras import Json
+
+# Stages in pipeline order, for reports and printing
+STAGES = ["parse", "chunk", "embed", "embed_request", "write"]
+
+
+class IndexMetrics:
+    """
+    Thread-safe timings (seconds per item) and counters for one run.
+
+    Stages: parse (read + frontmatter + document model) and chunk per file,
+    embed per document (stored vectors, cache and provider), embed_request
+    per provider call, write per document transaction.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.timings: Dict[str, List[float]] = defaultdict(list)
+        self.counters: Dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, seconds: float):
+        """Add one item's duration to a stage."""
+        with self._lock:
+            self.timings[stage].append(seconds)
+
+    def count(self, name: str, amount: int = 1):
+        """Increment a counter (documents, chunks, bytes_embedded, ...)."""
+        with self._lock:
+            self.counters[name] += amount
+
+    def report(self, extra: Optional[Dict] = None) -> Dict:
+        """
+        Build the run report.
+
+        Args:
+            extra: Additional fields (run id, summary counters, ...)
+
+        Returns:
+            JSON-serializable report with throughput and per-stage latency
+            percentiles in milliseconds
+        """
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            counters = dict(self.counters)
+            timings = {stage: list(values) for stage, values in self.timings.items()}
+
+        def per_second(name: str) -> float:
+            return round(counters.get(name, 0) / elapsed, 2) if elapsed > 0 else 0.0
+
+        stages = {}
+        for stage in STAGES + sorted(set(timings) - set(STAGES)):
+            values = timings.get(stage)
+            if not values:
+                continue
+            ms = np.asarray(values) * 1000
+            stages[stage] = {
+                "count": len(values),
+                "total_seconds": round(float(ms.sum()) / 1000, 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 2),
+                "p95_ms": round(float(np.percentile(ms, 95)), 2),
+                "max_ms": round(float(ms.max()), 2)
+            }
+
+        return {
+            **(extra or {}),
+            "started_at": self.started_at.isoformat(),
+            "elapsed_seconds": round(elapsed, 3),
+            "counters": counters,
+            "throughput": {
+                "documents_per_second": per_second("documents"),
+                "chunks_per_second": per_second("chunks"),
+                "embeddings_per_second": per_second("embeddings"),
+                "bytes_embedded_per_second": per_second("bytes_embedded"),
+                "tokens_embedded_per_second": per_second("tokens_embedded")
+            },
+            "stages": stages
+        }
+
+
+def write_report(report: Dict, path: Path):
+    """Write a run report as JSON."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, default=str) + "\n")
+
+
+def store_report(conn, report: Dict, agent_name: str = "faq-indexer"):
+    """
+    Insert a run report into agent_metrics (metric_type "index_run").
+
+    Args:
+        conn: Autocommit database connection
+        report: Output of IndexMetrics.report
+        agent_name: agent_metrics.agent_name to file the report under
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO agent_metrics (agent_name, metric_type, metric_value) VALUES (%s, %s, %s)",
+            (agent_name, "index_run", Json(report))
+        )
@@ -0,0 +1,227 @@
+"""
+Indexing run checkpoints and the failure quarantine.
+Every run and the status of each document in it (pending, embedded,
+committed, failed) are recorded, so an interrupted run resumes where it
+stopped and documents that keep failing are set aside until retried.
+"""
+
+from typing import Dict, Iterable, Optional, Set
+from psycopg2.extras import Json, execute_values
+
+PENDING = "pending"
+EMBEDDED = "embedded"
+COMMITTED = "committed"
+FAILED = "failed"
+
+
+class IndexRun:
+    """
+    One indexing run and its per-document checkpoints.
+
+    Status updates use their own autocommit connection, except the
+    "committed" mark, which is written inside the document's transaction so
+    it can never disagree with what was stored.
+    """
+
+    def __init__(
+        self,
+        conn,
+        run_id: str,
+        full: bool,
+        resumed: bool = False,
+        rebuild: bool = False,
+        embedding_model: Optional[str] = None
+    ):
+        """
+        Args:
+            conn: Autocommit connection for status updates
+            run_id: kb_index_runs id
+            full: Whether the run ignores content hashes
+            resumed: Whether this run continues an interrupted one
+            rebuild: Whether the run builds a new index generation
+            embedding_model: Embedding model id the run stores vectors with
+        """
+        self.conn = conn
+        self.id = run_id
+        self.full = full
+        self.resumed = resumed
+        self.rebuild = rebuild
+        self.embedding_model = embedding_model
+
+    @classmethod
+    def start(
+        cls,
+        conn,
+        full: bool,
+        embedding_model: str,
+        new_run: bool = False,
+        rebuild: bool = False,
+        retry_failed: bool = False
+    ) -> "IndexRun":
+        """
+        Resume the latest unfinished run, or start a new one.
+
+        A resumed run keeps the mode it started with. Asking for --full or
+        --rebuild while an unfinished run without that mode exists is an
+        error rather than a silent downgrade; a plain run resumes any mode.
+        --retry-failed always needs a new run, so it is refused while one is
+        unfinished: only --new-run abandons a run (and a half-built rebuild).
+
+        Args:
+            conn: Autocommit connection for status updates
+            full: Whether a new run should ignore content hashes
+            embedding_model: Provider/model id, recorded with the run
+            new_run: Abandon any unfinished run instead of resuming it
+            rebuild: Whether a new run builds a new index generation
+            retry_failed: Start a run that only retries quarantined documents
+        """
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT id, full_reindex, rebuild, embedding_model FROM kb_index_runs
+                WHERE status = 'running'
+                ORDER BY started_at DESC
+                LIMIT 1
+            """)
+            unfinished = cur.fetchone()
+
+            if unfinished and not new_run:
+                run_id, run_full, run_rebuild, run_model = unfinished
+                if retry_failed:
+                    raise ValueError(
+                        f"Unfinished run {run_id} must complete before --retry-failed; "
+                        f"resume it without the flag, or abandon it with --new-run"
+                    )
+                missing = [
+                    flag for flag, requested, resumed in (("--full", full, run_full), ("--rebuild", rebuild, run_rebuild))
+                    if requested and not resumed
+                ]
+                if missing:
+                    raise ValueError(
+                        f"Unfinished run {run_id} was not started with {' '.join(missing)}; "
+                        f"resume it without the flag, or abandon it with --new-run"
+                    )
+                return cls(conn, str(run_id), run_full, resumed=True, rebuild=run_rebuild, embedding_model=run_model)
+
+            if unfinished:
+                cur.execute(
+                    "UPDATE kb_index_runs SET status = 'abandoned', finished_at = NOW() WHERE status = 'running'"
+                )
+
+            cur.execute(
+                "INSERT INTO kb_index_runs (full_reindex, rebuild, embedding_model) VALUES (%s, %s, %s) RETURNING id",
+                (full, rebuild, embedding_model)
+            )
+            return cls(conn, str(cur.fetchone()[0]), full, rebuild=rebuild, embedding_model=embedding_model)
+
+    def set_embedding_model(self, embedding_model: str):
+        """Record the embedding model id once it is known (after fitting a PCA projection)."""
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "UPDATE kb_index_runs SET embedding_model = %s WHERE id = %s",
+                (embedding_model, self.id)
+            )
+        self.embedding_model = embedding_model
+
+    def register(self, filepaths: Iterable[str]):
+        """Add documents to the run as pending (already registered ones keep their status)."""
+        with self.conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO kb_index_run_documents (run_id, filepath)
+                VALUES %s
+                ON CONFLICT (run_id, filepath) DO NOTHING
+            """, [(self.id, filepath) for filepath in filepaths], page_size=1000)
+
+    def finished_paths(self) -> Set[str]:
+        """Documents this run already committed or quarantined (skipped on resume)."""
+        with self.conn.cursor() as cur:
+            cur.execute(
+                "SELECT filepath FROM kb_index_run_documents WHERE run_id = %s AND status IN (%s, %s)",
+                (self.id, COMMITTED, FAILED)
+            )
+            return {row[0] for row in cur.fetchall()}
+
+    def mark(self, filepath: str, status: str, file_hash: Optional[str] = None, error: Optional[str] = None, cursor=None):
+        """
+        Record a document's status.
+
+        Args:
+            filepath: Document path
+            status: pending, embedded, committed or failed
+            file_hash: Content hash the status applies to (used by the quarantine)
+            error: Failure message
+            cursor: Cursor to write with (defaults to the run's own connection);
+                pass the document transaction's cursor for "committed"
+        """
+        sql = """
+            INSERT INTO kb_index_run_documents (run_id, filepath, status, file_hash, error, updated_at)
+            VALUES (%s, %s, %s, %s, %s, NOW())
+            ON CONFLICT (run_id, filepath) DO UPDATE SET
+                status = EXCLUDED.status,
+                file_hash = COALESCE(EXCLUDED.file_hash, kb_index_run_documents.file_hash),
+                error = EXCLUDED.error,
+                updated_at = NOW()
+        """
+        params = (self.id, filepath, status, file_hash, error)
+        if cursor is not None:
+            cursor.execute(sql, params)
+            return
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+
+    def finish(self, summary: Dict, cursor=None):
+        """
+        Close the run.
+
+        Documents still pending were skipped as unchanged, so they are up to
+        date and marked committed.
+
+        Args:
+            summary: Run counters, stored with the run
+            cursor: Cursor to write with (defaults to the run's own connection);
+                a rebuild passes the swap transaction's cursor
+        """
+        if cursor is not None:
+            self._finish(cursor, summary)
+            return
+        with self.conn.cursor() as cur:
+            self._finish(cur, summary)
+
+    def _finish(self, cur, summary: Dict):
+        cur.execute(
+            "UPDATE kb_index_run_documents SET status = %s, updated_at = NOW() WHERE run_id = %s AND status = %s",
+            (COMMITTED, self.id, PENDING)
+        )
+        cur.execute("""
+            UPDATE kb_index_runs
+            SET status = 'completed', finished_at = NOW(), summary = %s
+            WHERE id = %s
+        """, (Json(summary), self.id))
+
+
+def quarantined_documents(conn) -> Dict[str, Dict]:
+    """
+    Documents whose most recent indexing attempt failed.
+
+    They are skipped while their content is unchanged; editing the file or
+    running with --retry-failed tries them again.
+
+    Args:
+        conn: Database connection
+
+    Returns:
+        file_hash and error of each quarantined document, keyed by file path
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT filepath, file_hash, error FROM (
+                SELECT DISTINCT ON (filepath) filepath, status, file_hash, error
+                FROM kb_index_run_documents
+                WHERE status IN (%s, %s)
+                ORDER BY filepath, updated_at DESC
+            ) latest
+            WHERE status = %s
+        """, (COMMITTED, FAILED, FAILED))
+        return {
+            filepath: {"file_hash": file_hash, "error": error}
+            for filepath, file_hash, error in cur.fetchall()
+        }
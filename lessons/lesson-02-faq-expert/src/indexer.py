@@ -1,67 +1,255 @@
 """
 Document Indexer for Lesson 2: FAQ Expert
-Uses lightweight markdown parsing (no heavy ML dependencies!) with HybridChunker from docling-core.
+Uses lightweight markdown parsing (no heavy ML dependencies!) with HybridChunker from docling-core,
+or a native heading-aware chunker (CHUNKER=markdown) that needs no tokenizer.
 """
 
+import argparse
+import multiprocessing
 import os
+import random
 import time
-import re
-import warnings
+import uuid
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import numpy as np
 import psycopg2
-from psycopg2.extras import Json
+from psycopg2.extras import Json, execute_values
 from pgvector.psycopg2 import register_vector
-import frontmatter
-
-# Suppress transformers warning (docling-core imports it for tokenization but we don't need models)
-warnings.filterwarnings('ignore', message='.*PyTorch.*TensorFlow.*Flax.*')
-
-from docling_core.types.doc import DoclingDocument, TextItem, DocItemLabel
-from docling_core.transforms.chunker import HybridChunker
-from openai import OpenAI
-import ollama
 from dotenv import load_dotenv
+from .chunking import (
+    PreparedDocument,
+    chunker_id,
+    content_hash,
+    init_chunk_worker,
+    markdown_to_docling_document,
+    prepare_document
+)
+from .embeddings import (
+    LocalEmbeddingClient,
+    OllamaEmbeddingClient,
+    OpenAIEmbeddingClient,
+    batch_texts,
+    estimate_tokens
+)
+from .rate_limit import RateLimiter, call_with_retries
+from .persistent_cache import PersistentEmbeddingCache
+from .pipeline import StageStats, run_pipeline
+from .index_runs import COMMITTED, EMBEDDED, FAILED, IndexRun, quarantined_documents
+from .generations import SHADOW_TABLE, IndexGenerations
+from .dedup import ChunkDeduplicator
+from .reduction import (
+    EmbeddingReducer,
+    PcaProjection,
+    TruncationReducer,
+    activate_live_projection,
+    activate_projection,
+    load_projection,
+    projection_id,
+    reduced_model_id,
+    reduction_config,
+    save_projection
+)
+from .index_metrics import IndexMetrics, store_report, write_report
+from .answer_cache import invalidate_answers
+from .vector_index import InMemoryVectorIndex
+from .vector_store import ChunkRecord, PgVectorStore, QdrantVectorStore, borrowed_connection
 
 # Load environment variables
 load_dotenv()
 
 
+def is_connection_error(error: Exception) -> bool:
+    """Whether an error means the database is unreachable (transient, worth resuming)."""
+    return isinstance(error, (psycopg2.OperationalError, psycopg2.InterfaceError))
+
+
+@dataclass
+class EmbeddedDocument:
+    """
+    A prepared document with one embedding per chunk.
+    
+    The embedding is None for chunks that failed to embed and for
+    near-duplicates, which reference their canonical chunk's content hash
+    in duplicate_of instead.
+    """
+    document: PreparedDocument
+    chunk_hashes: List[str]
+    embeddings: List[Optional[List[float]]]
+    reused: int = 0
+    duplicate_of: List[Optional[str]] = field(default_factory=list)
+    lsh_keys: List[Optional[List[str]]] = field(default_factory=list)
+    
+    @property
+    def failed(self) -> int:
+        return sum(
+            1 for i, embedding in enumerate(self.embeddings)
+            if embedding is None and not self.duplicate_at(i)
+        )
+    
+    @property
+    def duplicates(self) -> int:
+        return sum(1 for canonical in self.duplicate_of if canonical)
+    
+    def duplicate_at(self, i: int) -> Optional[str]:
+        return self.duplicate_of[i] if i < len(self.duplicate_of) else None
+
+
 class DocumentIndexer:
-    """Indexes knowledge base documents into pgvector."""
+    """Indexes knowledge base documents into pgvector (or Qdrant)."""
     
-    def __init__(self):
-        """Initialize the document indexer."""
+    def __init__(self, workers: Optional[int] = None):
+        """
+        Initialize the document indexer.
+        
+        Args:
+            workers: Processes used to parse and chunk files (defaults to
+                INDEXER_WORKERS; 1 chunks in this process, 0 uses every core)
+        """
         self.conn = None
-        # Use HybridChunker from docling-core (lightweight, no ML dependencies!)
-        self.chunker = HybridChunker(max_tokens=512)
+        # Autocommit connection for the embed stage (stored vectors, embedding cache),
+        # which runs alongside the write stage's transaction on self.conn
+        self.embed_conn = None
+        # Autocommit connection for run checkpoints
+        self.run_conn = None
+        self.embedding_cache: Optional[PersistentEmbeddingCache] = None
+        
+        # Document rows always live in PostgreSQL; chunk vectors go to the
+        # configured store. The memory backend is built from pgvector chunks.
+        backend = os.getenv("VECTOR_BACKEND", "pgvector").lower()
+        snapshot_dir = os.getenv("VECTOR_INDEX_SNAPSHOT_DIR")
+        # Snapshots are only worth writing when the FAQ Expert searches them
+        self.snapshot_dir = Path(snapshot_dir) if backend == "memory" and snapshot_dir else None
+        if backend == "qdrant":
+            self.vector_store = QdrantVectorStore.from_env()
+            self.embed_store = self.vector_store
+        else:
+            # Chunk writes join the document transaction on self.conn
+            self.vector_store = PgVectorStore(lambda: borrowed_connection(self.conn))
+            self.embed_store = PgVectorStore(lambda: borrowed_connection(self.embed_conn))
+        print(f"🗄️  Vector store: {self.vector_store.name}")
+        
+        # Chunking is CPU-bound (tokenizer-backed), so it can fan out to a process pool
+        if workers is None:
+            workers = int(os.getenv("INDEXER_WORKERS", "1"))
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.chunker_id = chunker_id()  # Changing the chunker invalidates stored chunks
+        print(f"✂️  Chunker: {self.chunker_id}")
+        # Documents buffered between pipeline stages
+        self.queue_size = max(1, int(os.getenv("INDEXER_QUEUE_SIZE", "4")))
+        
+        # Blue/green rebuilds (--rebuild): chunks go to a shadow table that is
+        # indexed, warmed and then swapped in
+        self.rebuilding = False
+        self.warmup_queries = int(os.getenv("INDEXER_WARMUP_QUERIES", "20"))
+        self.swap_lock_timeout = os.getenv("INDEXER_SWAP_LOCK_TIMEOUT", "2s")
+        self.maintenance_work_mem = os.getenv("INDEXER_MAINTENANCE_WORK_MEM") or None
+        
+        # Near-duplicate chunks (boilerplate repeated across articles) are
+        # stored once. Needs pgvector: duplicates are rows without a vector.
+        self.dedup_threshold: Optional[float] = None
+        if os.getenv("INDEXER_DEDUP", "false").lower() == "true":
+            if self.vector_store.name == "pgvector":
+                self.dedup_threshold = float(os.getenv("INDEXER_DEDUP_THRESHOLD", "0.9"))
+            else:
+                print(f"⚠️  INDEXER_DEDUP needs the pgvector backend; deduplication is off")
         
         # Configure embedding provider based on environment
         self.embedding_provider = os.getenv("EMBEDDING_PROVIDER", "github").lower()
         
         if self.embedding_provider == "ollama":
-            self.ollama_host = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
-            self.ollama_model = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
+            ollama_host = os.getenv("OLLAMA_HOST", "http://host.docker.internal:11434")
+            self.embedding_client = OllamaEmbeddingClient(
+                model=os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text"),
+                host=ollama_host
+            )
             self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
-            print(f"🤖 Using Ollama embeddings: {self.ollama_model} ({self.embedding_dimensions}D) at {self.ollama_host}")
+            print(f"🤖 Using Ollama embeddings: {self.embedding_client.model} ({self.embedding_dimensions}D) at {ollama_host}")
         elif self.embedding_provider == "lmstudio":
             # LM Studio provides OpenAI-compatible API
             lmstudio_url = os.getenv("LMSTUDIO_URL", "http://host.docker.internal:1234/v1")
-            self.lmstudio_model = os.getenv("LMSTUDIO_MODEL", "text-embedding-nomic-embed-text-v2")
-            self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
-            self.openai_client = OpenAI(
+            self.embedding_client = OpenAIEmbeddingClient(
+                provider="lmstudio",
+                model=os.getenv("LMSTUDIO_MODEL", "text-embedding-nomic-embed-text-v2"),
                 base_url=lmstudio_url,
-                api_key="lm-studio"  # LM Studio doesn't require a real key
+                api_key="lm-studio",  # LM Studio doesn't require a real key
+                max_retries=0  # Retries are handled by get_embeddings
             )
-            print(f"💻 Using LM Studio embeddings: {self.lmstudio_model} ({self.embedding_dimensions}D) at {lmstudio_url}")
+            self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
+            print(f"💻 Using LM Studio embeddings: {self.embedding_client.model} ({self.embedding_dimensions}D) at {lmstudio_url}")
+        elif self.embedding_provider == "local":
+            # Offline feature hashing: deterministic, CPU-only, no model server
+            self.embedding_dimensions = int(os.getenv("EMBEDDING_DIMENSIONS", "768"))
+            self.embedding_client = LocalEmbeddingClient(dimensions=self.embedding_dimensions)
+            print(f"🧮 Using local feature-hashing embeddings ({self.embedding_dimensions}D, offline)")
         else:
-            self.openai_client = OpenAI(
+            self.embedding_client = OpenAIEmbeddingClient(
+                provider="github",
+                model="openai/text-embedding-3-small",
                 base_url="https://models.github.ai/inference",
-                api_key=os.getenv("GITHUB_TOKEN")
+                api_key=os.getenv("GITHUB_TOKEN"),
+                max_retries=0  # Retries are handled by get_embeddings
             )
             self.embedding_dimensions = 1536  # text-embedding-3-small dimensions
             print(f"🌐 Using GitHub Models embeddings: text-embedding-3-small ({self.embedding_dimensions}D)")
         
+        # Chunks are embedded in batches: list input for OpenAI-compatible APIs,
+        # /api/embed for Ollama
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+        self.embedding_batch_tokens = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+        
+        # Batches are sent concurrently, throttled to the provider's rate limits.
+        # GitHub Models' free tier allows 15 embedding requests per minute.
+        default_rpm = "15" if self.embedding_provider == "github" else "0"
+        self.embedding_concurrency = max(1, int(os.getenv("EMBEDDING_CONCURRENCY", "4")))
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=float(os.getenv("EMBEDDING_RPM") or default_rpm),
+            tokens_per_minute=float(os.getenv("EMBEDDING_TPM", "0"))
+        )
+        self.embedding_max_retries = int(os.getenv("EMBEDDING_MAX_RETRIES", "5"))
+        self.embedding_retry_base_delay = float(os.getenv("EMBEDDING_RETRY_BASE_DELAY", "1"))
+        self.embedding_retry_max_delay = float(os.getenv("EMBEDDING_RETRY_MAX_DELAY", "60"))
+        
+        # Stored with every chunk: vectors from another model can't be reused
+        self.base_model_id = f"{self.embedding_provider}:{self.embedding_client.model}"
+        
+        # Optional dimensionality reduction of stored vectors. The embedding
+        # cache keeps full vectors, so trying another cut-off never calls the
+        # provider again. A PCA projection is loaded or fitted per run
+        # (prepare_projection); the reduction is part of the model id.
+        self.reduction, reduced_dimensions = reduction_config()
+        self.stored_dimensions = reduced_dimensions or self.embedding_dimensions
+        if self.stored_dimensions > self.embedding_dimensions:
+            raise ValueError(
+                f"EMBEDDING_REDUCED_DIMENSIONS ({self.stored_dimensions}) exceeds the model's {self.embedding_dimensions} dimensions"
+            )
+        self.use_reducer(TruncationReducer(reduced_dimensions) if self.reduction == "truncate" else None)
+        # Chunks a PCA projection is fitted on (a random sample keeps the fit bounded)
+        self.pca_fit_samples = int(os.getenv("EMBEDDING_PCA_FIT_SAMPLES", "5000"))
+        if reduced_dimensions:
+            print(f"📐 Storing {self.stored_dimensions}D embeddings ({self.reduction} from {self.embedding_dimensions}D)")
+        
+        # Per-run bookkeeping
+        self.document_metadata: Dict[str, Dict] = {}
+        self.reset_run_stats()
+        # Chunking pool kept open across the batches of a watch session
+        self.chunk_pool: Optional[ProcessPoolExecutor] = None
+        
+        # Run report: always written as JSON, optionally also kept in agent_metrics
+        self.report_path = Path(os.getenv("INDEXER_REPORT_PATH", "index-report.json"))
+        self.store_metrics = os.getenv("INDEXER_METRICS_TO_DB", "false").lower() == "true"
+        
+    def reset_run_stats(self):
+        """Start counters and stage timings afresh for a run or watch batch."""
+        self.embedded_chunks = 0
+        self.reused_chunks = 0
+        self.failed_chunks = 0
+        self.metrics = IndexMetrics()
+    
     def connect_db(self):
         """Connect to PostgreSQL database."""
         max_retries = 30
@@ -69,15 +257,22 @@ class DocumentIndexer:
         
         for attempt in range(max_retries):
             try:
-                self.conn = psycopg2.connect(
-                    host=os.getenv("POSTGRES_HOST", "postgres"),
-                    port=int(os.getenv("POSTGRES_PORT", 5432)),
-                    database=os.getenv("POSTGRES_DB", "techflow"),
-                    user=os.getenv("POSTGRES_USER", "techflow_user"),
-                    password=os.getenv("POSTGRES_PASSWORD", "techflow_pass_change_in_production")
-                )
-                register_vector(self.conn)
+                self.conn = self._connect()
+                self.embed_conn = self._connect(autocommit=True)
+                self.run_conn = self._connect(autocommit=True)
                 print(f"✓ Connected to PostgreSQL database")
+                
+                # The embedding cache commits on its own connection, so vectors
+                # survive a document transaction that rolls back
+                if os.getenv("INDEXER_EMBEDDING_CACHE", "true").lower() == "true":
+                    self.embedding_cache = PersistentEmbeddingCache(
+                        self.embed_conn,
+                        provider=self.embedding_provider,
+                        model=self.embedding_client.model,
+                        dimensions=self.embedding_dimensions
+                    )
+                if self.reduction == "pca":
+                    self.use_projection()
                 return
             except psycopg2.OperationalError as e:
                 if attempt < max_retries - 1:
@@ -86,7 +281,141 @@ class DocumentIndexer:
                 else:
                     raise Exception(f"Failed to connect to database after {max_retries} attempts: {e}")
     
-    def get_embedding(self, text: str) -> List[float]:
+    def _connect(self, autocommit: bool = False):
+        """Open a connection with pgvector types registered."""
+        conn = psycopg2.connect(
+            host=os.getenv("POSTGRES_HOST", "postgres"),
+            port=int(os.getenv("POSTGRES_PORT", 5432)),
+            database=os.getenv("POSTGRES_DB", "techflow"),
+            user=os.getenv("POSTGRES_USER", "techflow_user"),
+            password=os.getenv("POSTGRES_PASSWORD", "techflow_pass_change_in_production")
+        )
+        # Must be set before register_vector opens a transaction
+        conn.autocommit = autocommit
+        register_vector(conn)
+        return conn
+    
+    def use_reducer(self, reducer: Optional[EmbeddingReducer]):
+        """Reduce stored vectors with reducer (None stores them at full size)."""
+        self.reducer = reducer
+        self.embedding_model_id = reduced_model_id(self.base_model_id, reducer)
+    
+    def use_projection(self, projection: Optional[str] = None) -> Optional[PcaProjection]:
+        """
+        Load a stored PCA projection and reduce vectors with it.
+        
+        Args:
+            projection: Projection id (defaults to the active one)
+            
+        Returns:
+            The projection, or None if it doesn't exist (vectors are then
+            left unreduced until one is fitted)
+        """
+        with self.run_conn.cursor() as cur:
+            found = load_projection(
+                cur, self.embedding_provider, self.embedding_client.model, self.stored_dimensions, projection
+            )
+        self.use_reducer(found)
+        return found
+    
+    def prepare_projection(self, run: IndexRun, md_files: List[Path], refit: bool = False):
+        """
+        Choose the PCA projection a run stores vectors with, fitting one if needed.
+        
+        A resumed run keeps the projection it started with. Otherwise the
+        active projection is used; a new one is fitted when there is none or
+        refit is set. A new projection is stored inactive: a rebuild activates
+        it when its generation goes live, any other run once it completes, so
+        queries keep using the projection of the chunks being served (use
+        --rebuild to avoid searching a half re-embedded index meanwhile).
+        
+        Args:
+            run: The indexing run (its recorded model id is updated)
+            md_files: All knowledge base files (the projection is fitted on a sample of their chunks)
+            refit: Fit a new projection even if one is active
+        """
+        started_with = projection_id(run.embedding_model) if run.resumed else None
+        if started_with is not None:
+            if self.use_projection(started_with) is None:
+                raise ValueError(f"PCA projection {started_with} of the interrupted run no longer exists; start over with --new-run")
+            return
+        
+        if self.use_projection() is not None and not refit:
+            print(f"📐 Using PCA projection {self.reducer.id}")
+            return
+        
+        projection = self.fit_projection(md_files)
+        with self.run_conn.cursor() as cur:
+            save_projection(cur, self.embedding_provider, self.embedding_client.model, projection, active=False)
+        self.use_reducer(projection)
+        run.set_embedding_model(self.embedding_model_id)
+    
+    def fit_projection(self, md_files: List[Path]) -> PcaProjection:
+        """
+        Fit a PCA projection on the full-dimension embeddings of a sample of chunks.
+        
+        At most EMBEDDING_PCA_FIT_SAMPLES chunks are drawn (reservoir
+        sampling with a fixed seed, so refits on the same knowledge base
+        agree), which bounds the fit's memory, its SVD and its embedding
+        cache lookups however large the knowledge base is. The embeddings go
+        through the persistent cache, so the indexing pass that follows
+        reuses them instead of calling the provider again.
+        
+        Args:
+            md_files: Knowledge base files
+            
+        Returns:
+            The fitted projection (not stored yet)
+        """
+        print(f"\n📐 Fitting a {self.stored_dimensions}D PCA projection on the knowledge base...")
+        started = time.perf_counter()
+        rng = random.Random(0)
+        texts: List[str] = []
+        seen = 0
+        for _, document, error in self.prepare_documents(md_files):
+            if error is not None:
+                continue
+            for chunk in document.chunks:
+                seen += 1
+                if len(texts) < self.pca_fit_samples:
+                    texts.append(chunk.contextualized)
+                else:
+                    slot = rng.randrange(seen)
+                    if slot < self.pca_fit_samples:
+                        texts[slot] = chunk.contextualized
+        vectors = [vector for vector in self.get_embeddings(texts) if vector is not None]
+        if not vectors:
+            raise ValueError("No chunk embeddings to fit a PCA projection on")
+        
+        projection = PcaProjection.fit(np.asarray(vectors, dtype=np.float32), self.stored_dimensions)
+        elapsed = time.perf_counter() - started
+        self.metrics.record("fit_projection", elapsed)
+        print(
+            f"   {projection.id}: keeps {projection.explained_variance:.1%} of the variance "
+            f"of {projection.samples} of {seen} chunks ({elapsed:.1f}s)"
+        )
+        if projection.fitted_components < projection.dimensions:
+            print(
+                f"   ⚠️  Only {projection.fitted_components} of {projection.dimensions} components carry "
+                f"information (fewer chunks than dimensions); the rest are stored as zeros"
+            )
+        if self.embedding_cache is None:
+            print(f"   ⚠️  INDEXER_EMBEDDING_CACHE is off: sampled chunks will be embedded again for storage")
+        return projection
+    
+    def reduce_embeddings(self, embeddings: List[Optional[List[float]]]) -> List[Optional[List[float]]]:
+        """Apply the configured reduction to full-dimension embeddings (None entries stay None)."""
+        present = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if self.reducer is None or not present:
+            return embeddings
+        
+        reduced = self.reducer.reduce(np.asarray([embeddings[i] for i in present], dtype=np.float32))
+        embeddings = list(embeddings)
+        for i, vector in zip(present, reduced):
+            embeddings[i] = vector.tolist()
+        return embeddings
+    
+    def get_embedding(self, text: str) -> Optional[List[float]]:
         """
         Generate embeddings for text using configured provider (GitHub Models, Ollama, or LM Studio).
         
@@ -94,115 +423,271 @@ class DocumentIndexer:
             text: Text to embed
             
         Returns:
-            List of float values representing the embedding (dimensions vary by model)
+            List of float values representing the embedding (dimensions vary by model),
+            or None if the provider kept failing
         """
-        try:
-            if self.embedding_provider == "ollama":
-                # Use local Ollama for embeddings (no rate limits!)
-                response = ollama.embeddings(
-                    model=self.ollama_model,
-                    prompt=text,
-                    options={"host": self.ollama_host}
-                )
-                return response["embedding"]
-            elif self.embedding_provider == "lmstudio":
-                # Use LM Studio with OpenAI-compatible API
-                response = self.openai_client.embeddings.create(
-                    model=self.lmstudio_model,
-                    input=text
-                )
-                return response.data[0].embedding
-            else:
-                # Use GitHub Models for embeddings
-                response = self.openai_client.embeddings.create(
-                    model="openai/text-embedding-3-small",
-                    input=text
-                )
-                return response.data[0].embedding
-        except Exception as e:
-            print(f"    ⚠️  Warning: Failed to generate embedding: {e}")
-            # Return zero vector as fallback
-            return [0.0] * self.embedding_dimensions
+        return self.get_embeddings([text])[0]
     
-
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed one request batch within the rate limits, retrying transient errors.
+        
+        Args:
+            texts: Texts sent in a single provider request
+            
+        Returns:
+            One embedding per text
+        """
+        def attempt():
+            self.rate_limiter.acquire(sum(estimate_tokens(text) for text in texts))
+            started = time.perf_counter()
+            vectors = self.embedding_client.embed(texts)
+            self.metrics.record("embed_request", time.perf_counter() - started)
+            return vectors
+        
+        def on_retry(error: Exception, attempt_number: int, delay: float):
+            print(f"    ⏳ Embedding request failed ({error}), retry {attempt_number}/{self.embedding_max_retries} in {delay:.1f}s")
+        
+        return call_with_retries(
+            attempt,
+            max_retries=self.embedding_max_retries,
+            base_delay=self.embedding_retry_base_delay,
+            max_delay=self.embedding_retry_max_delay,
+            on_retry=on_retry
+        )
     
-    def markdown_to_docling_document(self, content: str, title: str) -> DoclingDocument:
+    def get_embeddings(self, texts: List[str]) -> List[Optional[List[float]]]:
         """
-        Convert markdown content to a DoclingDocument for HybridChunker.
+        Generate embeddings for many texts with as few provider requests as possible.
+        
+        Texts already in the persistent embedding cache are not sent at all.
+        The rest are grouped by EMBEDDING_BATCH_SIZE and an estimated token
+        budget (EMBEDDING_BATCH_TOKENS) per request, and up to
+        EMBEDDING_CONCURRENCY requests run at once within the EMBEDDING_RPM /
+        EMBEDDING_TPM limits.
         
         Args:
-            content: Markdown content
-            title: Document title
+            texts: Texts to embed
             
         Returns:
-            DoclingDocument object
+            One embedding per text, in the same order as texts. Texts whose
+            batch still failed after retries get None instead of a vector.
         """
-        doc = DoclingDocument(name=title)
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        pending = list(range(len(texts)))
         
-        # Split content by paragraphs and add as text items
-        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
+        if self.embedding_cache is not None:
+            embeddings = self.embedding_cache.get_many(texts)
+            pending = [i for i, embedding in enumerate(embeddings) if embedding is None]
         
-        for para in paragraphs:
-            # Detect if it's a heading (starts with #)
-            if para.startswith('#'):
-                label = DocItemLabel.SECTION_HEADER
-            else:
-                label = DocItemLabel.PARAGRAPH
+        pending_texts = [texts[i] for i in pending]
+        batches = batch_texts(pending_texts, self.embedding_batch_size, self.embedding_batch_tokens)
+        
+        with ThreadPoolExecutor(max_workers=min(self.embedding_concurrency, len(batches) or 1)) as pool:
+            futures = [
+                (batch, pool.submit(self.embed_batch, [pending_texts[i] for i in batch]))
+                for batch in batches
+            ]
             
-            doc.add_text(text=para, label=label)
+            for batch, future in futures:
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    print(f"    ⚠️  Warning: Failed to generate embeddings for {len(batch)} chunks: {e}")
+                    continue
+                
+                # Map vectors back to the position of their chunk
+                for i, vector in zip(batch, vectors):
+                    embeddings[pending[i]] = vector
+                self.metrics.count("embeddings", len(batch))
+                self.metrics.count("bytes_embedded", sum(len(pending_texts[i].encode("utf-8")) for i in batch))
+                self.metrics.count("tokens_embedded", sum(estimate_tokens(pending_texts[i]) for i in batch))
+        
+        if self.embedding_cache is not None and pending:
+            self.embedding_cache.put_many(pending_texts, [embeddings[i] for i in pending])
         
-        return doc
+        return embeddings
+
+
+    def markdown_to_docling_document(self, content: str, title: str):
+        """Convert markdown content to a DoclingDocument for HybridChunker."""
+        return markdown_to_docling_document(content, title)
     
-    def store_document(self, file_path: Path, title: str, chunks: List):
+    def store_document(self, document: PreparedDocument, full: bool = False):
         """
         Store document and its chunks with embeddings in the database.
         
         Args:
-            file_path: Path to the document
-            title: Document title
-            chunks: List of text chunks
+            document: Parsed and chunked document
+            full: Re-embed every chunk, ignoring stored embeddings
+        """
+        self.write_document(self.embed_document(document, full=full))
+    
+    def embed_document(
+        self,
+        document: PreparedDocument,
+        full: bool = False,
+        dedup: Optional[ChunkDeduplicator] = None
+    ) -> EmbeddedDocument:
+        """
+        Embed a document's chunks (embed stage).
+        
+        Chunks whose contextualized text hashes to a chunk already stored for
+        this document reuse its embedding; only new or edited chunks go
+        through get_embeddings (persistent cache, then the provider).
+        With a deduplicator, chunks that nearly duplicate a chunk of another
+        document are not embedded at all.
+        
+        Args:
+            document: Parsed and chunked document
+            full: Re-embed every chunk, ignoring stored embeddings
+            dedup: Near-duplicate detector for this run
+            
+        Returns:
+            The document with one embedding (or None on failure or for a
+            duplicate) per chunk
+        """
+        existing = self.document_metadata.get(str(document.file_path))
+        
+        # Context-enriched text is what gets embedded; its hash identifies the chunk.
+        # Same digest as the embedding cache's text_hash, so cache GC keeps
+        # every entry a current chunk still needs
+        enriched_texts = [chunk.contextualized for chunk in document.chunks]
+        chunk_hashes = [content_hash(text) for text in enriched_texts]
+        
+        # Reuse stored vectors for unchanged chunks (same text, same model)
+        stored = {}
+        if existing and not full and existing.get("embedding_model") == self.embedding_model_id:
+            stored = self.embed_store.get_chunk_embeddings(existing["id"])
+        
+        # Near-duplicates of a chunk in another document point at it instead
+        duplicate_of: List[Optional[str]] = [None] * len(chunk_hashes)
+        lsh_keys: List[Optional[List[str]]] = [None] * len(chunk_hashes)
+        if dedup is not None:
+            source = str(document.file_path)
+            document_id = str(existing["id"]) if existing else None
+            for i, chunk in enumerate(document.chunks):
+                duplicate_of[i], lsh_keys[i] = dedup.find(chunk.text, source, document_id)
+        
+        embeddings = [
+            None if duplicate_of[i] else stored.get(chunk_hash)
+            for i, chunk_hash in enumerate(chunk_hashes)
+        ]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None and not duplicate_of[i]]
+        duplicates = sum(1 for canonical in duplicate_of if canonical)
+        reused = len(embeddings) - len(missing) - duplicates
+        
+        fresh = self.get_embeddings([enriched_texts[i] for i in missing])
+        for i, embedding in zip(missing, self.reduce_embeddings(fresh)):
+            embeddings[i] = embedding
+        self.embedded_chunks += len(missing)
+        self.reused_chunks += reused
+        
+        if dedup is not None:
+            for i, chunk in enumerate(document.chunks):
+                if not duplicate_of[i] and embeddings[i] is not None:
+                    dedup.add(chunk_hashes[i], chunk.text, lsh_keys[i], source)
+            if duplicates:
+                self.metrics.count("duplicate_chunks", duplicates)
+                self.metrics.count("bytes_deduplicated", sum(
+                    len(chunk.text.encode("utf-8")) for i, chunk in enumerate(document.chunks) if duplicate_of[i]
+                ))
+                # Each duplicate would have needed a vector unless one was stored already
+                self.metrics.count("embeddings_avoided", sum(
+                    1 for i, chunk_hash in enumerate(chunk_hashes) if duplicate_of[i] and chunk_hash not in stored
+                ))
+        
+        return EmbeddedDocument(
+            document, chunk_hashes, embeddings, reused=reused, duplicate_of=duplicate_of, lsh_keys=lsh_keys
+        )
+    
+    def write_document(self, embedded: EmbeddedDocument, run: Optional[IndexRun] = None):
+        """
+        Write a document and its embedded chunks in one transaction (write stage).
+        
+        The writes are a fixed handful of statements however many chunks the
+        document has.
+        
+        Args:
+            embedded: Output of embed_document
+            run: Indexing run to checkpoint the document in, within the same transaction
         """
+        document = embedded.document
+        file_path, title, chunks = document.file_path, document.title, document.chunks
+        failed = embedded.failed
+        
+        db_started = time.perf_counter()
         cursor = self.conn.cursor()
         
         try:
-            # Insert or update document
-            cursor.execute(
-                "SELECT id FROM kb_documents WHERE filepath = %s",
-                (str(file_path),)
-            )
-            existing = cursor.fetchone()
+            # Insert or update the document, recording what it was indexed
+            # from for the next incremental run
+            document_id, _, inserted = self.upsert_documents(cursor, [{
+                "filename": file_path.name,
+                "filepath": str(file_path),
+                "title": title,
+                "file_size": file_path.stat().st_size,
+                "metadata": {
+                    "content_hash": document.file_hash,
+                    "embedding_model": self.embedding_model_id,
+                    "chunker": self.chunker_id,
+                    "chunk_count": len(chunks),
+                    "failed_chunks": failed,
+                    "duplicate_chunks": embedded.duplicates
+                }
+            }])[0]
             
-            if existing:
-                document_id = existing[0]
-                cursor.execute("DELETE FROM kb_chunks WHERE document_id = %s", (document_id,))
-                cursor.execute(
-                    "UPDATE kb_documents SET title=%s, file_size=%s, updated_at=NOW(), indexed_at=NOW() WHERE id=%s",
-                    (title, file_path.stat().st_size, document_id)
-                )
-            else:
-                cursor.execute(
-                    "INSERT INTO kb_documents (filename, filepath, title, content_type, file_size, indexed_at) VALUES (%s, %s, %s, %s, %s, NOW()) RETURNING id",
-                    (file_path.name, str(file_path), title, "text/markdown", file_path.stat().st_size)
-                )
-                document_id = cursor.fetchone()[0]
+            if not inserted and not self.rebuilding:
+                # Cached answers citing the old content are now stale (a
+                # rebuild clears them all when the new generation goes live)
+                invalidated = invalidate_answers(cursor, [file_path.name])
+                if invalidated:
+                    print(f"  🧹 Invalidated {invalidated} cached answers")
             
-            # Store chunks with embeddings
-            print(f"  🔄 Generating embeddings for {len(chunks)} chunks...")
-            for idx, chunk in enumerate(chunks):
-                # Get context-enriched text from HybridChunker
-                enriched_text = self.chunker.contextualize(chunk=chunk)
-                
-                # Generate embedding from enriched text
-                embedding = self.get_embedding(enriched_text)
+            records = []
+            for idx, (chunk, embedding) in enumerate(zip(chunks, embedded.embeddings)):
+                metadata = {
+                    "tokens": chunk.tokens,
+                    "content_hash": embedded.chunk_hashes[idx],
+                    "embedding_model": self.embedding_model_id
+                }
+                if embedded.duplicate_at(idx):
+                    # Served by the canonical chunk: no vector, no HNSW node
+                    metadata["duplicate_of"] = embedded.duplicate_at(idx)
+                elif embedding is None:
+                    # Keep the chunk without a vector so it can be re-embedded
+                    # later, rather than polluting the index with a zero vector
+                    metadata["embedding_status"] = "failed"
+                elif idx < len(embedded.lsh_keys) and embedded.lsh_keys[idx]:
+                    # Lets later documents find this chunk as a canonical copy
+                    metadata["lsh"] = embedded.lsh_keys[idx]
                 
                 # Store chunk with raw text
-                cursor.execute(
-                    "INSERT INTO kb_chunks (document_id, chunk_index, content, embedding, metadata) VALUES (%s, %s, %s, %s, %s)",
-                    (document_id, idx, chunk.text.strip(), embedding, Json({"tokens": len(chunk.text.split())}))
-                )
+                records.append(ChunkRecord(
+                    document_id=document_id,
+                    chunk_index=idx,
+                    content=chunk.text,
+                    embedding=embedding,
+                    metadata=metadata,
+                    title=title,
+                    filename=file_path.name
+                ))
+            
+            # Overwrite chunks in place and drop any left over from a longer version
+            self.vector_store.upsert_batch(records)
+            self.vector_store.delete_chunks_from(document_id, len(records))
+            
+            if run is not None:
+                run.mark(str(file_path), COMMITTED, document.file_hash, cursor=cursor)
             
             self.conn.commit()
-            print(f"  ✓ Stored {len(chunks)} chunks with embeddings")
+            db_ms = (time.perf_counter() - db_started) * 1000
+            self.failed_chunks += failed
+            duplicates = f", {embedded.duplicates} duplicates" if embedded.duplicates else ""
+            if failed:
+                print(f"  ⚠️  Stored {len(chunks)} chunks ({embedded.reused} reused{duplicates}), {failed} without embeddings (marked as failed) in {db_ms:.0f} ms")
+            else:
+                print(f"  ✓ Stored {len(chunks)} chunks with embeddings ({embedded.reused} reused{duplicates}) in {db_ms:.0f} ms")
             
         except Exception as e:
             self.conn.rollback()
@@ -211,15 +696,139 @@ class DocumentIndexer:
         finally:
             cursor.close()
     
-    def index_knowledge_base(self, kb_path: Path):
+    def upsert_documents(self, cursor, documents: List[Dict]) -> List[tuple]:
         """
-        Index all markdown files in the knowledge base directory using batch processing.
+        Insert or update document rows in a single statement.
+        
+        Metadata is merged into any existing metadata.
+        
+        Args:
+            cursor: Open database cursor
+            documents: Dicts with filename, filepath, title, file_size and metadata
+            
+        Returns:
+            (id, filepath, inserted) per document, in input order
+        """
+        rows = execute_values(cursor, """
+            INSERT INTO kb_documents (filename, filepath, title, content_type, file_size, metadata, indexed_at)
+            VALUES %s
+            ON CONFLICT (filepath) DO UPDATE SET
+                filename = EXCLUDED.filename,
+                title = EXCLUDED.title,
+                file_size = EXCLUDED.file_size,
+                metadata = COALESCE(kb_documents.metadata, '{}'::jsonb) || EXCLUDED.metadata,
+                updated_at = NOW(),
+                indexed_at = NOW()
+            RETURNING id, filepath, (xmax = 0) AS inserted
+        """, [
+            (doc["filename"], doc["filepath"], doc["title"], "text/markdown", doc["file_size"], Json(doc["metadata"]))
+            for doc in documents
+        ], template="(%s, %s, %s, %s, %s, %s, NOW())", fetch=True)
+        
+        # RETURNING order isn't guaranteed to follow VALUES order
+        by_path = {row[1]: row for row in rows}
+        return [by_path[doc["filepath"]] for doc in documents]
+    
+    def load_document_metadata(self) -> Dict[str, Dict]:
+        """
+        Load the metadata of every indexed document.
+        
+        Returns:
+            Document metadata (plus its id) keyed by file path
+        """
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT id, filepath, metadata FROM kb_documents")
+            return {
+                filepath: {**(metadata or {}), "id": document_id}
+                for document_id, filepath, metadata in cursor.fetchall()
+            }
+    
+    def is_unchanged(self, file_path: Path, file_hash: str) -> bool:
+        """
+        Check whether a file is already fully indexed from the same content and settings.
+        
+        Documents with chunks that failed to embed are never considered
+        unchanged, so they are retried on the next run.
+        """
+        metadata = self.document_metadata.get(str(file_path))
+        return (
+            metadata is not None
+            and metadata.get("content_hash") == file_hash
+            and metadata.get("embedding_model") == self.embedding_model_id
+            and metadata.get("chunker") == self.chunker_id
+            and metadata.get("failed_chunks", 0) == 0
+        )
+    
+    def prune_documents(self, current_paths: List[Path]) -> int:
+        """
+        Remove documents whose source file no longer exists in the knowledge base.
+        
+        Args:
+            current_paths: Markdown files found in this run
+            
+        Returns:
+            Number of documents removed
+        """
+        current = {str(path) for path in current_paths}
+        stale = {
+            filepath: metadata for filepath, metadata in self.document_metadata.items()
+            if filepath not in current
+        }
+        if not stale:
+            return 0
+        
+        with self.conn.cursor() as cursor:
+            try:
+                for filepath, metadata in stale.items():
+                    self.vector_store.delete_document(metadata["id"])
+                    cursor.execute("DELETE FROM kb_documents WHERE id = %s", (metadata["id"],))
+                    print(f"  🗑️  Removed: {Path(filepath).name}")
+                invalidate_answers(cursor, [Path(filepath).name for filepath in stale])
+                self.conn.commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+        
+        return len(stale)
+    
+    def index_knowledge_base(
+        self,
+        kb_path: Path,
+        full: bool = False,
+        retry_failed: bool = False,
+        new_run: bool = False,
+        rebuild: bool = False,
+        refit_projection: bool = False
+    ):
+        """
+        Index the markdown files in the knowledge base directory incrementally.
+        
+        Files whose content hash matches the last run are skipped, edited files
+        only re-embed the chunks that changed, and documents whose file was
+        deleted are removed.
+        
+        The run is checkpointed per document: if it is interrupted (crash,
+        lost database connection), the next run resumes it and skips
+        documents it already committed. Documents that fail are quarantined
+        and skipped until their file changes or they are retried.
+        
+        A rebuild writes every document into a new index generation (a shadow
+        table) while searches keep using the live one, then swaps it in
+        atomically; see promote_generation.
         
         Args:
             kb_path: Path to the knowledge base directory
+            full: Re-index and re-embed every file, ignoring content hashes
+            retry_failed: Only retry quarantined documents
+            new_run: Abandon an unfinished run instead of resuming it
+            rebuild: Build a new index generation and swap it in
+            refit_projection: Fit a new PCA projection (EMBEDDING_REDUCTION=pca)
         """
         if not kb_path.exists():
             raise ValueError(f"Knowledge base path does not exist: {kb_path}")
+        if rebuild and self.vector_store.name != "pgvector":
+            raise ValueError("Index rebuilds need the pgvector backend (VECTOR_BACKEND=pgvector)")
+        self.reset_run_stats()
         
         # Find all markdown files
         md_files = sorted(kb_path.glob("*.md"))
@@ -228,49 +837,733 @@ class DocumentIndexer:
             print(f"⚠️  No markdown files found in {kb_path}")
             return
         
-        print(f"\n📚 Found {len(md_files)} documents to index\n")
+        quarantine = quarantined_documents(self.run_conn)
+        if retry_failed:
+            candidates = [path for path in md_files if str(path) in quarantine]
+            quarantine = {}
+            print(f"\n🔁 Retrying {len(candidates)} quarantined documents")
+        else:
+            candidates = md_files
+        
+        run = IndexRun.start(
+            self.run_conn, full, self.embedding_model_id, new_run=new_run, rebuild=rebuild, retry_failed=retry_failed
+        )
+        generations = IndexGenerations(self.conn)
+        finished = set()
+        if run.resumed:
+            full, rebuild = run.full, run.rebuild
+            finished = run.finished_paths()
+            mode = " ".join(flag for flag, on in (("--full", full), ("--rebuild", rebuild)) if on)
+            print(f"\n⏯️  Resuming run {run.id}{f' ({mode})' if mode else ''}: {len(finished)} documents already done")
+        elif generations.exists(SHADOW_TABLE):
+            # Left behind by an abandoned rebuild
+            generations.discard_shadow()
+            self.conn.commit()
+            print(f"\n🗑️  Discarded the unfinished index generation ({SHADOW_TABLE})")
+        
+        if rebuild:
+            if not (run.resumed and generations.exists(SHADOW_TABLE)):
+                generations.create_shadow()
+                self.conn.commit()
+                finished = set()
+            print(f"\n🟢 Building a new index generation in {SHADOW_TABLE}; searches keep using the live index")
+        if self.reduction == "pca":
+            self.prepare_projection(run, md_files, refit=refit_projection)
+        run.register(str(path) for path in candidates if str(path) not in quarantine)
+        
+        print(f"\n📚 Found {len(candidates)} documents to index{' (full re-index)' if full else ''}\n")
         print(f"🔄 Processing markdown files...\n")
         
-        # Process each markdown file
-        for file_path in md_files:
+        self.document_metadata = self.load_document_metadata()
+        live_store = self.vector_store
+        if rebuild:
+            self.vector_store = PgVectorStore(lambda: borrowed_connection(self.conn), table=SHADOW_TABLE)
+            self.rebuilding = True
+        try:
+            result = self.index_files(
+                candidates, full=full, reindex=rebuild, run=run, finished=finished, quarantine=quarantine
+            )
+            pruned = 0 if retry_failed else self.prune_documents(md_files)
+            repaired = self.repair_duplicates(run)
+        except Exception as e:
+            if is_connection_error(e):
+                print(f"\n⏸️  Lost the database connection; run {run.id} resumes from its checkpoint on the next start")
+            raise
+        finally:
+            self.vector_store = live_store
+            self.rebuilding = False
+        indexed, skipped, elapsed, stats = result["indexed"], result["skipped"], result["elapsed"], result["stats"]
+        
+        summary = {
+            "indexed": indexed,
+            "unchanged": skipped,
+            "failed": result["failed"],
+            "quarantined": result["quarantined"],
+            "removed": pruned,
+            "repaired": repaired,
+            "chunks_embedded": self.embedded_chunks,
+            "chunks_reused": self.reused_chunks,
+            "elapsed_seconds": round(elapsed, 2)
+        }
+        if rebuild:
+            # The run is only completed once its generation is live
+            self.promote_generation(generations, run, summary)
+        else:
+            run.finish(summary)
+            if self.reduction == "pca" and self.reducer is not None:
+                # Queries switch to a newly fitted projection once its chunks are written
+                with self.run_conn.cursor() as cursor:
+                    activate_projection(cursor, self.reducer.id)
+        
+        print(f"\n✅ Indexing complete!\n")
+        print(f"   Indexed: {indexed}, unchanged: {skipped}, removed: {pruned}, failed: {result['failed']}")
+        print(f"   Chunks embedded: {self.embedded_chunks}, reused: {self.reused_chunks}")
+        if self.embedding_cache is not None:
+            print(f"   Embedding cache: {self.embedding_cache.hits} hits, {self.embedding_cache.misses} misses")
+        duplicates = self.metrics.counters.get("duplicate_chunks", 0)
+        if duplicates:
+            vector_mb = duplicates * self.stored_dimensions * 4 / 1024 / 1024
+            print(
+                f"   Deduplicated {duplicates} chunks: {self.metrics.counters.get('embeddings_avoided', 0)} embedding calls "
+                f"and ~{vector_mb:.1f} MB of vectors saved "
+                f"({self.metrics.counters.get('bytes_deduplicated', 0) / 1024:.0f} KB of text)"
+            )
+        utilization = {
+            name: round(stage.busy_seconds / elapsed, 3) if elapsed > 0 else 0.0
+            for name, stage in (("chunk", stats["source"]), ("embed", stats["embed"]), ("write", stats["write"]))
+        }
+        if indexed and elapsed > 0:
+            busy = ", ".join(f"{name} {share:.0%}" for name, share in utilization.items())
+            print(f"   Pipeline: {elapsed:.1f}s, stage utilization {busy}")
+        
+        report = self.metrics.report({
+            "run_id": run.id,
+            "full": full,
+            "rebuild": rebuild,
+            "embedding_model": self.embedding_model_id,
+            "embedding_dimensions": self.stored_dimensions,
+            "chunker": self.chunker_id,
+            "workers": self.workers,
+            "summary": summary,
+            "pipeline_utilization": utilization
+        })
+        self.print_report(report)
+        print()
+        if self.failed_chunks:
+            print(f"⚠️  {self.failed_chunks} chunks could not be embedded and are marked as failed; re-run the indexer to retry them\n")
+        
+        quarantined = quarantined_documents(self.run_conn)
+        if quarantined:
+            print(f"🚧 {len(quarantined)} documents are quarantined (skipped until edited):")
+            for filepath, entry in sorted(quarantined.items()):
+                print(f"   {Path(filepath).name}: {entry['error']}")
+            print(f"   Retry them with: python -m src.indexer --retry-failed\n")
+        
+        self.write_vector_snapshot(changed=bool(indexed or pruned or rebuild))
+        self.save_report(report)
+    
+    def print_report(self, report: Dict):
+        """Print throughput and per-stage latency from a run report."""
+        if not report["stages"]:
+            return
+        throughput = report["throughput"]
+        print(
+            f"   Throughput: {throughput['documents_per_second']:g} docs/s, "
+            f"{throughput['chunks_per_second']:g} chunks/s, "
+            f"{throughput['embeddings_per_second']:g} embeddings/s "
+            f"({report['counters'].get('tokens_embedded', 0)} tokens embedded)"
+        )
+        latency = ", ".join(
+            f"{name} {stage['p50_ms']:.0f}/{stage['p95_ms']:.0f}"
+            for name, stage in report["stages"].items()
+        )
+        print(f"   Latency p50/p95 (ms): {latency}")
+    
+    def save_report(self, report: Dict):
+        """
+        Write the run report to INDEXER_REPORT_PATH, and to agent_metrics
+        when INDEXER_METRICS_TO_DB is set. A report that can't be saved
+        never fails the run.
+        """
+        try:
+            write_report(report, self.report_path)
+            print(f"📊 Wrote run report to {self.report_path}")
+        except OSError as e:
+            print(f"⚠️  Could not write run report to {self.report_path}: {e}")
+        
+        if self.store_metrics:
             try:
-                print(f"  📄 Processing: {file_path.name}")
-                
-                # Read markdown file with frontmatter
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    post = frontmatter.load(f)
-                
-                # Extract title (from frontmatter or filename)
-                title = post.get('title', file_path.stem.replace("-", " ").title())
-                
-                # Get content
-                content = post.content
-                
-                # Convert to DoclingDocument
-                doc = self.markdown_to_docling_document(content, title)
+                store_report(self.run_conn, report)
+            except psycopg2.Error as e:
+                print(f"⚠️  Could not store run report in agent_metrics: {e}")
+    
+    def new_deduplicator(self) -> Optional[ChunkDeduplicator]:
+        """Near-duplicate detector for one pass over the knowledge base (None when disabled)."""
+        if self.dedup_threshold is None:
+            return None
+        # Stored canonical chunks are looked up in the table being written
+        # (the shadow table during a rebuild), on the embed stage's connection
+        lookup_store = PgVectorStore(lambda: borrowed_connection(self.embed_conn), table=self.vector_store.table)
+        return ChunkDeduplicator(self.dedup_threshold, lookup=lookup_store.find_duplicate_candidates)
+    
+    def repair_duplicates(self, run: Optional[IndexRun] = None) -> int:
+        """
+        Re-index documents whose duplicate chunks lost their canonical chunk.
+        
+        That happens when the document holding the canonical copy is edited,
+        deleted or failed to store. The affected documents go through the
+        pipeline again, with a fresh deduplicator that only trusts stored
+        canonical chunks, so each duplicate either finds a new canonical
+        copy or gets its own embedding.
+        
+        Args:
+            run: Indexing run to checkpoint the documents in
+            
+        Returns:
+            Number of documents re-indexed
+        """
+        if self.dedup_threshold is None:
+            return 0
+        
+        paths = [Path(path) for path in self.vector_store.orphaned_duplicate_documents() if Path(path).exists()]
+        if not paths:
+            return 0
+        
+        print(f"\n🔗 Re-indexing {len(paths)} documents whose canonical chunks changed\n")
+        self.document_metadata = self.load_document_metadata()
+        return self.index_files(paths, reindex=True, run=run)["indexed"]
+    
+    def promote_generation(self, generations: IndexGenerations, run: IndexRun, summary: Dict):
+        """
+        Index, warm and swap in the generation a rebuild wrote.
+        
+        Documents the rebuild could not write keep their current chunks, the
+        secondary indexes (HNSW included) are built on the loaded table, and
+        sample searches warm them before the rename makes the generation
+        live. The previous generation is kept as kb_chunks_prev for
+        --rollback. If anything fails, the live index is untouched and the
+        run resumes from here on the next start.
+        
+        Args:
+            generations: Generation tables on the indexer connection
+            run: The rebuild's indexing run, completed in the swap transaction
+            summary: Run counters
+        """
+        print(f"\n🏗️  Finalizing the new index generation...")
+        promote_started = time.perf_counter()
+        try:
+            carried = generations.carry_over(run.id)
+            if carried:
+                print(f"   Kept {carried} live chunks of documents that were not re-indexed")
+            
+            started = time.perf_counter()
+            built = generations.build_indexes(self.maintenance_work_mem)
+            self.conn.commit()
+            print(f"   Built {len(built)} indexes in {time.perf_counter() - started:.1f}s")
+            
+            average_ms = generations.warm(self.warmup_queries)
+            self.conn.commit()
+            if average_ms is not None:
+                print(f"   Warmed with {self.warmup_queries} sample searches ({average_ms:.1f} ms average)")
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        def before_commit(cursor):
+            run.finish(summary, cursor=cursor)
+            # Queries switch to the generation's PCA projection together with its chunks
+            activate_live_projection(cursor)
+        
+        generations.promote(lock_timeout=self.swap_lock_timeout, before_commit=before_commit)
+        self.metrics.record("promote", time.perf_counter() - promote_started)
+        print(f"🔀 New index generation is live (previous one kept; undo with --rollback)")
+    
+    def rollback_generation(self):
+        """Swap the previous index generation back in (pgvector only)."""
+        if self.vector_store.name != "pgvector":
+            raise ValueError("Index rollbacks need the pgvector backend (VECTOR_BACKEND=pgvector)")
+        
+        IndexGenerations(self.conn).rollback(
+            lock_timeout=self.swap_lock_timeout, before_commit=activate_live_projection
+        )
+        print(f"\n⏪ Previous index generation is live again (roll forward with --rollback)")
+        print(f"   The next run re-checks every document against it\n")
+        self.write_vector_snapshot()
+    
+    def index_files(
+        self,
+        md_files: List[Path],
+        full: bool = False,
+        reindex: bool = False,
+        run: Optional[IndexRun] = None,
+        finished: Optional[set] = None,
+        quarantine: Optional[Dict[str, Dict]] = None
+    ) -> Dict:
+        """
+        Run the indexing pipeline over a set of files.
+        
+        Expects self.document_metadata to be loaded. A lost database
+        connection aborts the pipeline (so the run can be resumed); any other
+        per-document error is recorded as failed and the run moves on.
+        
+        Args:
+            md_files: Markdown files to consider (unchanged ones are skipped)
+            full: Re-index and re-embed every file, ignoring content hashes
+            reindex: Re-index every file but reuse stored embeddings
+            run: Indexing run to checkpoint documents in
+            finished: File paths the run already committed or quarantined
+            quarantine: Quarantined documents, skipped while unchanged
+            
+        Returns:
+            Dict with indexed, skipped, failed and quarantined counts, elapsed
+            seconds, per-stage stats and "written": commit time (epoch
+            seconds) per indexed file
+        """
+        counts = {"indexed": 0, "skipped": 0, "failed": 0, "quarantined": 0}
+        written: Dict[Path, float] = {}
+        dedup = self.new_deduplicator()
+        
+        if self.workers > 1:
+            print(f"⚙️  Chunking with {self.workers} worker processes\n")
+        
+        def embed_stage(item):
+            file_path, document, error = item
+            if error is not None:
+                return item
+            self.metrics.record("parse", document.parse_seconds)
+            self.metrics.record("chunk", document.chunk_seconds)
+            self.metrics.count("bytes_read", document.size_bytes)
+            try:
+                started = time.perf_counter()
+                embedded = self.embed_document(document, full=full, dedup=dedup)
+                self.metrics.record("embed", time.perf_counter() - started)
+                return file_path, embedded, None
+            except Exception as e:
+                return file_path, None, e
+        
+        def record_failure(file_path: Path, error: Exception):
+            print(f"  ✗ Failed to process {file_path.name}: {error}")
+            counts["failed"] += 1
+            if run is not None:
+                try:
+                    file_hash = content_hash(file_path.read_bytes())
+                except OSError:
+                    file_hash = None
+                run.mark(str(file_path), FAILED, file_hash, error=str(error))
+        
+        # discover -> parse/chunk (source thread, optionally a process pool)
+        # -> embed (thread) -> write (this thread, which owns the transaction).
+        # Bounded queues between stages keep memory flat and let chunking,
+        # embedding calls and DB writes overlap.
+        stats: Dict[str, StageStats] = {}
+        stats["write"] = StageStats("write")
+        started = time.perf_counter()
+        
+        for file_path, embedded, error in run_pipeline(
+            self.prepare_documents(self.discover_changed(md_files, full or reindex, counts, finished, quarantine, run)),
+            [("embed", embed_stage)],
+            queue_size=self.queue_size,
+            stats=stats
+        ):
+            print(f"  📄 Processing: {file_path.name}")
+            if error is not None:
+                if is_connection_error(error):
+                    raise error
+                record_failure(file_path, error)
+                continue
+            
+            write_started = time.perf_counter()
+            try:
+                if run is not None:
+                    run.mark(str(file_path), EMBEDDED, embedded.document.file_hash)
                 
-                # Chunk using HybridChunker
-                chunks = [c for c in self.chunker.chunk(doc) if c.text.strip()]
+                # Store in database
+                self.write_document(embedded, run=run)
+                counts["indexed"] += 1
+                written[file_path] = time.time()
+                self.metrics.record("write", time.perf_counter() - write_started)
+                self.metrics.count("documents")
+                self.metrics.count("chunks", len(embedded.document.chunks))
+            except Exception as e:
+                # A transient outage must not quarantine the rest of the run
+                if is_connection_error(e):
+                    raise
+                record_failure(file_path, e)
+            finally:
+                stats["write"].items += 1
+                stats["write"].busy_seconds += time.perf_counter() - write_started
+        
+        return {
+            **counts,
+            "elapsed": time.perf_counter() - started,
+            "stats": stats,
+            "written": written
+        }
+    
+    @staticmethod
+    def scan(kb_path: Path) -> Dict[Path, Tuple[int, int]]:
+        """Modification time (ns) and size of every markdown file, for change detection."""
+        files = {}
+        for path in kb_path.glob("*.md"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue  # Deleted between glob and stat
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+    
+    def watch(self, kb_path: Path, interval: float = 1.0, debounce: float = 2.0):
+        """
+        Keep the index in sync with the knowledge base until interrupted.
+        
+        Polls the directory every `interval` seconds. A burst of saves is
+        handled as one batch once nothing has changed for `debounce` seconds;
+        only created/modified files are re-indexed (each in its own
+        transaction) and deleted files are pruned. Each event reports the
+        latency from file save to searchable.
+        
+        Polling (rather than inotify) also works on bind mounts from macOS
+        and Windows hosts.
+        
+        Args:
+            kb_path: Path to the knowledge base directory
+            interval: Seconds between directory scans
+            debounce: Quiet period that ends a burst of changes
+        """
+        # One chunking pool for the whole session, so workers load the
+        # tokenizer and chunker once rather than once per batch
+        if self.workers > 1:
+            self.chunk_pool = self.start_chunk_pool()
+        try:
+            # Catch up with anything that changed while we weren't watching
+            self.index_knowledge_base(kb_path)
+            self.end_read_transaction()
+            known = self.scan(kb_path)
+            print(f"👀 Watching {kb_path} for changes (poll {interval:g}s, debounce {debounce:g}s)...\n")
+            
+            while True:
+                time.sleep(interval)
+                current = self.scan(kb_path)
+                if current == known:
+                    continue
+                detected_at = time.time()
                 
-                print(f"    ✓ Generated {len(chunks)} chunks")
+                # Debounce: wait for the burst of saves to settle
+                quiet_since = time.monotonic()
+                while time.monotonic() - quiet_since < debounce:
+                    time.sleep(interval)
+                    latest = self.scan(kb_path)
+                    if latest != current:
+                        current, quiet_since = latest, time.monotonic()
                 
-                # Store in database
-                self.store_document(file_path, title, chunks)
+                changed = sorted(path for path, state in current.items() if known.get(path) != state)
+                deleted = sorted(path for path in known if path not in current)
                 
-            except Exception as e:
-                print(f"  ✗ Failed to process {file_path.name}: {e}")
+                try:
+                    self.apply_changes(changed, deleted, current, detected_at)
+                    known = current
+                except Exception as e:
+                    print(f"  ✗ Failed to apply changes: {e}")
+                    if self.conn is None or self.conn.closed:
+                        self.close()
+                        self.connect_db()
+                    if self.chunk_pool is not None:
+                        # A crashed worker breaks the pool for every later batch
+                        self.stop_chunk_pool()
+                        self.chunk_pool = self.start_chunk_pool()
+                    # known is left as-is so the batch is retried on the next scan
+                self.end_read_transaction()
+        finally:
+            self.stop_chunk_pool()
+    
+    def end_read_transaction(self):
+        """
+        End the transaction left open on self.conn by read-only queries.
+        
+        Writes are committed per document, but metadata loads, generation
+        checks and duplicate repairs still open a transaction; rolling it
+        back keeps the watcher from sitting idle in transaction (holding a
+        snapshot that blocks vacuum) between batches.
+        """
+        if self.conn is not None and not self.conn.closed:
+            self.conn.rollback()
+    
+    def apply_changes(
+        self,
+        changed: List[Path],
+        deleted: List[Path],
+        current: Dict[Path, Tuple[int, int]],
+        detected_at: float
+    ):
+        """
+        Re-index changed files and prune deleted ones (one watch batch).
+        
+        Args:
+            changed: Created or modified files
+            deleted: Files that disappeared
+            current: Latest scan, used for save times and pruning
+            detected_at: When the first change of the batch was noticed
+        """
+        print(f"🔔 {len(changed)} changed, {len(deleted)} deleted")
+        
+        self.reset_run_stats()
+        self.document_metadata = self.load_document_metadata()
+        result = self.index_files(changed)
+        pruned = self.prune_documents(sorted(current))
+        repaired = self.repair_duplicates()
+        
+        # With the in-process backend, changes are searchable once the snapshot is published
+        self.write_vector_snapshot(changed=bool(result["indexed"] or pruned or repaired))
+        snapshot = self.snapshot_dir is not None
+        published_at = time.time()
+        
+        for path, committed_at in result["written"].items():
+            saved_at = current[path][0] / 1e9
+            searchable_at = published_at if snapshot else committed_at
+            print(f"  ⏱️  {path.name}: saved → searchable in {searchable_at - saved_at:.2f}s")
+        for path in deleted:
+            # No save time for a deletion; measure from when it was detected
+            print(f"  ⏱️  {path.name} (deleted): detected → removed in {published_at - detected_at:.2f}s")
+        print()
+    
+    def discover_changed(
+        self,
+        md_files: List[Path],
+        full: bool,
+        counts: Dict[str, int],
+        finished: Optional[set] = None,
+        quarantine: Optional[Dict[str, Dict]] = None,
+        run: Optional[IndexRun] = None
+    ) -> Iterator[Path]:
+        """
+        Yield the files that need indexing (discover stage).
+        
+        Hashing is cheap: only changed files get parsed, chunked and embedded.
+        
+        Args:
+            md_files: Markdown files in the knowledge base
+            full: Yield every file, ignoring content hashes
+            counts: "skipped", "quarantined" and "failed" entries are incremented for files not yielded
+            finished: File paths the current run already committed or quarantined
+            quarantine: Quarantined documents; skipped while their hash is unchanged
+            run: Indexing run in which unreadable files are marked failed
+        """
+        finished = finished or set()
+        quarantine = quarantine or {}
+        
+        for file_path in md_files:
+            if str(file_path) in finished:
+                counts["skipped"] += 1
                 continue
+            
+            try:
+                file_hash = content_hash(file_path.read_bytes())
+            except OSError as e:
+                print(f"  ✗ Failed to read {file_path.name}: {e}")
+                counts["failed"] += 1
+                if run is not None:
+                    run.mark(str(file_path), FAILED, error=str(e))
+                continue
+            
+            if quarantine.get(str(file_path), {}).get("file_hash") == file_hash:
+                counts["quarantined"] += 1
+            elif not full and self.is_unchanged(file_path, file_hash):
+                counts["skipped"] += 1
+            else:
+                yield file_path
+    
+    def prepare_documents(
+        self, paths: Iterable[Path]
+    ) -> Iterator[Tuple[Path, Optional[PreparedDocument], Optional[Exception]]]:
+        """
+        Parse and chunk files, in this process or across a process pool.
         
-        print(f"\n✅ Indexing complete!\n")
+        With more than one worker, each worker builds its own chunker once and
+        files are kept in flight a few per worker, so chunking runs ahead of
+        the embedding/DB stages without holding the whole knowledge base in
+        memory.
+        
+        Args:
+            paths: Markdown files to prepare
+            
+        Yields:
+            (path, document, error) in input order; error is set instead of
+            document when the file could not be prepared
+        """
+        if self.workers <= 1:
+            init_chunk_worker()
+            for path in paths:
+                try:
+                    yield path, prepare_document(path), None
+                except Exception as e:
+                    yield path, None, e
+            return
+        
+        remaining = iter(paths)
+        # A watch session keeps one pool open; otherwise the pool lives for this run
+        shared = self.chunk_pool is not None
+        pool = self.chunk_pool if shared else self.start_chunk_pool()
+        in_flight = deque()
+        try:
+            in_flight.extend(
+                (path, pool.submit(prepare_document, path))
+                for path in islice(remaining, self.workers * 4)
+            )
+            while in_flight:
+                path, future = in_flight.popleft()
+                next_path = next(remaining, None)
+                if next_path is not None:
+                    in_flight.append((next_path, pool.submit(prepare_document, next_path)))
+                
+                try:
+                    yield path, future.result(), None
+                except Exception as e:
+                    yield path, None, e
+        finally:
+            # Also runs when the pipeline stops early and closes this generator
+            if shared:
+                for _, future in in_flight:
+                    future.cancel()
+            else:
+                pool.shutdown(cancel_futures=True)
+    
+    def start_chunk_pool(self) -> ProcessPoolExecutor:
+        """Process pool whose workers each build the tokenizer and chunker once."""
+        # Spawned, not forked: chunking runs on a pipeline thread, and forking
+        # a multi-threaded process can deadlock the children
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_chunk_worker
+        )
+    
+    def stop_chunk_pool(self):
+        """Shut down the watch session's chunking pool, if any."""
+        if self.chunk_pool is not None:
+            self.chunk_pool.shutdown(cancel_futures=True)
+            self.chunk_pool = None
+    
+    def write_vector_snapshot(self, changed: bool = True):
+        """
+        Publish a snapshot for the in-process vector backend (VECTOR_BACKEND=memory).
+        
+        Only runs with VECTOR_BACKEND=memory and VECTOR_INDEX_SNAPSHOT_DIR set;
+        FAQ Expert workers memory-map the new snapshot on their next refresh check.
+        Chunks are streamed from pgvector, so the indexer never holds them all.
+        
+        Args:
+            changed: Whether this run changed the index; if not, a snapshot is
+                only written when none exists yet
+        """
+        if self.snapshot_dir is None:
+            return
+        if not changed and InMemoryVectorIndex.current_version(self.snapshot_dir) is not None:
+            return
+        
+        version = uuid.uuid4().hex
+        count = InMemoryVectorIndex.write_snapshot(self.conn, self.snapshot_dir, version)
+        print(f"📦 Wrote vector index snapshot: {count} chunks ({version}) to {self.snapshot_dir}")
+    
+    def print_cache_stats(self):
+        """Print the size of the persistent embedding cache."""
+        if self.embedding_cache is None:
+            print("⚠️  Embedding cache is disabled (INDEXER_EMBEDDING_CACHE=false)")
+            return
+        
+        stats = self.embedding_cache.stats()
+        print(f"\n💾 Embedding cache: {stats['entries']} entries, {stats['size_bytes'] / 1024 / 1024:.1f} MB")
+        for entry in stats["models"]:
+            print(f"   {entry['provider']}/{entry['model']} ({entry['dimensions']}D): {entry['entries']} entries, last used {entry['last_used']}")
+        print()
     
     def close(self):
-        """Close database connection."""
+        """Close database connections."""
         if self.conn:
             self.conn.close()
+        if self.embed_conn:
+            self.embed_conn.close()
+        if self.run_conn:
+            self.run_conn.close()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse indexer command line options."""
+    parser = argparse.ArgumentParser(description="Index the TechFlow knowledge base")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Re-index every file and re-embed every chunk, ignoring content hashes"
+    )
+    parser.add_argument(
+        "--retry-failed",
+        action="store_true",
+        help="Retry only the quarantined documents that failed in earlier runs"
+    )
+    parser.add_argument(
+        "--new-run",
+        action="store_true",
+        help="Abandon an interrupted run instead of resuming it"
+    )
+    generation = parser.add_mutually_exclusive_group()
+    generation.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Build a new index generation alongside the live one and swap it in when ready"
+    )
+    generation.add_argument(
+        "--rollback",
+        action="store_true",
+        help="Swap the previous index generation back in and exit"
+    )
+    parser.add_argument(
+        "--refit-projection",
+        action="store_true",
+        help="Fit a new PCA projection for the rebuild (EMBEDDING_REDUCTION=pca; needs --rebuild)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Processes used to parse and chunk files (default: INDEXER_WORKERS or 1; 0 = all cores)"
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and re-index files as they are created, modified or deleted"
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=float(os.getenv("INDEXER_WATCH_INTERVAL", "1")),
+        help="Seconds between knowledge base scans in watch mode"
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=float(os.getenv("INDEXER_WATCH_DEBOUNCE", "2")),
+        help="Seconds without changes before a burst of edits is indexed in watch mode"
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="Print embedding cache size and exit"
+    )
+    parser.add_argument(
+        "--cache-gc",
+        type=float,
+        metavar="DAYS",
+        help="Delete cached embeddings unused for DAYS days that no current chunk needs, then exit"
+    )
+    args = parser.parse_args()
+    if args.refit_projection and not args.rebuild:
+        parser.error("--refit-projection needs --rebuild")
+    return args
 
 
 def main():
     """Main indexing function."""
+    args = parse_args()
+    
     print("=" * 60)
     print("  TechFlow Knowledge Base Indexer (Lesson 2)")
     print("=" * 60)
@@ -281,15 +1574,42 @@ def main():
     print(f"\n📁 Knowledge base path: {kb_path}\n")
     
     # Create indexer
-    indexer = DocumentIndexer()
+    indexer = DocumentIndexer(workers=args.workers)
     
     try:
         # Connect to database
         indexer.connect_db()
         
+        if args.cache_stats or args.cache_gc is not None:
+            if args.cache_gc is not None and indexer.embedding_cache is not None:
+                removed = indexer.embedding_cache.collect_garbage(args.cache_gc)
+                print(f"🧹 Removed {removed} cached embeddings unused for {args.cache_gc:g} days")
+            indexer.print_cache_stats()
+            return
+        
+        if args.rollback:
+            indexer.rollback_generation()
+            return
+        
+        if args.watch:
+            indexer.watch(kb_path, interval=args.watch_interval, debounce=args.debounce)
+            return
+        
         # Index all documents
-        indexer.index_knowledge_base(kb_path)
+        indexer.index_knowledge_base(
+            kb_path,
+            full=args.full,
+            retry_failed=args.retry_failed,
+            new_run=args.new_run,
+            rebuild=args.rebuild,
+            refit_projection=args.refit_projection
+        )
         
+    except KeyboardInterrupt:
+        if args.watch:
+            print("\n👋 Stopped watching\n")
+        else:
+            print("\n⚠️  Indexing interrupted; run the indexer again to resume\n")
     except Exception as e:
         print(f"\n❌ Indexing failed: {e}\n")
         raise
@@ -4,14 +4,20 @@ Demonstrates RAG-powered AI vs Manual keyword matching with feature flag control
 """
 
 import os
+import json
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
 
 from .manual import process_faq_manual
-from .agent import process_faq_ai
+from .agent import process_faq_ai, stream_faq_ai, get_agent
+from .db import close_db_pool
+from .embeddings import get_embedding_client, close_embedding_clients
+from .embedding_cache import get_embedding_cache
 
 # Load environment variables
 load_dotenv()
@@ -32,6 +38,25 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def startup():
+    """Build the agent and long-lived clients once on the server's event loop."""
+    if os.getenv("ENABLE_AI_FAQ_RAG", "false").lower() == "true":
+        get_embedding_client()
+        try:
+            await get_agent()
+        except Exception as e:
+            # Requests will retry agent creation and report the error
+            print(f"[WARN] Agent not initialized at startup: {str(e)}")
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Release pooled database and HTTP connections."""
+    close_db_pool()
+    close_embedding_clients()
+
+
 class FAQRequest(BaseModel):
     """Request model for FAQ question."""
     question: str
@@ -42,6 +67,7 @@ class Source(BaseModel):
     title: str
     filename: str
     similarity: float
+    also_in: Optional[List[str]] = None
 
 
 class FAQResponse(BaseModel):
@@ -59,6 +85,7 @@ class FAQResponse(BaseModel):
     total_time: Optional[float] = None
     tool_calls: Optional[int] = None
     search_queries: Optional[List[str]] = None
+    cache_hit: Optional[bool] = None
 
 
 @app.get("/")
@@ -92,7 +119,7 @@ def health_check():
 
 
 @app.post("/ask", response_model=FAQResponse)
-def ask_question(request: FAQRequest):
+async def ask_question(request: FAQRequest):
     """
     Answer an FAQ question.
     
@@ -115,10 +142,10 @@ def ask_question(request: FAQRequest):
     try:
         if ai_enabled:
             # Use AI-powered RAG system
-            result = process_faq_ai(request.question)
+            result = await process_faq_ai(request.question)
         else:
-            # Use manual keyword matching
-            result = process_faq_manual(request.question)
+            # Use manual keyword matching (blocking, so keep it off the event loop)
+            result = await run_in_threadpool(process_faq_manual, request.question)
         
         return FAQResponse(**result)
     
@@ -127,6 +154,44 @@ def ask_question(request: FAQRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/ask/stream")
+async def ask_question_stream(request: FAQRequest):
+    """
+    Answer an FAQ question as a Server-Sent Events stream.
+    
+    Emits `tool_call` and `search` events while the agent retrieves knowledge,
+    `token` events as answer text arrives, and a final `metrics` event.
+    In manual mode the whole answer is sent as a single token.
+    
+    Args:
+        request: FAQ question request
+        
+    Returns:
+        text/event-stream response
+    """
+    if not request.question or not request.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    
+    ai_enabled = os.getenv("ENABLE_AI_FAQ_RAG", "false").lower() == "true"
+    
+    async def manual_events():
+        result = await run_in_threadpool(process_faq_manual, request.question)
+        yield {"event": "token", "data": {"text": result.pop("answer")}}
+        yield {"event": "metrics", "data": result}
+    
+    async def event_stream():
+        events = stream_faq_ai(request.question) if ai_enabled else manual_events()
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @app.get("/stats")
 def get_stats():
     """
@@ -161,7 +226,8 @@ def get_stats():
                 "response_time": "1-4 seconds",
                 "coverage": "Entire knowledge base",
                 "can_handle": "Natural language questions, synonyms, complex queries, multi-part questions"
-            }
+            },
+            "embedding_cache": get_embedding_cache().get_stats()
         }
     else:
         return {
@@ -0,0 +1,168 @@
+"""
+Native heading-aware markdown chunker.
+Walks the heading hierarchy and packs each section's blocks into chunks
+under a token budget, using a cheap token estimate instead of a model
+tokenizer, so it starts instantly and has no ML dependencies.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Tuple
+from .tokens import estimate_tokens
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)(?:\s+#+)?\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+@dataclass
+class MarkdownChunk:
+    """A piece of one section, with the headings it sits under."""
+    text: str
+    headings: List[str] = field(default_factory=list)
+
+
+class MarkdownChunker:
+    """
+    Split markdown into chunks that never cross a heading.
+
+    Blocks (paragraphs, lists, tables, fenced code) of a section are merged
+    greedily until the next one would exceed max_tokens, measured on the
+    text contextualize() produces (heading path and separators included). A block that is too large on
+    its own is split at sentence ends, then at word boundaries. Headings are
+    ATX style (#, ##, ...); lines inside code fences are never headings.
+    """
+
+    def __init__(self, max_tokens: int = 512, estimate: Callable[[str], int] = estimate_tokens):
+        """
+        Args:
+            max_tokens: Token budget per contextualized chunk
+            estimate: Token estimator (text -> tokens)
+        """
+        self.max_tokens = max_tokens
+        self.estimate = estimate
+
+    def chunk(self, markdown: str) -> List[MarkdownChunk]:
+        """
+        Chunk a markdown document (frontmatter already removed).
+
+        Args:
+            markdown: Markdown content
+
+        Returns:
+            Chunks in document order
+        """
+        chunks = []
+        for headings, blocks in self.sections(markdown):
+            # contextualize() puts the heading path on the lines above the text
+            prefix = "".join(f"{heading}\n" for heading in headings)
+
+            def fits(text: str) -> bool:
+                return self.estimate(prefix + text) <= self.max_tokens
+
+            chunks.extend(
+                MarkdownChunk(text=text, headings=headings)
+                for text in self.pack(blocks, fits)
+            )
+        return chunks
+
+    def contextualize(self, chunk: MarkdownChunk) -> str:
+        """Chunk text prefixed with its heading path (same layout as HybridChunker)."""
+        return "\n".join(chunk.headings + [chunk.text])
+
+    def sections(self, markdown: str) -> Iterator[Tuple[List[str], List[str]]]:
+        """
+        Yield (heading path, blocks) per section, in document order.
+
+        Sections without body text (a heading directly followed by a
+        subheading) yield nothing; their heading still prefixes the
+        subsections.
+        """
+        path: List[Tuple[int, str]] = []
+        blocks: List[str] = []
+        current: List[str] = []
+        fence = None
+
+        def close_block():
+            if current:
+                blocks.append("\n".join(current).strip("\n"))
+                current.clear()
+
+        for line in markdown.splitlines():
+            fence_match = _FENCE.match(line)
+            if fence is not None:
+                current.append(line)
+                if fence_match and fence_match.group(1) == fence:
+                    fence = None
+                    close_block()
+                continue
+            if fence_match:
+                close_block()
+                fence = fence_match.group(1)
+                current.append(line)
+                continue
+
+            heading = _HEADING.match(line)
+            if heading:
+                close_block()
+                if blocks:
+                    yield [title for _, title in path], blocks
+                    blocks = []
+                level = len(heading.group(1))
+                path = [(lvl, title) for lvl, title in path if lvl < level] + [(level, heading.group(2))]
+            elif not line.strip():
+                close_block()
+            else:
+                current.append(line)
+
+        close_block()
+        if blocks:
+            yield [title for _, title in path], blocks
+
+    def pack(self, blocks: List[str], fits: Callable[[str], bool]) -> Iterator[str]:
+        """Merge consecutive blocks while they fit, splitting oversized ones."""
+        current = ""
+
+        for block in blocks:
+            for piece in self.split(block, fits):
+                candidate = f"{current}\n\n{piece}" if current else piece
+                if current and not fits(candidate):
+                    yield current
+                    candidate = piece
+                current = candidate
+
+        if current:
+            yield current
+
+    def split(self, block: str, fits: Callable[[str], bool]) -> List[str]:
+        """Split a block that does not fit at sentence ends, then words."""
+        if fits(block):
+            return [block]
+
+        pieces: List[str] = []
+        current = ""
+        for unit in self._units(block, fits):
+            candidate = f"{current} {unit}" if current else unit
+            if current and not fits(candidate):
+                pieces.append(current)
+                candidate = unit
+            current = candidate
+        if current:
+            pieces.append(current)
+        return pieces
+
+    def _units(self, block: str, fits: Callable[[str], bool]) -> Iterator[str]:
+        """Sentences, with any sentence that does not fit broken into word runs."""
+        for sentence in _SENTENCE_END.split(block):
+            if fits(sentence):
+                yield sentence
+                continue
+            run = ""
+            for word in sentence.split():
+                candidate = f"{run} {word}" if run else word
+                if run and not fits(candidate):
+                    yield run
+                    candidate = word
+                run = candidate
+            if run:
+                yield run
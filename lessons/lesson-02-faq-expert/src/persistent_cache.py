@@ -0,0 +1,155 @@
+"""
+Persistent, content-addressed embedding cache for the indexer.
+Vectors are keyed by (provider, model, dimensions, sha256 of the embedded
+text), so unchanged chunks, renamed files and provider switches never pay
+for the same embedding twice.
+"""
+
+import hashlib
+from typing import Dict, List, Optional
+import numpy as np
+from psycopg2.extras import execute_values
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 hex digest of the exact text that gets embedded."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class PersistentEmbeddingCache:
+    """
+    Embedding cache in the kb_embedding_cache table.
+
+    Uses its own autocommit connection so cached vectors survive even when
+    the document transaction that requested them rolls back.
+    """
+
+    def __init__(self, conn, provider: str, model: str, dimensions: int):
+        """
+        Args:
+            conn: Autocommit connection with pgvector types registered
+            provider: Embedding provider name
+            model: Embedding model name
+            dimensions: Configured embedding dimensions
+        """
+        self.conn = conn
+        self.provider = provider
+        self.model = model
+        self.dimensions = dimensions
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up cached embeddings and mark them as used.
+
+        Args:
+            texts: Texts that are about to be embedded
+
+        Returns:
+            One cached embedding (or None on a miss) per text
+        """
+        if not texts:
+            return []
+
+        hashes = [text_hash(text) for text in texts]
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                UPDATE kb_embedding_cache SET last_used_at = NOW()
+                WHERE provider = %s AND model = %s AND dimensions = %s
+                  AND text_hash = ANY(%s)
+                RETURNING text_hash, embedding
+            """, (self.provider, self.model, self.dimensions, list(set(hashes))))
+            found: Dict[str, List[float]] = {key: embedding.tolist() for key, embedding in cur.fetchall()}
+
+        results = [found.get(key) for key in hashes]
+        hits = sum(1 for result in results if result is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: List[str], embeddings: List[Optional[List[float]]]):
+        """
+        Store freshly computed embeddings.
+
+        Args:
+            texts: Embedded texts
+            embeddings: Their embeddings (None entries are skipped)
+        """
+        rows = {
+            text_hash(text): np.asarray(embedding, dtype=np.float32)
+            for text, embedding in zip(texts, embeddings)
+            if embedding is not None
+        }
+        if not rows:
+            return
+
+        with self.conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO kb_embedding_cache (provider, model, dimensions, text_hash, embedding)
+                VALUES %s
+                ON CONFLICT (provider, model, dimensions, text_hash) DO UPDATE SET
+                    embedding = EXCLUDED.embedding,
+                    last_used_at = NOW()
+            """, [
+                (self.provider, self.model, self.dimensions, key, embedding)
+                for key, embedding in rows.items()
+            ])
+
+    def stats(self) -> Dict:
+        """
+        Cache size overall and per provider/model.
+
+        Returns:
+            Dict with total entries, table size in bytes and per-model breakdown
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT provider, model, dimensions, COUNT(*), MAX(last_used_at)
+                FROM kb_embedding_cache
+                GROUP BY provider, model, dimensions
+                ORDER BY provider, model, dimensions
+            """)
+            models = [
+                {
+                    "provider": provider,
+                    "model": model,
+                    "dimensions": dimensions,
+                    "entries": entries,
+                    "last_used": last_used.isoformat() if last_used else None
+                }
+                for provider, model, dimensions, entries, last_used in cur.fetchall()
+            ]
+            cur.execute("SELECT pg_total_relation_size('kb_embedding_cache')")
+            size_bytes = cur.fetchone()[0]
+
+        return {
+            "entries": sum(entry["entries"] for entry in models),
+            "size_bytes": size_bytes,
+            "models": models
+        }
+
+    def collect_garbage(self, max_age_days: float) -> int:
+        """
+        Delete entries that are stale and no longer backed by a current chunk.
+
+        An entry is kept while any chunk in kb_chunks still has its text
+        (under any provider, so switching back stays free) or while an
+        indexing run has used it within max_age_days.
+
+        Args:
+            max_age_days: Minimum days since last use before an entry can go
+
+        Returns:
+            Number of entries removed
+        """
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM kb_embedding_cache e
+                WHERE e.last_used_at < NOW() - make_interval(secs => %s)
+                  AND NOT EXISTS (
+                      SELECT 1 FROM kb_chunks c
+                      WHERE c.metadata->>'content_hash' = e.text_hash
+                  )
+            """, (max_age_days * 86400,))
+            return cur.rowcount
@@ -0,0 +1,157 @@
+"""
+Staged pipeline for the indexer.
+Each stage runs on its own thread and hands items to the next through a
+bounded queue, so slow stages apply back-pressure instead of letting work
+pile up in memory.
+"""
+
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+# Marks the end of the stream on every queue
+_DONE = object()
+
+# How often blocked stages check whether the consumer stopped early
+_POLL_SECONDS = 0.1
+
+
+class _Crash:
+    """Carries an unexpected stage error to the consumer."""
+
+    def __init__(self, stage: str, error: BaseException):
+        self.stage = stage
+        self.error = error
+
+
+@dataclass
+class StageStats:
+    """Items processed and time spent working (not waiting on queues) by a stage."""
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Block until the next stage has room; False if the pipeline was stopped first."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    """Block until the previous stage hands over an item; _DONE if the pipeline was stopped first."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _record(item: Any, q: queue.Queue, stats: StageStats, started: float, stop: threading.Event) -> bool:
+    """Record the work just done, then pass its result on."""
+    stats.busy_seconds += time.perf_counter() - started
+    return _put(q, item, stop)
+
+
+def run_pipeline(
+    source: Iterable,
+    stages: List[Tuple[str, Callable[[Any], Any]]],
+    queue_size: int,
+    stats: Dict[str, StageStats]
+) -> Iterator[Any]:
+    """
+    Stream items from source through stages, each on its own thread.
+
+    Stage functions should handle per-item errors themselves (for example by
+    returning an error marker); an exception escaping a stage stops the
+    pipeline and is re-raised to the consumer. If the consumer stops early
+    (break, exception, close), every thread is stopped and joined, and the
+    source is closed so generators can release what they hold.
+
+    Args:
+        source: Iterable producing the first items (iterated on its own thread)
+        stages: (name, function) pairs applied in order
+        queue_size: Capacity of each queue between stages
+        stats: Filled with a StageStats per stage, plus "source"
+
+    Yields:
+        Output of the last stage, in source order
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    stop = threading.Event()
+
+    def produce(out: queue.Queue, stage_stats: StageStats):
+        iterator = iter(source)
+        try:
+            while True:
+                started = time.perf_counter()
+                item = next(iterator, _DONE)
+                if item is _DONE:
+                    break
+                stage_stats.items += 1
+                if not _record(item, out, stage_stats, started, stop):
+                    return
+        except BaseException as e:
+            if not _put(out, _Crash(stage_stats.name, e), stop):
+                return
+        finally:
+            # The source runs on this thread, so it is closed here too
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+        _put(out, _DONE, stop)
+
+    def work(fn: Callable[[Any], Any], inbox: queue.Queue, out: queue.Queue, stage_stats: StageStats):
+        while True:
+            item = _get(inbox, stop)
+            if item is _DONE or isinstance(item, _Crash):
+                if not _put(out, item, stop) or item is _DONE:
+                    return
+                continue
+            started = time.perf_counter()
+            try:
+                result = fn(item)
+            except BaseException as e:
+                result = _Crash(stage_stats.name, e)
+            stage_stats.items += 1
+            if not _record(result, out, stage_stats, started, stop):
+                return
+
+    stats["source"] = StageStats("source")
+    threads = [threading.Thread(target=produce, args=(queues[0], stats["source"]), daemon=True)]
+    for i, (name, fn) in enumerate(stages):
+        stats[name] = StageStats(name)
+        threads.append(threading.Thread(
+            target=work, args=(fn, queues[i], queues[i + 1], stats[name]), daemon=True
+        ))
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Crash):
+                raise RuntimeError(f"Pipeline stage '{item.stage}' failed: {item.error}") from item.error
+            yield item
+    finally:
+        # Unblock every stage if the consumer stopped early, then wait for them
+        stop.set()
+        for q in queues:
+            while True:
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    break
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,166 @@
+"""
+Rate limiting and retries for embedding providers.
+Token buckets for requests/tokens per minute and exponential backoff that
+honors Retry-After.
+"""
+
+import email.utils
+import random
+import threading
+import time
+from datetime import timezone
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: timeouts, throttling and server errors
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at a per-minute rate."""
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute: Tokens added per minute (also the burst capacity)
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1):
+        """Block until `amount` tokens are available, then take them."""
+        # A request bigger than the bucket would wait forever; cap it at a full bucket
+        amount = min(amount, self.capacity)
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits (0 disables a limit)."""
+
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+
+    def acquire(self, tokens: int):
+        """Wait until one request carrying `tokens` tokens may be sent."""
+        if self.requests is not None:
+            self.requests.acquire(1)
+        if self.tokens is not None:
+            self.tokens.acquire(tokens)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of a provider error (openai, ollama and httpx errors)."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Throttling, server errors and connection failures are worth retrying."""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    # No status: connection resets, timeouts and DNS failures
+    name = type(error).__name__
+    return any(word in name for word in ("Connection", "Timeout", "Network", "Protocol"))
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Delay requested by the server via Retry-After / retry-after-ms, if any.
+
+    Malformed values are ignored (the caller falls back to its own backoff)
+    rather than replacing the error being retried; delays in the past are 0.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+
+    # HTTP-date form
+    try:
+        parsed = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        # HTTP dates are always GMT
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def call_with_retries(
+    fn: Callable[[], T],
+    max_retries: int = 5,
+    base_delay: float = 1.0,
+    max_delay: float = 60.0,
+    on_retry: Optional[Callable[[Exception, int, float], None]] = None
+) -> T:
+    """
+    Call fn, retrying retryable errors with exponential backoff and jitter.
+
+    A server-provided Retry-After takes precedence over the computed delay.
+
+    Args:
+        fn: Function to call
+        max_retries: Retries after the first attempt
+        base_delay: Delay before the first retry (seconds), doubled each time
+        max_delay: Upper bound on any single delay
+        on_retry: Called with (error, attempt, delay) before sleeping
+
+    Returns:
+        fn's result
+
+    Raises:
+        The last error once retries are exhausted or the error is not retryable
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = base_delay * (2 ** attempt) * (0.5 + random.random() / 2)
+            delay = min(delay, max_delay)
+
+            attempt += 1
+            if on_retry:
+                on_retry(e, attempt, delay)
+            time.sleep(delay)
@@ -0,0 +1,346 @@
+"""
+Reduced-dimension embeddings for the FAQ Expert.
+Chunks can be stored with fewer dimensions than the model emits: Matryoshka
+truncation for models trained for it (text-embedding-3-*, nomic-embed-text
+v1.5), or a PCA projection fitted on the knowledge base at index time.
+Smaller vectors mean a smaller HNSW index and cheaper distance computations;
+queries go through the same reduction in generate_embedding.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+import numpy as np
+from .db import db_connection
+
+REDUCTIONS = ["none", "truncate", "pca"]
+
+# How often the FAQ Expert checks for a newly activated PCA projection
+PROJECTION_REFRESH_SECONDS = 30
+
+# Matches kb_chunks.embedding vector(768); storing fewer dimensions needs the column changed too
+DEFAULT_REDUCED_DIMENSIONS = 768
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows (zero rows stay zero)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class EmbeddingReducer:
+    """Base class for dimensionality reductions."""
+
+    method: str = ""
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    @property
+    def id(self) -> str:
+        """Identifies the reduced vector space (appended to the embedding model id)."""
+        return f"{self.method}-{self.dimensions}"
+
+    def reduce(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Reduce full-dimension embeddings.
+
+        Args:
+            vectors: One embedding per row
+
+        Returns:
+            Unit-length vectors with self.dimensions columns
+        """
+        raise NotImplementedError
+
+    def reduce_one(self, vector: List[float]) -> List[float]:
+        """Reduce a single embedding."""
+        return self.reduce(np.asarray([vector], dtype=np.float32))[0].tolist()
+
+
+class TruncationReducer(EmbeddingReducer):
+    """
+    Matryoshka truncation: keep the leading dimensions and renormalize.
+
+    Only meaningful for models trained with Matryoshka representation
+    learning, which front-load information into the first dimensions; other
+    models lose recall quickly (check with python -m src.reduction_report).
+    """
+
+    method = "truncate"
+
+    def reduce(self, vectors: np.ndarray) -> np.ndarray:
+        if vectors.shape[1] < self.dimensions:
+            raise ValueError(
+                f"Cannot truncate {vectors.shape[1]}-dimension embeddings to {self.dimensions} dimensions"
+            )
+        return normalize(vectors[:, :self.dimensions])
+
+
+class PcaProjection(EmbeddingReducer):
+    """
+    Linear projection onto the top singular vectors of the chunk embeddings.
+
+    The embeddings are not centered: search ranks by cosine of the raw
+    vectors, and subtracting a mean would change those angles (and lose
+    recall) even when every component is kept. Projecting onto the top
+    uncentered axes keeps dot products as well as any linear map of that
+    width can.
+
+    Works for any model, but the projection is only valid for the vectors
+    it was fitted with: every stored chunk and every query must go through
+    the same one, so its id (a digest of its parameters) is part of the
+    embedding model id. Fitted on n embeddings, at most n components carry
+    information; the rest are zero, so the output still has the requested
+    width.
+    """
+
+    method = "pca"
+
+    def __init__(self, components: np.ndarray, explained_variance: float = 0.0, samples: int = 0):
+        """
+        Args:
+            components: Projection axes, one per row (dimensions x source dimensions)
+            explained_variance: Share of the embeddings' squared length the components keep
+            samples: Number of embeddings the projection was fitted on
+        """
+        super().__init__(components.shape[0])
+        self.components = components.astype(np.float32)
+        self.explained_variance = explained_variance
+        self.samples = samples
+
+    @property
+    def source_dimensions(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def fitted_components(self) -> int:
+        """Components that carry information (the rest are zero padding)."""
+        return int(np.count_nonzero(np.any(self.components != 0, axis=1)))
+
+    @property
+    def id(self) -> str:
+        digest = hashlib.blake2b(self.components.tobytes(), digest_size=4).hexdigest()
+        return f"pca-{self.dimensions}-{digest}"
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, dimensions: int) -> "PcaProjection":
+        """
+        Fit a projection to the given number of dimensions.
+
+        Args:
+            vectors: Full-dimension embeddings, one per row
+            dimensions: Target dimensions; with fewer vectors than that, the
+                components past the data's rank are zero
+
+        Returns:
+            The fitted projection
+        """
+        samples, source_dimensions = vectors.shape
+        if dimensions > source_dimensions:
+            raise ValueError(f"Cannot project {source_dimensions}-dimension embeddings to {dimensions} dimensions")
+        if samples < 2:
+            raise ValueError(f"A PCA projection needs at least 2 chunks to fit, found {samples}")
+
+        _, singular_values, axes = np.linalg.svd(vectors.astype(np.float64), full_matrices=False)
+        # n embeddings span at most n directions
+        rank = min(dimensions, len(singular_values))
+        components = np.zeros((dimensions, source_dimensions))
+        components[:rank] = axes[:rank]
+        energy = singular_values ** 2
+        explained = float(energy[:rank].sum() / energy.sum()) if energy.sum() > 0 else 0.0
+        return cls(components, explained_variance=explained, samples=samples)
+
+    def reduce(self, vectors: np.ndarray) -> np.ndarray:
+        if vectors.shape[1] != self.source_dimensions:
+            raise ValueError(
+                f"Projection {self.id} expects {self.source_dimensions}-dimension embeddings, got {vectors.shape[1]}"
+            )
+        return normalize(vectors @ self.components.T)
+
+
+def reduction_config() -> Tuple[str, Optional[int]]:
+    """
+    Configured reduction (EMBEDDING_REDUCTION) and target dimensions (EMBEDDING_REDUCED_DIMENSIONS).
+
+    Returns:
+        (method, dimensions); dimensions is None when reduction is off
+    """
+    method = os.getenv("EMBEDDING_REDUCTION", "none").lower()
+    if method not in REDUCTIONS:
+        raise ValueError(f"Unsupported EMBEDDING_REDUCTION: {method} (options: {', '.join(REDUCTIONS)})")
+    if method == "none":
+        return method, None
+    dimensions = int(os.getenv("EMBEDDING_REDUCED_DIMENSIONS", str(DEFAULT_REDUCED_DIMENSIONS)))
+    if dimensions < 1:
+        raise ValueError("EMBEDDING_REDUCED_DIMENSIONS must be positive")
+    return method, dimensions
+
+
+def reduced_model_id(model_id: str, reducer: Optional[EmbeddingReducer]) -> str:
+    """Embedding model id of reduced vectors ("github:text-embedding-3-small+truncate-256")."""
+    return f"{model_id}+{reducer.id}" if reducer is not None else model_id
+
+
+def projection_id(model_id: Optional[str]) -> Optional[str]:
+    """The PCA projection an embedding model id refers to, if any."""
+    _, _, reduction = (model_id or "").partition("+")
+    return reduction if reduction.startswith("pca-") else None
+
+
+def _model_key(model: str) -> str:
+    """Model name without a publisher prefix (the indexer and API name GitHub Models' model differently)."""
+    return model.rsplit("/", 1)[-1]
+
+
+def save_projection(cursor, provider: str, model: str, projection: PcaProjection, active: bool):
+    """
+    Store a fitted projection.
+
+    Args:
+        cursor: Database cursor
+        provider: Embedding provider the projection was fitted for
+        model: Embedding model the projection was fitted for
+        projection: The fitted projection
+        active: Make it the one the FAQ Expert applies to queries now
+            (otherwise activate_projection or activate_live_projection does
+            once its chunks are written)
+    """
+    cursor.execute("""
+        INSERT INTO kb_embedding_projections (
+            id, provider, model, source_dimensions, dimensions, components,
+            explained_variance, samples, active
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, FALSE)
+        ON CONFLICT (id) DO NOTHING
+    """, (
+        projection.id, provider, _model_key(model), projection.source_dimensions, projection.dimensions,
+        projection.components.tobytes(), projection.explained_variance, projection.samples
+    ))
+    if active:
+        activate_projection(cursor, projection.id)
+
+
+def load_projection(
+    cursor,
+    provider: str,
+    model: str,
+    dimensions: int,
+    projection: Optional[str] = None
+) -> Optional[PcaProjection]:
+    """
+    Load a stored projection.
+
+    Args:
+        cursor: Database cursor
+        provider: Embedding provider
+        model: Embedding model
+        dimensions: Target dimensions
+        projection: Projection id (defaults to the active one)
+
+    Returns:
+        The projection, or None if there is none
+    """
+    if projection is not None:
+        condition, params = "id = %s", (projection,)
+    else:
+        condition, params = "active", ()
+    cursor.execute(f"""
+        SELECT source_dimensions, dimensions, components, explained_variance, samples
+        FROM kb_embedding_projections
+        WHERE provider = %s AND model = %s AND dimensions = %s AND {condition}
+    """, (provider, _model_key(model), dimensions, *params))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    source_dimensions, dimensions, components, explained_variance, samples = row
+    return PcaProjection(
+        np.frombuffer(bytes(components), dtype=np.float32).reshape(dimensions, source_dimensions),
+        explained_variance=explained_variance,
+        samples=samples
+    )
+
+
+def activate_live_projection(cursor, table: str = "kb_chunks"):
+    """
+    Make the projection the live chunks were stored with the active one.
+
+    Called in the transaction that swaps index generations, so queries
+    switch projections together with the chunks. Goes by the model id most
+    chunks were stored with (a rebuild may carry over a few older chunks).
+    """
+    cursor.execute(f"""
+        SELECT metadata->>'embedding_model' FROM {table}
+        WHERE embedding IS NOT NULL
+        GROUP BY 1
+        ORDER BY COUNT(*) DESC
+        LIMIT 1
+    """)
+    row = cursor.fetchone()
+    projection = projection_id(row[0] if row else None)
+    if projection is not None:
+        activate_projection(cursor, projection)
+
+
+def activate_projection(cursor, projection: str):
+    """Activate a projection, deactivating the others for its provider/model."""
+    # Two statements: the unique index on active projections is checked row by row
+    cursor.execute("""
+        UPDATE kb_embedding_projections SET active = FALSE
+        WHERE active AND id <> %s
+          AND (provider, model) = (SELECT provider, model FROM kb_embedding_projections WHERE id = %s)
+    """, (projection, projection))
+    cursor.execute("UPDATE kb_embedding_projections SET active = TRUE WHERE id = %s", (projection,))
+
+
+# Query-side reducer of the FAQ Expert, refreshed for PCA
+_query_reducer: Optional[EmbeddingReducer] = None
+_query_reducer_checked = 0.0
+_query_reducer_lock = threading.Lock()
+
+
+def get_query_reducer(provider: str, model: str) -> Optional[EmbeddingReducer]:
+    """
+    Reduction the FAQ Expert applies to query embeddings.
+
+    With PCA, the active projection is re-read from the database every
+    PROJECTION_REFRESH_SECONDS, so a rebuild that fits a new one is picked
+    up without a restart. If the database can't be reached, the last
+    projection stays in use.
+
+    Args:
+        provider: Embedding provider of the query embeddings
+        model: Embedding model of the query embeddings
+
+    Returns:
+        The reducer, or None when reduction is off (or no PCA projection is fitted yet)
+    """
+    global _query_reducer, _query_reducer_checked
+
+    method, dimensions = reduction_config()
+    if method == "none":
+        return None
+    if method == "truncate":
+        if _query_reducer is None or _query_reducer.id != f"truncate-{dimensions}":
+            _query_reducer = TruncationReducer(dimensions)
+        return _query_reducer
+
+    if time.monotonic() - _query_reducer_checked < PROJECTION_REFRESH_SECONDS:
+        return _query_reducer
+    with _query_reducer_lock:
+        if time.monotonic() - _query_reducer_checked >= PROJECTION_REFRESH_SECONDS:
+            try:
+                with db_connection() as conn, conn.cursor() as cur:
+                    projection = load_projection(cur, provider, model, dimensions)
+                if projection is None:
+                    print(f"[WARN] No active PCA projection for {provider}/{model} ({dimensions}D); run the indexer")
+                elif _query_reducer is None or projection.id != _query_reducer.id:
+                    print(f"[Embeddings] Using PCA projection {projection.id}")
+                _query_reducer = projection
+            except Exception as e:
+                print(f"[WARN] Could not load the PCA projection: {str(e)}")
+            _query_reducer_checked = time.monotonic()
+    return _query_reducer
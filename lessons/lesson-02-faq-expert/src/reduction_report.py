@@ -0,0 +1,220 @@
+"""
+Recall vs. dimensions for reduced embeddings (EMBEDDING_REDUCTION).
+Embeds the knowledge base with the configured provider and chunker, then
+measures how many of the exact full-dimension nearest neighbours each
+truncation / PCA cut-off still finds, to help pick EMBEDDING_REDUCED_DIMENSIONS.
+
+Usage: python -m src.reduction_report [--dimensions 64 128 256] [--k 10] [--questions FILE] [--json]
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from .chunking import chunker_id, init_chunk_worker, prepare_document
+from .embeddings import EmbeddingClient, batch_texts, build_embedding_client
+from .reduction import PcaProjection, TruncationReducer, normalize
+
+load_dotenv()
+
+DEFAULT_DIMENSIONS = [32, 64, 128, 256, 384, 512, 768, 1024]
+
+
+def embed_texts(client: EmbeddingClient, texts: List[str]) -> np.ndarray:
+    """Embed texts at full dimensions, in request batches (EMBEDDING_BATCH_SIZE / EMBEDDING_BATCH_TOKENS)."""
+    vectors = []
+    for batch in batch_texts(
+        texts,
+        int(os.getenv("EMBEDDING_BATCH_SIZE", "64")),
+        int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+    ):
+        vectors.extend(client.embed([texts[i] for i in batch]))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def nearest(queries: np.ndarray, corpus: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Exact top-k neighbours by cosine similarity.
+
+    Args:
+        queries: Unit-length query vectors
+        corpus: Unit-length corpus vectors
+        k: Neighbours per query
+        exclude: Corpus row to leave out per query (the query itself)
+
+    Returns:
+        Corpus row indexes, best first (queries x k)
+    """
+    scores = queries @ corpus.T
+    if exclude is not None:
+        scores[np.arange(len(queries)), exclude] = -np.inf
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, top, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(top, order, axis=1)
+
+
+def evaluate(
+    corpus: np.ndarray,
+    queries: np.ndarray,
+    dimensions: List[int],
+    methods: List[str],
+    k: int,
+    exclude: Optional[np.ndarray] = None
+) -> List[Dict]:
+    """
+    Recall of reduced-dimension search against full-dimension search.
+
+    Args:
+        corpus: Full-dimension chunk embeddings
+        queries: Full-dimension query embeddings
+        dimensions: Cut-offs to try (ones above the model's size are skipped)
+        methods: "truncate" and/or "pca"
+        k: Neighbours compared per query
+        exclude: Corpus row to leave out per query (when queries are chunks)
+
+    Returns:
+        One row per method and cut-off
+    """
+    source_dimensions = corpus.shape[1]
+    corpus, queries = normalize(corpus), normalize(queries)
+    truth = nearest(queries, corpus, k, exclude)
+
+    rows = []
+    for method in methods:
+        for dims in sorted(d for d in set(dimensions) if d <= source_dimensions):
+            row = {"method": method, "dimensions": dims}
+            started = time.perf_counter()
+            try:
+                if method == "pca":
+                    reducer = PcaProjection.fit(corpus, dims)
+                    row["explained_variance"] = round(reducer.explained_variance, 3)
+                else:
+                    reducer = TruncationReducer(dims)
+                reduced_corpus, reduced_queries = reducer.reduce(corpus), reducer.reduce(queries)
+            except ValueError as e:
+                rows.append({**row, "error": str(e)})
+                continue
+            row["reduce_seconds"] = round(time.perf_counter() - started, 3)
+
+            found = nearest(reduced_queries, reduced_corpus, k, exclude)
+            row["recall_at_1"] = round(float((found[:, 0] == truth[:, 0]).mean()), 3)
+            row[f"recall_at_{k}"] = round(float(np.mean([
+                len(set(found[i]) & set(truth[i])) / k for i in range(len(truth))
+            ])), 3)
+            # pgvector stores 4 bytes per dimension plus an 8 byte header
+            row["vector_bytes"] = 4 * dims + 8
+            row["vectors_mb"] = round(len(corpus) * (4 * dims + 8) / 1024 / 1024, 2)
+            row["distance_cost"] = round(dims / source_dimensions, 3)
+            rows.append(row)
+    return rows
+
+
+def suggest(rows: List[Dict], k: int, target: float) -> Dict[str, Optional[int]]:
+    """Smallest cut-off per method whose recall@k reaches the target."""
+    suggestions = {}
+    for row in rows:
+        suggestions.setdefault(row["method"], None)
+        if row.get(f"recall_at_{k}", 0) >= target and suggestions[row["method"]] is None:
+            suggestions[row["method"]] = row["dimensions"]
+    return suggestions
+
+
+def print_results(report: Dict):
+    """Print the recall table and the suggested cut-offs."""
+    k = report["k"]
+    print(
+        f"\n📐 Reduced embeddings: {report['embedding_model']} ({report['source_dimensions']}D), "
+        f"{report['chunks']} chunks, {report['queries']} {report['query_source']} queries\n"
+    )
+    print(
+        f"{'Method':<10}{'Dims':>6}{'Recall@1':>10}{f'Recall@{k}':>11}"
+        f"{'Variance':>10}{'MB':>9}{'Distance':>10}"
+    )
+    for row in report["results"]:
+        if "error" in row:
+            print(f"{row['method']:<10}{row['dimensions']:>6}   {row['error']}")
+            continue
+        variance = f"{row['explained_variance']:.1%}" if "explained_variance" in row else "-"
+        print(
+            f"{row['method']:<10}{row['dimensions']:>6}{row['recall_at_1']:>10.3f}{row[f'recall_at_{k}']:>11.3f}"
+            f"{variance:>10}{row['vectors_mb']:>9.2f}{row['distance_cost']:>10.0%}"
+        )
+    print(f"\n{'full':<10}{report['source_dimensions']:>6}{1:>10.3f}{1:>11.3f}{'-':>10}{report['full_vectors_mb']:>9.2f}{1:>10.0%}")
+
+    print(f"\nSmallest cut-off with recall@{k} >= {report['target']:g}:")
+    for method, dims in report["suggested"].items():
+        print(f"   {method}: {dims if dims is not None else 'none of the tried dimensions'}")
+    print()
+
+
+def main():
+    """Measure recall vs. dimensions for the configured embedding model."""
+    parser = argparse.ArgumentParser(description="Recall of reduced-dimension embeddings on the knowledge base")
+    parser.add_argument("--dimensions", type=int, nargs="+", default=DEFAULT_DIMENSIONS, help="Cut-offs to try")
+    parser.add_argument("--methods", nargs="+", choices=["truncate", "pca"], default=["truncate", "pca"])
+    parser.add_argument("--k", type=int, default=10, help="Neighbours compared per query")
+    parser.add_argument("--queries", type=int, default=200, help="Chunks sampled as queries (without --questions)")
+    parser.add_argument("--questions", type=Path, help="File with one question per line to use as queries")
+    parser.add_argument("--target", type=float, default=0.95, help="Recall@k a suggested cut-off must reach")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for sampling query chunks")
+    parser.add_argument(
+        "--kb-path",
+        type=Path,
+        default=Path(__file__).parent.parent / "knowledge-base",
+        help="Directory of markdown files"
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    paths = sorted(args.kb_path.glob("*.md"))
+    if not paths:
+        raise SystemExit(f"No markdown files found in {args.kb_path}")
+
+    init_chunk_worker()
+    texts = [chunk.contextualized for path in paths for chunk in prepare_document(path).chunks]
+    k = min(args.k, len(texts) - 1)
+    if k < 1:
+        raise SystemExit("Need at least two chunks to measure recall")
+
+    if not args.json:
+        print(f"⏳ Embedding {len(texts)} chunks ({chunker_id()})...")
+    client = build_embedding_client(os.getenv("EMBEDDING_PROVIDER", "github").lower())
+    try:
+        corpus = embed_texts(client, texts)
+        if args.questions:
+            questions = [line.strip() for line in args.questions.read_text().splitlines() if line.strip()]
+            queries, exclude, query_source = embed_texts(client, questions), None, "question"
+        else:
+            # Each sampled chunk looks for its neighbours among the other chunks
+            rng = np.random.default_rng(args.seed)
+            exclude = rng.choice(len(texts), size=min(args.queries, len(texts)), replace=False)
+            queries, query_source = corpus[exclude], "chunk"
+    finally:
+        client.close()
+
+    results = evaluate(corpus, queries, args.dimensions, args.methods, k, exclude)
+    report = {
+        "embedding_model": f"{client.provider}:{client.model}",
+        "source_dimensions": corpus.shape[1],
+        "chunks": len(corpus),
+        "queries": len(queries),
+        "query_source": query_source,
+        "k": k,
+        "target": args.target,
+        "full_vectors_mb": round(len(corpus) * (4 * corpus.shape[1] + 8) / 1024 / 1024, 2),
+        "results": results,
+        "suggested": suggest(results, k, args.target)
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_results(report)
+
+
+if __name__ == "__main__":
+    main()
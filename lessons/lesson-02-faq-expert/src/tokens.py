@@ -0,0 +1,9 @@
+"""
+Token estimation shared by embedding batching and chunking.
+Kept dependency-free so chunking processes don't import HTTP clients.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
@@ -0,0 +1,300 @@
+"""
+In-process vector index for small and medium knowledge bases.
+Exact top-k search over a normalized float32 matrix, optionally memory-mapped
+from a snapshot shared by several workers.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from psycopg2.extras import RealDictCursor
+from .db import db_connection
+
+# Name of the file pointing at the active snapshot version
+CURRENT_FILE = "CURRENT"
+# Rows fetched per round trip when streaming a snapshot out of pgvector
+SNAPSHOT_FETCH_SIZE = 2000
+
+_CHUNKS_SQL = """
+    SELECT
+        c.content,
+        c.chunk_index,
+        c.metadata,
+        c.document_id::text AS document_id,
+        d.title,
+        d.filename,
+        c.embedding
+    FROM kb_chunks c
+    JOIN kb_documents d ON c.document_id = d.id
+    WHERE c.embedding IS NOT NULL
+    ORDER BY d.filename, c.chunk_index
+"""
+
+# Global index instance and refresh bookkeeping
+_index: Optional["InMemoryVectorIndex"] = None
+_index_lock = threading.Lock()
+_last_check = 0.0
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so a dot product is cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    # Zero vectors stay zero instead of turning into NaNs
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _publish(directory: Path, version: str):
+    """Point CURRENT at a fully written snapshot version and prune old versions."""
+    pointer = directory / f"{CURRENT_FILE}.tmp"
+    pointer.write_text(version)
+    os.replace(pointer, directory / CURRENT_FILE)
+
+    # Keep the previous version for workers that read CURRENT just before the swap
+    versions = sorted(
+        (path for path in directory.iterdir() if path.is_dir() and path.name != version),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True
+    )
+    for old in versions[1:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+class InMemoryVectorIndex:
+    """Exact cosine search over all chunk embeddings held in one matrix."""
+
+    def __init__(self, embeddings: np.ndarray, chunks: List[Dict], version: str):
+        """
+        Args:
+            embeddings: Row-normalized float32 matrix, one row per chunk
+            chunks: Chunk records (content, chunk_index, metadata, document_id, title, filename)
+            version: Identifier used to detect when a newer index is available
+        """
+        self.embeddings = embeddings
+        self.chunks = chunks
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    @classmethod
+    def from_database(cls, conn, version: Optional[str] = None) -> "InMemoryVectorIndex":
+        """
+        Load every embedded chunk from pgvector.
+
+        Args:
+            conn: Database connection with pgvector types registered
+            version: Version label (defaults to a random id)
+        """
+        with conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(_CHUNKS_SQL)
+            rows = cur.fetchall()
+
+        vectors = [np.asarray(row.pop("embedding"), dtype=np.float32) for row in rows]
+        if vectors:
+            embeddings = normalize_rows(np.vstack(vectors))
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+
+        return cls(embeddings, [dict(row) for row in rows], version or uuid.uuid4().hex)
+
+    @staticmethod
+    def write_snapshot(conn, directory: Path, version: Optional[str] = None) -> int:
+        """
+        Stream every embedded chunk from pgvector into a new snapshot version.
+
+        Rows come through a server-side cursor and are written straight into
+        a pre-sized memory-mapped embeddings.npy, so the indexer's memory
+        stays flat however large the knowledge base is. The count and the
+        rows are read in one repeatable-read transaction so they agree.
+
+        Args:
+            conn: Non-autocommit connection with pgvector types registered
+                (any open transaction is rolled back)
+            directory: Snapshot root directory
+            version: Version label (defaults to a random id)
+
+        Returns:
+            Number of chunks in the snapshot
+        """
+        version = version or uuid.uuid4().hex
+        directory.mkdir(parents=True, exist_ok=True)
+        version_dir = directory / version
+        version_dir.mkdir(exist_ok=True)
+
+        conn.rollback()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                cur.execute("""
+                    SELECT COUNT(*), MAX(vector_dims(c.embedding))
+                    FROM kb_chunks c
+                    JOIN kb_documents d ON c.document_id = d.id
+                    WHERE c.embedding IS NOT NULL
+                """)
+                count, dimensions = cur.fetchone()
+
+            if count == 0:
+                np.save(version_dir / "embeddings.npy", np.zeros((0, 0), dtype=np.float32))
+                (version_dir / "chunks.json").write_text("[]", encoding="utf-8")
+                _publish(directory, version)
+                return 0
+
+            embeddings = np.lib.format.open_memmap(
+                version_dir / "embeddings.npy", mode="w+", dtype=np.float32, shape=(count, dimensions)
+            )
+            with conn.cursor(name=f"snapshot_{version}", cursor_factory=RealDictCursor) as cur, \
+                    open(version_dir / "chunks.json", "w", encoding="utf-8") as f:
+                cur.itersize = SNAPSHOT_FETCH_SIZE
+                cur.execute(_CHUNKS_SQL)
+                f.write("[")
+                row_number = 0
+                while True:
+                    rows = cur.fetchmany(SNAPSHOT_FETCH_SIZE)
+                    if not rows:
+                        break
+                    batch = np.vstack([np.asarray(row.pop("embedding"), dtype=np.float32) for row in rows])
+                    embeddings[row_number:row_number + len(rows)] = normalize_rows(batch)
+                    f.write(("," if row_number else "") + ",".join(json.dumps(dict(row)) for row in rows))
+                    row_number += len(rows)
+                f.write("]")
+            embeddings.flush()
+            del embeddings
+        finally:
+            conn.rollback()
+
+        _publish(directory, version)
+        return count
+
+    @staticmethod
+    def current_version(directory: Path) -> Optional[str]:
+        """Version named by the snapshot's CURRENT pointer, if any."""
+        try:
+            return (directory / CURRENT_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load_snapshot(cls, directory: Path) -> Optional["InMemoryVectorIndex"]:
+        """
+        Memory-map the current snapshot so workers share its pages.
+
+        Args:
+            directory: Snapshot root directory
+
+        Returns:
+            Index, or None when no snapshot has been written yet
+        """
+        version = cls.current_version(directory)
+        if version is None:
+            return None
+
+        version_dir = directory / version
+        embeddings = np.load(version_dir / "embeddings.npy", mmap_mode="r")
+        with open(version_dir / "chunks.json", "r", encoding="utf-8") as f:
+            chunks = json.load(f)
+
+        return cls(embeddings, chunks, version)
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict] = None
+    ) -> List[Dict]:
+        """
+        Exact top-k cosine search.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            filters: Optional "document_id" / "filename" restrictions (value or list)
+
+        Returns:
+            Chunk records with a similarity score, best first
+        """
+        if not self.chunks or top_k <= 0:
+            return []
+
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        scores = self.embeddings @ query
+
+        if filters:
+            allowed = np.ones(len(self.chunks), dtype=bool)
+            for key, value in filters.items():
+                values = {str(v) for v in (value if isinstance(value, (list, tuple, set)) else [value])}
+                allowed &= np.fromiter(
+                    (str(chunk.get(key)) in values for chunk in self.chunks),
+                    dtype=bool,
+                    count=len(self.chunks)
+                )
+            scores = np.where(allowed, scores, -np.inf)
+            top_k = min(top_k, int(allowed.sum()))
+            if top_k == 0:
+                return []
+
+        k = min(top_k, len(scores))
+
+        # argpartition finds the top k in O(n); only those k get sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [{**self.chunks[i], "similarity": float(scores[i])} for i in top]
+
+
+def _database_version(conn) -> str:
+    """Cheap fingerprint of the indexed knowledge base."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*), MAX(indexed_at) FROM kb_documents")
+        count, last_indexed = cur.fetchone()
+    return f"{count}:{last_indexed}"
+
+
+def get_vector_index() -> InMemoryVectorIndex:
+    """
+    Get the shared in-memory index, reloading it when the indexer has finished a run.
+
+    With VECTOR_INDEX_SNAPSHOT_DIR set, the index is memory-mapped from the
+    snapshot the indexer writes; otherwise it is loaded from pgvector. Either
+    way, a newer version is picked up at most every VECTOR_INDEX_REFRESH_SECONDS.
+    """
+    global _index, _last_check
+
+    refresh_seconds = float(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "30"))
+    if _index is not None and time.monotonic() - _last_check < refresh_seconds:
+        return _index
+
+    with _index_lock:
+        if _index is not None and time.monotonic() - _last_check < refresh_seconds:
+            return _index
+
+        snapshot_dir = os.getenv("VECTOR_INDEX_SNAPSHOT_DIR")
+        snapshot_version = InMemoryVectorIndex.current_version(Path(snapshot_dir)) if snapshot_dir else None
+        index = None
+
+        if snapshot_version is not None:
+            if _index is None or _index.version != snapshot_version:
+                index = InMemoryVectorIndex.load_snapshot(Path(snapshot_dir))
+        else:
+            # No snapshot written yet - load straight from pgvector
+            with db_connection() as conn:
+                version = _database_version(conn)
+                if _index is None or _index.version != version:
+                    index = InMemoryVectorIndex.from_database(conn, version)
+
+        if index is not None:
+            _index = index
+            print(f"[VectorIndex] Loaded {len(index)} chunks (version {index.version})")
+
+        _last_check = time.monotonic()
+        return _index
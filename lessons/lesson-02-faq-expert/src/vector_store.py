@@ -0,0 +1,678 @@
+"""
+Vector store backends for knowledge base chunks.
+One interface for the indexer and the agent, with pgvector, Qdrant and
+in-process implementations.
+"""
+
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, ContextManager, Dict, List, Optional
+import numpy as np
+from psycopg2.extras import Json, RealDictCursor, execute_values
+from .vector_index import InMemoryVectorIndex, normalize_rows, get_vector_index
+
+# Global store instance (agent side)
+_store: Optional["VectorStore"] = None
+_store_lock = threading.Lock()
+
+
+@dataclass
+class ChunkRecord:
+    """A chunk and its embedding, as written by the indexer."""
+    document_id: str
+    chunk_index: int
+    content: str
+    embedding: Optional[List[float]]
+    metadata: Dict = field(default_factory=dict)
+    title: str = ""
+    filename: str = ""
+
+
+def _as_list(value) -> List:
+    """Filters accept a single value or a list of values."""
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+class VectorStore:
+    """
+    Base class for vector stores.
+
+    Search results are dicts with content, chunk_index, metadata, title,
+    filename, document_id and similarity (cosine, higher is better).
+    pgvector results also list, under also_in, other documents whose
+    near-duplicate copies of the chunk were collapsed into it.
+    Filters map "document_id" or "filename" to a value or list of values.
+    """
+
+    name: str = ""
+
+    def upsert_batch(self, records: List[ChunkRecord]):
+        """Insert or replace chunks, keyed by (document_id, chunk_index)."""
+        raise NotImplementedError
+
+    def delete_document(self, document_id: str):
+        """Remove every chunk belonging to a document."""
+        raise NotImplementedError
+
+    def delete_chunks_from(self, document_id: str, chunk_index: int):
+        """Remove a document's chunks at chunk_index and beyond (after it got shorter)."""
+        raise NotImplementedError
+
+    def get_chunk_embeddings(self, document_id: str) -> Dict[str, List[float]]:
+        """
+        Embeddings already stored for a document, keyed by chunk content hash.
+
+        Lets the indexer reuse vectors for chunks that did not change. Only
+        chunks whose metadata carries a content_hash are returned.
+        """
+        return {}
+
+    def find_duplicate_candidates(self, keys: List[str], exclude_document_id: Optional[str] = None) -> List[tuple]:
+        """
+        Stored chunks that share an LSH band key (near-duplicate candidates).
+
+        Only chunks with their own embedding (canonical chunks) are returned.
+        Stores that don't support deduplication return nothing.
+
+        Args:
+            keys: Band keys of the new chunk
+            exclude_document_id: Document whose chunks are being replaced
+
+        Returns:
+            (content_hash, content) per candidate
+        """
+        return []
+
+    def orphaned_duplicate_documents(self) -> List[str]:
+        """File paths of documents with duplicate chunks whose canonical chunk is gone."""
+        return []
+
+    def search_filtered(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict] = None,
+        query_text: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Nearest chunks to a query embedding, restricted by filters.
+
+        Args:
+            query_embedding: Query vector
+            top_k: Number of results to return
+            filters: Optional document_id / filename restrictions
+            query_text: Raw query, used by stores that support lexical matching
+
+        Returns:
+            Matching chunks, best first
+        """
+        raise NotImplementedError
+
+    def search(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        query_text: Optional[str] = None
+    ) -> List[Dict]:
+        """Nearest chunks to a query embedding across the whole knowledge base."""
+        return self.search_filtered(query_embedding, top_k, None, query_text)
+
+
+# Pure vector search: cosine distance over the HNSW index
+VECTOR_SEARCH_SQL = """
+    SELECT
+        c.content,
+        c.chunk_index,
+        c.metadata,
+        c.document_id::text AS document_id,
+        d.title,
+        d.filename,
+        1 - (c.embedding <=> %(embedding)s::vector) as similarity,
+        -- Documents whose near-duplicate copies of this chunk were collapsed into it
+        ARRAY(
+            SELECT DISTINCT dd.filename
+            FROM kb_chunks dup
+            JOIN kb_documents dd ON dd.id = dup.document_id
+            WHERE dup.metadata->>'duplicate_of' = c.metadata->>'content_hash'
+              AND dup.document_id <> c.document_id
+        ) AS also_in
+    FROM kb_chunks c
+    JOIN kb_documents d ON c.document_id = d.id
+    WHERE c.embedding IS NOT NULL {filters}
+    ORDER BY c.embedding <=> %(embedding)s::vector
+    LIMIT %(top_k)s
+"""
+
+# Hybrid search: vector and lexical (full-text + trigram) candidates fused
+# with weighted reciprocal rank fusion, all in one round trip
+HYBRID_SEARCH_SQL = """
+    WITH vector_hits AS (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+        FROM (
+            SELECT c.id, c.embedding <=> %(embedding)s::vector AS distance
+            FROM kb_chunks c
+            WHERE c.embedding IS NOT NULL {filters}
+            ORDER BY c.embedding <=> %(embedding)s::vector
+            LIMIT %(candidates)s
+        ) v
+    ),
+    lexical_hits AS (
+        SELECT id, ROW_NUMBER() OVER (ORDER BY lexical_score DESC) AS rank
+        FROM (
+            SELECT
+                c.id,
+                ts_rank_cd(to_tsvector('english', c.content), websearch_to_tsquery('english', %(query)s))
+                    + word_similarity(%(query)s, c.content) AS lexical_score
+            FROM kb_chunks c
+            WHERE c.embedding IS NOT NULL {filters}
+              AND (
+                  to_tsvector('english', c.content) @@ websearch_to_tsquery('english', %(query)s)
+                  OR %(query)s <%% c.content
+              )
+            ORDER BY lexical_score DESC
+            LIMIT %(candidates)s
+        ) l
+    ),
+    fused AS (
+        SELECT
+            COALESCE(v.id, l.id) AS id,
+            COALESCE(%(vector_weight)s / (%(rrf_k)s + v.rank), 0)
+                + COALESCE(%(lexical_weight)s / (%(rrf_k)s + l.rank), 0) AS score
+        FROM vector_hits v
+        FULL OUTER JOIN lexical_hits l ON v.id = l.id
+    )
+    SELECT
+        c.content,
+        c.chunk_index,
+        c.metadata,
+        c.document_id::text AS document_id,
+        d.title,
+        d.filename,
+        1 - (c.embedding <=> %(embedding)s::vector) as similarity,
+        f.score,
+        -- Documents whose near-duplicate copies of this chunk were collapsed into it
+        ARRAY(
+            SELECT DISTINCT dd.filename
+            FROM kb_chunks dup
+            JOIN kb_documents dd ON dd.id = dup.document_id
+            WHERE dup.metadata->>'duplicate_of' = c.metadata->>'content_hash'
+              AND dup.document_id <> c.document_id
+        ) AS also_in
+    FROM fused f
+    JOIN kb_chunks c ON c.id = f.id
+    JOIN kb_documents d ON c.document_id = d.id
+    ORDER BY f.score DESC
+    LIMIT %(top_k)s
+"""
+
+
+@contextmanager
+def borrowed_connection(conn):
+    """Context manager yielding an existing connection without committing it."""
+    yield conn
+
+
+class PgVectorStore(VectorStore):
+    """
+    Chunks in the kb_chunks table, searched with pgvector (optionally hybrid).
+
+    The store borrows connections from `connect`, a callable returning a
+    context manager that yields a connection. The agent passes the pooled
+    db_connection; the indexer passes its own connection so chunk writes join
+    the document transaction (the store never commits).
+
+    Writes go to `table`, which the indexer points at the shadow table while
+    it rebuilds the index; searches always read the live kb_chunks table.
+    """
+
+    name = "pgvector"
+
+    def __init__(self, connect: Callable[[], ContextManager], table: str = "kb_chunks"):
+        self.connect = connect
+        self.table = table
+
+    def upsert_batch(self, records: List[ChunkRecord]):
+        if not records:
+            return
+
+        # Multi-row INSERT: one round trip per CHUNK_WRITE_PAGE_SIZE chunks
+        # instead of one per chunk
+        with self.connect() as conn, conn.cursor() as cur:
+            execute_values(cur, f"""
+                INSERT INTO {self.table} (document_id, chunk_index, content, embedding, metadata)
+                VALUES %s
+                ON CONFLICT (document_id, chunk_index) DO UPDATE SET
+                    content = EXCLUDED.content,
+                    embedding = EXCLUDED.embedding,
+                    metadata = EXCLUDED.metadata
+            """, [
+                (
+                    record.document_id,
+                    record.chunk_index,
+                    record.content,
+                    np.asarray(record.embedding, dtype=np.float32) if record.embedding is not None else None,
+                    Json(record.metadata)
+                )
+                for record in records
+            ], page_size=int(os.getenv("CHUNK_WRITE_PAGE_SIZE", "500")))
+
+    def delete_document(self, document_id: str):
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute(f"DELETE FROM {self.table} WHERE document_id = %s", (document_id,))
+
+    def delete_chunks_from(self, document_id: str, chunk_index: int):
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute(
+                f"DELETE FROM {self.table} WHERE document_id = %s AND chunk_index >= %s",
+                (document_id, chunk_index)
+            )
+
+    def get_chunk_embeddings(self, document_id: str) -> Dict[str, List[float]]:
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT metadata->>'content_hash', embedding
+                FROM {self.table}
+                WHERE document_id = %s
+                  AND embedding IS NOT NULL
+                  AND metadata ? 'content_hash'
+            """, (document_id,))
+            return {content_hash: embedding.tolist() for content_hash, embedding in cur.fetchall()}
+
+    def find_duplicate_candidates(self, keys: List[str], exclude_document_id: Optional[str] = None) -> List[tuple]:
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT DISTINCT ON (metadata->>'content_hash') metadata->>'content_hash', content
+                FROM {self.table}
+                WHERE metadata->'lsh' ?| %s
+                  AND embedding IS NOT NULL
+                  AND document_id IS DISTINCT FROM %s::uuid
+            """, (keys, exclude_document_id))
+            return cur.fetchall()
+
+    def orphaned_duplicate_documents(self) -> List[str]:
+        with self.connect() as conn, conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT DISTINCT d.filepath
+                FROM {self.table} c
+                JOIN kb_documents d ON d.id = c.document_id
+                WHERE c.metadata ? 'duplicate_of'
+                  AND NOT EXISTS (
+                      SELECT 1 FROM {self.table} k
+                      WHERE k.metadata->>'content_hash' = c.metadata->>'duplicate_of'
+                        AND k.embedding IS NOT NULL
+                  )
+            """)
+            return [row[0] for row in cur.fetchall()]
+
+    def search_filtered(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict] = None,
+        query_text: Optional[str] = None
+    ) -> List[Dict]:
+        params = {"embedding": query_embedding, "query": query_text or "", "top_k": top_k}
+
+        clauses = []
+        for key, value in (filters or {}).items():
+            if key == "document_id":
+                clauses.append("AND c.document_id = ANY(%(document_ids)s::uuid[])")
+                params["document_ids"] = _as_list(value)
+            elif key == "filename":
+                clauses.append(
+                    "AND c.document_id IN (SELECT id FROM kb_documents WHERE filename = ANY(%(filenames)s))"
+                )
+                params["filenames"] = _as_list(value)
+            else:
+                raise ValueError(f"Unsupported filter: {key}")
+
+        # SEARCH_MODE=hybrid needs the raw query for the lexical side
+        search_mode = os.getenv("SEARCH_MODE", "hybrid").lower()
+        if search_mode == "hybrid" and query_text:
+            sql = HYBRID_SEARCH_SQL
+            params.update({
+                "candidates": max(top_k, int(os.getenv("HYBRID_CANDIDATES", "20"))),
+                "vector_weight": float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0")),
+                "lexical_weight": float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0")),
+                "rrf_k": int(os.getenv("HYBRID_RRF_K", "60"))
+            })
+        elif search_mode in ("vector", "hybrid"):
+            sql = VECTOR_SEARCH_SQL
+        else:
+            raise ValueError(f"Unsupported search mode: {search_mode}")
+
+        with self.connect() as conn, conn.cursor(cursor_factory=RealDictCursor) as cur:
+            cur.execute(sql.replace("{filters}", " ".join(clauses)), params)
+            results = cur.fetchall()
+
+        return [dict(row) for row in results]
+
+
+class QdrantVectorStore(VectorStore):
+    """
+    Chunks in a Qdrant collection (cosine distance).
+
+    Point ids are derived from (document_id, chunk_index), so re-upserting a
+    chunk replaces it. Chunks without an embedding are skipped: Qdrant points
+    must carry a vector.
+    """
+
+    name = "qdrant"
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        collection: str = "kb_chunks",
+        location: Optional[str] = None
+    ):
+        """
+        Args:
+            url: Qdrant server URL
+            api_key: Qdrant API key
+            collection: Collection holding the chunks
+            location: Instead of a server, ":memory:" or a local path (tests)
+        """
+        from qdrant_client import QdrantClient
+
+        self.client = QdrantClient(url=url, api_key=api_key, location=location)
+        self.collection = collection
+        self._collection_ready = False
+
+    @classmethod
+    def from_env(cls) -> "QdrantVectorStore":
+        """Build the store from QDRANT_* settings."""
+        host = os.getenv("QDRANT_HOST", "localhost")
+        port = int(os.getenv("QDRANT_PORT", 6333))
+        return cls(
+            url=f"http://{host}:{port}",
+            api_key=os.getenv("QDRANT_API_KEY") or None,
+            collection=os.getenv("QDRANT_COLLECTION", "kb_chunks")
+        )
+
+    @staticmethod
+    def point_id(document_id: str, chunk_index: int) -> str:
+        """Stable point id for a chunk."""
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{document_id}:{chunk_index}"))
+
+    def _ensure_collection(self, dimensions: int):
+        """Create the collection and its payload indexes on first write."""
+        from qdrant_client import models
+
+        if self._collection_ready:
+            return
+        if not self.client.collection_exists(self.collection):
+            self.client.create_collection(
+                self.collection,
+                vectors_config=models.VectorParams(size=dimensions, distance=models.Distance.COSINE)
+            )
+            for key in ("document_id", "filename"):
+                self.client.create_payload_index(
+                    self.collection, key, field_schema=models.PayloadSchemaType.KEYWORD
+                )
+        self._collection_ready = True
+
+    def _filter(self, filters: Optional[Dict]):
+        from qdrant_client import models
+
+        if not filters:
+            return None
+
+        conditions = []
+        for key, value in filters.items():
+            if key not in ("document_id", "filename"):
+                raise ValueError(f"Unsupported filter: {key}")
+            conditions.append(models.FieldCondition(
+                key=key, match=models.MatchAny(any=[str(v) for v in _as_list(value)])
+            ))
+        return models.Filter(must=conditions)
+
+    def upsert_batch(self, records: List[ChunkRecord]):
+        from qdrant_client import models
+
+        points = [
+            models.PointStruct(
+                id=self.point_id(record.document_id, record.chunk_index),
+                vector=list(record.embedding),
+                payload={
+                    "document_id": str(record.document_id),
+                    "chunk_index": record.chunk_index,
+                    "content": record.content,
+                    "metadata": record.metadata,
+                    "title": record.title,
+                    "filename": record.filename
+                }
+            )
+            for record in records
+            if record.embedding is not None
+        ]
+
+        # A chunk that lost its embedding must not keep serving its old vector
+        missing = [
+            self.point_id(record.document_id, record.chunk_index)
+            for record in records
+            if record.embedding is None
+        ]
+        if missing and self.client.collection_exists(self.collection):
+            self.client.delete(
+                self.collection, points_selector=models.PointIdsList(points=missing), wait=True
+            )
+
+        if not points:
+            return
+
+        self._ensure_collection(len(points[0].vector))
+        self.client.upsert(self.collection, points=points, wait=True)
+
+    def delete_document(self, document_id: str):
+        from qdrant_client import models
+
+        if not self.client.collection_exists(self.collection):
+            return
+        self.client.delete(
+            self.collection,
+            points_selector=models.FilterSelector(filter=self._filter({"document_id": document_id})),
+            wait=True
+        )
+
+    def delete_chunks_from(self, document_id: str, chunk_index: int):
+        from qdrant_client import models
+
+        if not self.client.collection_exists(self.collection):
+            return
+        condition = self._filter({"document_id": document_id})
+        condition.must.append(models.FieldCondition(key="chunk_index", range=models.Range(gte=chunk_index)))
+        self.client.delete(
+            self.collection,
+            points_selector=models.FilterSelector(filter=condition),
+            wait=True
+        )
+
+    def get_chunk_embeddings(self, document_id: str) -> Dict[str, List[float]]:
+        if not self.client.collection_exists(self.collection):
+            return {}
+
+        embeddings = {}
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                self.collection,
+                scroll_filter=self._filter({"document_id": document_id}),
+                with_payload=True,
+                with_vectors=True,
+                limit=256,
+                offset=offset
+            )
+            for point in points:
+                content_hash = (point.payload.get("metadata") or {}).get("content_hash")
+                if content_hash:
+                    embeddings[content_hash] = list(point.vector)
+            if offset is None:
+                return embeddings
+
+    def search_filtered(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict] = None,
+        query_text: Optional[str] = None
+    ) -> List[Dict]:
+        response = self.client.query_points(
+            self.collection,
+            query=list(query_embedding),
+            query_filter=self._filter(filters),
+            limit=top_k,
+            with_payload=True
+        )
+        return [
+            {
+                "content": point.payload["content"],
+                "chunk_index": point.payload["chunk_index"],
+                "metadata": point.payload.get("metadata") or {},
+                "document_id": point.payload["document_id"],
+                "title": point.payload.get("title", ""),
+                "filename": point.payload.get("filename", ""),
+                "similarity": point.score
+            }
+            for point in response.points
+        ]
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Writable in-process store with exact search.
+
+    Local stand-in for pgvector/Qdrant: useful for tests, benchmarks and
+    running the indexer without any database-side vector engine.
+    """
+
+    name = "memory"
+
+    def __init__(self):
+        self._records: Dict[tuple, ChunkRecord] = {}
+        self._index: Optional[InMemoryVectorIndex] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def upsert_batch(self, records: List[ChunkRecord]):
+        with self._lock:
+            for record in records:
+                self._records[(str(record.document_id), record.chunk_index)] = record
+            self._index = None
+
+    def delete_document(self, document_id: str):
+        with self._lock:
+            for key in [key for key in self._records if key[0] == str(document_id)]:
+                del self._records[key]
+            self._index = None
+
+    def delete_chunks_from(self, document_id: str, chunk_index: int):
+        with self._lock:
+            for key in [
+                key for key in self._records
+                if key[0] == str(document_id) and key[1] >= chunk_index
+            ]:
+                del self._records[key]
+            self._index = None
+
+    def get_chunk_embeddings(self, document_id: str) -> Dict[str, List[float]]:
+        with self._lock:
+            return {
+                record.metadata["content_hash"]: record.embedding
+                for key, record in self._records.items()
+                if key[0] == str(document_id)
+                and record.embedding is not None
+                and "content_hash" in record.metadata
+            }
+
+    def _get_index(self) -> InMemoryVectorIndex:
+        """Rebuild the search matrix lazily after writes."""
+        with self._lock:
+            if self._index is None:
+                records = [r for r in self._records.values() if r.embedding is not None]
+                matrix = (
+                    normalize_rows(np.asarray([r.embedding for r in records], dtype=np.float32))
+                    if records else np.zeros((0, 0), dtype=np.float32)
+                )
+                chunks = [
+                    {
+                        "content": r.content,
+                        "chunk_index": r.chunk_index,
+                        "metadata": r.metadata,
+                        "document_id": str(r.document_id),
+                        "title": r.title,
+                        "filename": r.filename
+                    }
+                    for r in records
+                ]
+                self._index = InMemoryVectorIndex(matrix, chunks, uuid.uuid4().hex)
+            return self._index
+
+    def search_filtered(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict] = None,
+        query_text: Optional[str] = None
+    ) -> List[Dict]:
+        return self._get_index().search(query_embedding, top_k, filters)
+
+
+class SnapshotVectorStore(VectorStore):
+    """
+    Read-only view of the shared in-memory index (VECTOR_BACKEND=memory).
+
+    The index is built by the indexer from pgvector and refreshed by
+    get_vector_index(), so writes go to pgvector, never here.
+    """
+
+    name = "memory"
+
+    def upsert_batch(self, records: List[ChunkRecord]):
+        raise NotImplementedError("The snapshot store is read-only; index into pgvector")
+
+    def delete_document(self, document_id: str):
+        raise NotImplementedError("The snapshot store is read-only; index into pgvector")
+
+    def delete_chunks_from(self, document_id: str, chunk_index: int):
+        raise NotImplementedError("The snapshot store is read-only; index into pgvector")
+
+    def search_filtered(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Dict] = None,
+        query_text: Optional[str] = None
+    ) -> List[Dict]:
+        return get_vector_index().search(query_embedding, top_k, filters)
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Get the agent's vector store, chosen by VECTOR_BACKEND.
+
+    Options: pgvector (default), qdrant, memory (in-process snapshot index).
+    """
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                backend = os.getenv("VECTOR_BACKEND", "pgvector").lower()
+                if backend == "pgvector":
+                    from .db import db_connection
+                    _store = PgVectorStore(db_connection)
+                elif backend == "qdrant":
+                    _store = QdrantVectorStore.from_env()
+                elif backend == "memory":
+                    _store = SnapshotVectorStore()
+                else:
+                    raise ValueError(f"Unsupported vector backend: {backend}")
+                print(f"[VectorStore] Using {_store.name} backend")
+
+    return _store
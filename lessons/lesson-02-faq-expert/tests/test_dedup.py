@@ -0,0 +1,92 @@
+"""Tests for near-duplicate chunk detection."""
+
+from src.dedup import LSH_BANDS, ChunkDeduplicator, band_keys, jaccard, minhash, shingles
+
+FOOTER = (
+    "Still need help? Contact the TechFlow support team from the Help menu in the top right corner. "
+    "Our agents answer within one business day, and Enterprise customers can call the priority line "
+    "listed on the billing page of their account settings."
+)
+
+
+def test_shingles_ignore_case_and_punctuation():
+    assert shingles("Contact the support team!") == shingles("contact THE support, team")
+
+
+def test_jaccard():
+    assert jaccard({1, 2, 3}, {1, 2, 3}) == 1.0
+    assert jaccard({1, 2}, {2, 3}) == 1 / 3
+    assert jaccard(set(), {1}) == 0.0
+
+
+def test_band_keys_are_deterministic():
+    keys = band_keys(minhash(shingles(FOOTER)))
+
+    assert len(keys) == LSH_BANDS
+    assert keys == band_keys(minhash(shingles(FOOTER)))
+    assert keys != band_keys(minhash(shingles("Import contacts from a CSV file in three steps.")))
+
+
+def test_copy_in_another_document_is_a_duplicate():
+    dedup = ChunkDeduplicator(threshold=0.9)
+    canonical, keys = dedup.find(FOOTER, "kb-001.md")
+    assert canonical is None
+    dedup.add("hash-1", FOOTER, keys, "kb-001.md")
+
+    duplicate_of, _ = dedup.find(FOOTER, "kb-002.md")
+
+    assert duplicate_of == "hash-1"
+    assert dedup.duplicates == 1
+    assert dedup.bytes_saved == len(FOOTER.encode("utf-8"))
+
+
+def test_near_copy_above_threshold_is_a_duplicate():
+    dedup = ChunkDeduplicator(threshold=0.8)
+    _, keys = dedup.find(FOOTER, "kb-001.md")
+    dedup.add("hash-1", FOOTER, keys, "kb-001.md")
+
+    duplicate_of, _ = dedup.find(FOOTER.replace("one business day", "one working day"), "kb-002.md")
+
+    assert duplicate_of == "hash-1"
+
+
+def test_chunks_of_the_same_document_are_never_merged():
+    dedup = ChunkDeduplicator()
+    _, keys = dedup.find(FOOTER, "kb-001.md")
+    dedup.add("hash-1", FOOTER, keys, "kb-001.md")
+
+    assert dedup.find(FOOTER, "kb-001.md")[0] is None
+
+
+def test_different_text_is_not_a_duplicate():
+    dedup = ChunkDeduplicator()
+    _, keys = dedup.find(FOOTER, "kb-001.md")
+    dedup.add("hash-1", FOOTER, keys, "kb-001.md")
+
+    text = "To import contacts, open Contacts, choose Import and upload a CSV file with a header row."
+    assert dedup.find(text, "kb-002.md")[0] is None
+    assert dedup.duplicates == 0
+
+
+def test_stored_chunks_are_found_through_lookup():
+    calls = []
+
+    def lookup(keys, document_id):
+        calls.append((keys, document_id))
+        return [("stored-hash", "Something else entirely"), ("footer-hash", FOOTER)]
+
+    dedup = ChunkDeduplicator(lookup=lookup)
+    duplicate_of, keys = dedup.find(FOOTER, "kb-002.md", document_id="doc-2")
+
+    assert duplicate_of == "footer-hash"
+    assert calls == [(keys, "doc-2")]
+
+
+def test_chunk_without_words_is_never_a_duplicate():
+    # The markdown chunker emits bare horizontal rules as chunks
+    dedup = ChunkDeduplicator()
+
+    assert dedup.find("---", "kb-001.md") == (None, [])
+    dedup.add("rule-hash", "---", [], "kb-001.md")
+    assert dedup.find("---", "kb-002.md") == (None, [])
+    assert dedup.duplicates == 0
@@ -0,0 +1,225 @@
+"""Tests for the query embedding cache and the indexer's persistent embedding cache."""
+
+from array import array
+import pytest
+from src import embedding_cache, persistent_cache
+from src.embedding_cache import EmbeddingCache, LRUCache, cache_key
+from src.persistent_cache import PersistentEmbeddingCache, text_hash
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(embedding_cache.time, "monotonic", fake.monotonic)
+    return fake
+
+
+class FakeRedis:
+    """Stores raw bytes like Redis; can be switched off to simulate an outage."""
+
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def get(self, key):
+        if self.down:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        if self.down:
+            raise ConnectionError("redis down")
+        self.data[key] = value
+
+
+def counting(vector):
+    calls = []
+
+    def compute(text):
+        calls.append(text)
+        return vector
+
+    return compute, calls
+
+
+def test_keys_ignore_case_and_whitespace_but_not_the_model():
+    assert cache_key("github", "m", "  How do I  Export?") == cache_key("github", "m", "how do i export?")
+    assert cache_key("github", "m", "export") != cache_key("github", "other", "export")
+    assert cache_key("github", "m", "export") != cache_key("ollama", "m", "export")
+
+
+def test_lru_evicts_the_least_recently_used_entry(clock):
+    cache = LRUCache(max_size=2, ttl=60)
+    cache.set("a", [1.0])
+    cache.set("b", [2.0])
+    cache.get("a")
+
+    cache.set("c", [3.0])
+
+    assert cache.get("a") == [1.0]
+    assert cache.get("b") is None
+    assert len(cache) == 2
+
+
+def test_lru_entries_expire_after_the_ttl(clock):
+    cache = LRUCache(max_size=10, ttl=60)
+    cache.set("a", [1.0])
+
+    clock.now += 59
+    assert cache.get("a") == [1.0]
+    clock.now += 2
+    assert cache.get("a") is None
+
+
+def test_local_hit_skips_redis_and_the_provider(clock):
+    redis = FakeRedis()
+    cache = EmbeddingCache(max_size=10, ttl=60, redis_client=redis)
+    compute, calls = counting([0.5, 0.25])
+
+    assert cache.get_or_compute("github", "m", "export", compute) == [0.5, 0.25]
+    assert cache.get_or_compute("github", "m", " Export ", compute) == [0.5, 0.25]
+
+    assert calls == ["export"]
+    assert cache.get_stats()["local_hits"] == 1
+    assert cache.get_stats()["hit_rate"] == 0.5
+
+
+def test_redis_hit_fills_the_local_tier(clock):
+    redis = FakeRedis()
+    redis.data[cache_key("github", "m", "export")] = array("f", [0.5, 0.25]).tobytes()
+    cache = EmbeddingCache(max_size=10, ttl=60, redis_client=redis)
+    compute, calls = counting([9.0, 9.0])
+
+    assert cache.get_or_compute("github", "m", "export", compute) == [0.5, 0.25]
+    redis.data.clear()
+    assert cache.get_or_compute("github", "m", "export", compute) == [0.5, 0.25]
+
+    assert calls == []
+    assert cache.stats["redis_hits"] == cache.stats["local_hits"] == 1
+
+
+def test_redis_outage_falls_back_to_local_and_retries_after_cooldown(clock):
+    redis = FakeRedis()
+    redis.down = True
+    cache = EmbeddingCache(max_size=10, ttl=600, redis_client=redis, redis_retry_after=30)
+    compute, calls = counting([1.0])
+
+    assert cache.get_or_compute("github", "m", "a", compute) == [1.0]
+    assert cache.get_or_compute("github", "m", "b", compute) == [1.0]
+    # One error opens the cooldown; the second miss doesn't touch Redis
+    assert cache.stats["redis_errors"] == 1
+
+    redis.down = False
+    clock.now += 31
+    cache.get_or_compute("github", "m", "c", compute)
+
+    assert calls == ["a", "b", "c"]
+    assert list(redis.data) == [cache_key("github", "m", "c")]
+
+
+def test_cache_works_without_redis(clock):
+    cache = EmbeddingCache(max_size=10, ttl=60)
+    compute, calls = counting([1.0])
+
+    cache.get_or_compute("github", "m", "a", compute)
+    cache.get_or_compute("github", "m", "a", compute)
+
+    assert calls == ["a"]
+    assert cache.get_stats()["redis_enabled"] is False
+
+
+class FakeVector:
+    """What pgvector hands back: a numpy-like value with tolist()."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def tolist(self):
+        return list(self.values)
+
+
+class FakeTable:
+    """kb_embedding_cache rows keyed by (provider, model, dimensions, text_hash)."""
+
+    def __init__(self):
+        self.rows = {}
+        self.lookups = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, table):
+        self.table = table
+        self.result = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        provider, model, dimensions, hashes = params
+        self.table.lookups.append(hashes)
+        self.result = [
+            (key[3], FakeVector(value)) for key, value in self.table.rows.items()
+            if key[:3] == (provider, model, dimensions) and key[3] in hashes
+        ]
+
+    def fetchall(self):
+        return self.result
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = FakeTable()
+
+    def execute_values(cur, sql, rows):
+        for provider, model, dimensions, key, embedding in rows:
+            table.rows[(provider, model, dimensions, key)] = embedding.tolist()
+
+    monkeypatch.setattr(persistent_cache, "execute_values", execute_values)
+    return table
+
+
+def test_persistent_cache_round_trips_vectors(table):
+    cache = PersistentEmbeddingCache(table, "local", "hash", 3)
+
+    cache.put_many(["a", "b", "c"], [[1.0, 0.0, 0.0], None, [0.0, 1.0, 0.0]])
+    found = cache.get_many(["c", "b", "a"])
+
+    assert found == [[0.0, 1.0, 0.0], None, [1.0, 0.0, 0.0]]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_persistent_cache_looks_up_repeated_texts_once(table):
+    cache = PersistentEmbeddingCache(table, "local", "hash", 3)
+    cache.put_many(["faq"], [[1.0, 2.0, 3.0]])
+
+    assert cache.get_many(["faq", "faq", "other"]) == [pytest.approx([1.0, 2.0, 3.0])] * 2 + [None]
+    assert sorted(table.lookups[-1]) == sorted({text_hash("faq"), text_hash("other")})
+    assert cache.get_many([]) == []
+
+
+def test_persistent_cache_is_keyed_by_model_and_dimensions(table):
+    PersistentEmbeddingCache(table, "local", "hash", 3).put_many(["a"], [[1.0, 2.0, 3.0]])
+
+    assert PersistentEmbeddingCache(table, "local", "other", 3).get_many(["a"]) == [None]
+    assert PersistentEmbeddingCache(table, "local", "hash", 2).get_many(["a"]) == [None]
+    assert PersistentEmbeddingCache(table, "github", "hash", 3).get_many(["a"]) == [None]
+
+
+def test_persistent_cache_keys_the_exact_text():
+    # Unlike query keys, indexed text isn't normalized: whitespace changes the chunk
+    assert text_hash("Export data") != text_hash("export  data")
+    assert len(text_hash("Export data")) == 64
@@ -0,0 +1,144 @@
+"""Tests for embedding batching and the offline embedding client."""
+
+import threading
+import types
+import numpy as np
+import pytest
+from src.embeddings import LocalEmbeddingClient, batch_texts
+from src.index_metrics import IndexMetrics
+from src.indexer import DocumentIndexer
+
+
+def text_of(tokens: int) -> str:
+    """Text that estimate_tokens counts as `tokens` tokens."""
+    return "x" * (4 * tokens)
+
+
+def test_batches_hold_at_most_batch_size_texts():
+    texts = [text_of(1)] * 7
+
+    assert batch_texts(texts, batch_size=3, token_budget=100) == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batches_stay_within_the_token_budget():
+    texts = [text_of(tokens) for tokens in (4, 4, 3, 6, 1, 9)]
+
+    batches = batch_texts(texts, batch_size=10, token_budget=10)
+
+    assert batches == [[0, 1], [2, 3, 4], [5]]
+    assert [sum(len(texts[i]) // 4 for i in batch) for batch in batches] == [8, 10, 9]
+
+
+def test_a_text_over_the_budget_gets_a_batch_of_its_own():
+    texts = [text_of(2), text_of(50), text_of(2)]
+
+    assert batch_texts(texts, batch_size=10, token_budget=10) == [[0], [1], [2]]
+
+
+def test_batches_cover_every_text_once_in_order():
+    texts = [text_of(tokens) for tokens in np.random.default_rng(0).integers(1, 40, size=200)]
+
+    batches = batch_texts(texts, batch_size=16, token_budget=100)
+
+    assert [i for batch in batches for i in batch] == list(range(200))
+    assert batch_texts([], batch_size=16, token_budget=100) == []
+
+
+class FakeEmbeddingCache:
+    """Persistent cache stand-in keyed by the exact text."""
+
+    def __init__(self, vectors):
+        self.vectors = dict(vectors)
+        self.stored = {}
+
+    def get_many(self, texts):
+        return [self.vectors.get(text) for text in texts]
+
+    def put_many(self, texts, embeddings):
+        self.stored.update((text, embedding) for text, embedding in zip(texts, embeddings) if embedding is not None)
+
+
+def fake_indexer(embed, cache=None, batch_size=2, concurrency=4):
+    """Just the attributes DocumentIndexer.get_embeddings uses."""
+    return types.SimpleNamespace(
+        embedding_cache=cache,
+        embedding_batch_size=batch_size,
+        embedding_batch_tokens=1000,
+        embedding_concurrency=concurrency,
+        metrics=IndexMetrics(),
+        embed_batch=embed
+    )
+
+
+def test_embeddings_come_back_in_text_order_whatever_order_batches_finish():
+    texts = [f"text {i}" for i in range(9)]
+    first_batch_may_finish = threading.Event()
+
+    def embed(batch):
+        # The first batch finishes last
+        if batch[0] == "text 0":
+            first_batch_may_finish.wait(timeout=5)
+        elif batch[0] == texts[-1]:
+            first_batch_may_finish.set()
+        return [[float(text.split()[1])] for text in batch]
+
+    embeddings = DocumentIndexer.get_embeddings(fake_indexer(embed), texts)
+
+    assert embeddings == [[float(i)] for i in range(9)]
+
+
+def test_cached_texts_are_not_sent_and_new_ones_are_stored():
+    texts = ["a", "b", "c", "d"]
+    cache = FakeEmbeddingCache({"b": [2.0], "d": [4.0]})
+    sent = []
+
+    def embed(batch):
+        sent.extend(batch)
+        return [[float(ord(text) - ord("a") + 1)] for text in batch]
+
+    embeddings = DocumentIndexer.get_embeddings(fake_indexer(embed, cache), texts)
+
+    assert embeddings == [[1.0], [2.0], [3.0], [4.0]]
+    assert sorted(sent) == ["a", "c"]
+    assert cache.stored == {"a": [1.0], "c": [3.0]}
+
+
+def test_a_failed_batch_leaves_only_its_texts_without_embeddings():
+    def embed(batch):
+        if "c" in batch:
+            raise RuntimeError("provider down")
+        return [[1.0] for _ in batch]
+
+    embeddings = DocumentIndexer.get_embeddings(fake_indexer(embed), ["a", "b", "c", "d", "e"])
+
+    assert embeddings == [[1.0], [1.0], None, None, [1.0]]
+
+
+def test_local_embeddings_are_deterministic_unit_vectors():
+    texts = ["How do I import contacts?", "Resetting your password", "CSV import limits"]
+
+    vectors = np.array(LocalEmbeddingClient(256).embed(texts))
+
+    assert vectors.shape == (3, 256)
+    assert np.linalg.norm(vectors, axis=1) == pytest.approx(np.ones(3), abs=1e-6)
+    # A fresh client (or another process) produces the same vectors
+    assert np.array_equal(vectors, np.array(LocalEmbeddingClient(256).embed(texts)))
+    assert LocalEmbeddingClient(256).embed_one(texts[0]) == pytest.approx(vectors[0].tolist())
+
+
+def test_local_embeddings_track_lexical_overlap():
+    query, related, unrelated = LocalEmbeddingClient().embed([
+        "import contacts from a CSV file",
+        "Importing contacts: upload a CSV file with one contact per row",
+        "Two-factor authentication protects your account"
+    ])
+
+    assert np.dot(query, related) > np.dot(query, unrelated)
+
+
+def test_text_without_words_embeds_as_zeros():
+    assert LocalEmbeddingClient(16).embed(["---", ""]) == [[0.0] * 16, [0.0] * 16]
+
+
+def test_local_model_name_includes_the_dimensions():
+    assert LocalEmbeddingClient(256).model != LocalEmbeddingClient(768).model
@@ -0,0 +1,87 @@
+"""Tests for resuming indexing runs."""
+
+import pytest
+from src.index_runs import IndexRun
+
+
+class FakeConnection:
+    """Answers IndexRun.start's queries: one unfinished run (or none), then new run ids."""
+
+    def __init__(self, unfinished=None):
+        self.unfinished = unfinished
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=()):
+        self.conn.statements.append(" ".join(sql.split()))
+        if "WHERE status = 'running'" in sql and sql.lstrip().startswith("SELECT"):
+            self.result = self.conn.unfinished
+        elif sql.startswith("INSERT"):
+            self.result = ("new-run",)
+
+    def fetchone(self):
+        return self.result
+
+
+def abandoned(conn):
+    return any(statement.startswith("UPDATE kb_index_runs SET status = 'abandoned'") for statement in conn.statements)
+
+
+def test_starts_a_new_run_when_none_is_unfinished():
+    conn = FakeConnection()
+
+    run = IndexRun.start(conn, full=True, embedding_model="local:hash")
+
+    assert (run.id, run.resumed, run.full) == ("new-run", False, True)
+
+
+def test_plain_run_resumes_in_the_interrupted_mode():
+    conn = FakeConnection(unfinished=("run-1", True, True, "local:hash"))
+
+    run = IndexRun.start(conn, full=False, embedding_model="local:hash")
+
+    assert (run.id, run.resumed, run.full, run.rebuild) == ("run-1", True, True, True)
+    assert not abandoned(conn)
+
+
+@pytest.mark.parametrize("flags, missing", [
+    ({"full": True}, "--full"),
+    ({"full": False, "rebuild": True}, "--rebuild"),
+])
+def test_requesting_a_mode_the_unfinished_run_lacks_is_refused(flags, missing):
+    conn = FakeConnection(unfinished=("run-1", False, False, "local:hash"))
+
+    with pytest.raises(ValueError, match=f"not started with {missing}.*--new-run"):
+        IndexRun.start(conn, embedding_model="local:hash", **{"full": False, **flags})
+    assert not abandoned(conn)
+
+
+def test_retry_failed_does_not_abandon_an_unfinished_rebuild():
+    conn = FakeConnection(unfinished=("run-1", False, True, "local:hash"))
+
+    with pytest.raises(ValueError, match="must complete before --retry-failed.*--new-run"):
+        IndexRun.start(conn, full=False, embedding_model="local:hash", retry_failed=True)
+    assert not abandoned(conn)
+
+
+def test_new_run_abandons_the_unfinished_one():
+    conn = FakeConnection(unfinished=("run-1", False, True, "local:hash"))
+
+    run = IndexRun.start(conn, full=False, embedding_model="local:hash", new_run=True, retry_failed=True)
+
+    assert (run.id, run.resumed) == ("new-run", False)
+    assert abandoned(conn)
@@ -0,0 +1,72 @@
+"""Tests for the native markdown chunker's token budget."""
+
+from pathlib import Path
+import pytest
+from src.markdown_chunker import MarkdownChunker
+from src.tokens import estimate_tokens
+
+KNOWLEDGE_BASE = Path(__file__).resolve().parent.parent / "knowledge-base"
+
+
+def words(count: int, start: int = 0) -> str:
+    return " ".join(f"word{i}" for i in range(start, start + count))
+
+
+def contextualized(chunker: MarkdownChunker, markdown: str):
+    return [chunker.contextualize(chunk) for chunk in chunker.chunk(markdown)]
+
+
+def test_small_sections_are_merged_into_one_chunk_per_section():
+    chunker = MarkdownChunker(max_tokens=512)
+    markdown = "# Guide\n\nIntro paragraph.\n\n## Setup\n\nFirst step.\n\nSecond step.\n"
+
+    chunks = chunker.chunk(markdown)
+
+    assert [(chunk.headings, chunk.text) for chunk in chunks] == [
+        (["Guide"], "Intro paragraph."),
+        (["Guide", "Setup"], "First step.\n\nSecond step.")
+    ]
+
+
+@pytest.mark.parametrize("max_tokens", [16, 32, 64, 128])
+def test_chunks_with_their_headings_fit_the_budget(max_tokens):
+    chunker = MarkdownChunker(max_tokens=max_tokens)
+    paragraphs = [words(n, start=100 * n) + "." for n in (3, 5, 8, 13, 21, 34, 55)]
+    markdown = "# Product\n\n## A rather long section heading\n\n" + "\n\n".join(paragraphs)
+
+    texts = contextualized(chunker, markdown)
+
+    assert len(texts) > 1
+    assert all(estimate_tokens(text) <= max_tokens for text in texts)
+
+
+def test_oversized_paragraphs_split_at_sentences_then_words():
+    chunker = MarkdownChunker(max_tokens=20)
+    sentences = [words(6, start=10 * i) + "." for i in range(4)]
+    markdown = " ".join(sentences) + "\n\n" + words(60, start=1000)
+
+    chunks = chunker.chunk(markdown)
+
+    # Sentence boundaries survive; the run-on paragraph is cut between words
+    assert chunks[0].text.startswith(sentences[0])
+    assert " ".join(chunk.text for chunk in chunks).split() == markdown.split()
+    assert all(estimate_tokens(chunk.text) <= 20 for chunk in chunks)
+
+
+def test_headings_inside_code_fences_are_ignored():
+    chunker = MarkdownChunker()
+    markdown = "# Setup\n\n```bash\n# install it\npip install flow\n```\n"
+
+    chunks = chunker.chunk(markdown)
+
+    assert len(chunks) == 1
+    assert chunks[0].headings == ["Setup"]
+    assert "# install it" in chunks[0].text
+
+
+def test_knowledge_base_chunks_fit_the_budget():
+    chunker = MarkdownChunker(max_tokens=256)
+
+    for path in sorted(KNOWLEDGE_BASE.glob("*.md")):
+        for text in contextualized(chunker, path.read_text(encoding="utf-8")):
+            assert estimate_tokens(text) <= 256, path.name
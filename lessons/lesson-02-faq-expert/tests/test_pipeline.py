@@ -0,0 +1,49 @@
+"""Tests for the indexer's staged pipeline."""
+
+import threading
+import time
+import pytest
+from src.pipeline import run_pipeline
+
+
+def pipeline_threads():
+    return [thread for thread in threading.enumerate() if thread.daemon and thread.is_alive()]
+
+
+def test_items_flow_through_stages_in_order():
+    stats = {}
+    results = list(run_pipeline(range(20), [("double", lambda x: x * 2), ("inc", lambda x: x + 1)], 2, stats))
+
+    assert results == [x * 2 + 1 for x in range(20)]
+    assert stats["source"].items == stats["double"].items == stats["inc"].items == 20
+
+
+def test_stage_error_is_raised_to_consumer():
+    def fail(x):
+        raise ValueError("boom")
+
+    with pytest.raises(RuntimeError, match="'fail' failed: boom"):
+        list(run_pipeline(range(3), [("fail", fail)], 2, {}))
+
+
+def test_consumer_stopping_early_stops_every_thread_and_closes_source():
+    closed = threading.Event()
+
+    def endless():
+        try:
+            i = 0
+            while True:
+                yield i
+                i += 1
+        finally:
+            closed.set()
+
+    before = set(pipeline_threads())
+    items = run_pipeline(endless(), [("slow", lambda x: (time.sleep(0.01), x)[1])], 1, {})
+    for item in items:
+        if item == 3:
+            break
+    items.close()
+
+    assert closed.is_set()
+    assert set(pipeline_threads()) <= before
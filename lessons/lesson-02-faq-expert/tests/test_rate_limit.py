@@ -0,0 +1,149 @@
+"""Tests for embedding rate limits and retries."""
+
+import time
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+import pytest
+from src import rate_limit
+from src.rate_limit import TokenBucket, call_with_retries, is_retryable, retry_after_seconds
+
+
+class FakeClock:
+    """Stands in for time.monotonic / time.sleep so waits take no real time."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limit.time, "sleep", fake.sleep)
+    return fake
+
+
+class ApiError(Exception):
+    def __init__(self, status_code=None, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+class APIConnectionError(Exception):
+    """Named like the openai client's connection error, which carries no status."""
+
+
+def test_bucket_allows_a_burst_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=60)
+
+    for _ in range(60):
+        bucket.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_bucket_waits_for_the_refill(clock):
+    bucket = TokenBucket(per_minute=60)
+    bucket.acquire(60)
+
+    bucket.acquire(3)
+
+    # One token per second
+    assert sum(clock.sleeps) == pytest.approx(3.0)
+
+
+def test_bucket_caps_requests_larger_than_capacity(clock):
+    bucket = TokenBucket(per_minute=10)
+    bucket.acquire(10)
+
+    bucket.acquire(1000)
+
+    assert sum(clock.sleeps) == pytest.approx(60.0)
+
+
+@pytest.mark.parametrize("status, retryable", [
+    (429, True), (408, True), (500, True), (503, True), (599, True),
+    (400, False), (401, False), (404, False), (422, False),
+])
+def test_retryable_statuses(status, retryable):
+    assert is_retryable(ApiError(status)) is retryable
+
+
+def test_connection_errors_without_status_are_retryable():
+    assert is_retryable(APIConnectionError("reset"))
+    assert not is_retryable(ValueError("bad input"))
+
+
+@pytest.mark.parametrize("headers, expected", [
+    ({}, None),
+    ({"retry-after": "7"}, 7.0),
+    ({"retry-after-ms": "1500", "retry-after": "7"}, 1.5),
+    ({"retry-after-ms": "soon", "retry-after": "7"}, 7.0),
+    ({"retry-after": "-5"}, 0.0),
+    ({"retry-after": "not a date"}, None),
+    ({"retry-after": "Wed, 99 Foo 2015 07:28:00 GMT"}, None),
+])
+def test_retry_after_values(headers, expected):
+    assert retry_after_seconds(ApiError(429, headers)) == expected
+
+
+def test_retry_after_http_date():
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+
+    delay = retry_after_seconds(ApiError(429, {"retry-after": format_datetime(later, usegmt=True)}))
+
+    assert 28 <= delay <= 30
+
+
+def test_retry_after_date_without_timezone_is_gmt():
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    naive = later.strftime("%a, %d %b %Y %H:%M:%S")
+
+    assert 28 <= retry_after_seconds(ApiError(429, {"retry-after": naive})) <= 30
+
+
+def test_retry_after_date_in_the_past_is_zero():
+    assert retry_after_seconds(ApiError(429, {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"})) == 0.0
+
+
+def test_retries_until_success_honoring_retry_after(clock):
+    attempts = []
+
+    def flaky():
+        attempts.append(time.time())
+        if len(attempts) < 3:
+            raise ApiError(429, {"retry-after": "2"})
+        return "ok"
+
+    assert call_with_retries(flaky, max_retries=5) == "ok"
+    assert clock.sleeps == [2.0, 2.0]
+
+
+def test_malformed_retry_after_keeps_the_original_error(clock):
+    error = ApiError(503, {"retry-after": "garbage"})
+
+    def failing():
+        raise error
+
+    with pytest.raises(ApiError) as raised:
+        call_with_retries(failing, max_retries=2, base_delay=1.0)
+    assert raised.value is error
+    assert len(clock.sleeps) == 2
+
+
+def test_non_retryable_errors_are_raised_at_once(clock):
+    def failing():
+        raise ApiError(400)
+
+    with pytest.raises(ApiError):
+        call_with_retries(failing, max_retries=5)
+    assert clock.sleeps == []
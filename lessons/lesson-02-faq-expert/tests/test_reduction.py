@@ -0,0 +1,175 @@
+"""Tests for reduced-dimension embeddings."""
+
+import numpy as np
+import pytest
+from src.reduction import (
+    DEFAULT_REDUCED_DIMENSIONS,
+    PcaProjection,
+    TruncationReducer,
+    load_projection,
+    projection_id,
+    reduced_model_id,
+    reduction_config,
+    save_projection
+)
+
+
+def low_rank_embeddings(samples: int, dimensions: int, rank: int, seed: int = 0) -> np.ndarray:
+    """Embeddings that mostly vary along `rank` directions around a shared offset, like real ones."""
+    rng = np.random.default_rng(seed)
+    basis = rng.normal(size=(rank, dimensions))
+    offset = 2 * rng.normal(size=dimensions)
+    vectors = offset + rng.normal(size=(samples, rank)) @ basis + 0.01 * rng.normal(size=(samples, dimensions))
+    return vectors.astype(np.float32)
+
+
+def recall_at_k(full: np.ndarray, reduced: np.ndarray, k: int) -> float:
+    """Share of each vector's k nearest neighbours by cosine that reduced search still finds."""
+    def neighbours(vectors):
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        scores = vectors @ vectors.T
+        np.fill_diagonal(scores, -np.inf)
+        return np.argsort(-scores, axis=1)[:, :k]
+
+    truth, found = neighbours(full), neighbours(reduced)
+    return float(np.mean([len(set(t) & set(f)) / k for t, f in zip(truth, found)]))
+
+
+class FakeCursor:
+    """Keeps inserted projection rows and answers load_projection's query."""
+
+    def __init__(self):
+        self.rows = {}
+        self.result = None
+
+    def execute(self, sql, params=()):
+        if sql.lstrip().startswith("INSERT"):
+            projection, provider, model, source_dimensions, dimensions, components, variance, samples = params
+            self.rows[projection] = (provider, model, source_dimensions, dimensions, components, variance, samples)
+        elif sql.lstrip().startswith("SELECT"):
+            provider, model, dimensions, projection = params
+            row = self.rows.get(projection)
+            matches = row is not None and row[:2] == (provider, model) and row[3] == dimensions
+            self.result = row[2:] if matches else None
+
+    def fetchone(self):
+        return self.result
+
+
+def test_reduction_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("EMBEDDING_REDUCTION", raising=False)
+
+    assert reduction_config() == ("none", None)
+
+
+def test_default_dimensions_match_the_chunk_column(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_REDUCTION", "truncate")
+    monkeypatch.delenv("EMBEDDING_REDUCED_DIMENSIONS", raising=False)
+
+    # kb_chunks.embedding is vector(768)
+    assert reduction_config() == ("truncate", DEFAULT_REDUCED_DIMENSIONS) == ("truncate", 768)
+
+
+def test_unknown_reduction_is_rejected(monkeypatch):
+    monkeypatch.setenv("EMBEDDING_REDUCTION", "umap")
+
+    with pytest.raises(ValueError, match="Unsupported EMBEDDING_REDUCTION"):
+        reduction_config()
+
+
+def test_model_ids():
+    assert reduced_model_id("github:text-embedding-3-small", None) == "github:text-embedding-3-small"
+    assert reduced_model_id("github:text-embedding-3-small", TruncationReducer(256)) == (
+        "github:text-embedding-3-small+truncate-256"
+    )
+    assert projection_id("local:hash+pca-64-0a1b2c3d") == "pca-64-0a1b2c3d"
+    assert projection_id("github:text-embedding-3-small+truncate-256") is None
+    assert projection_id(None) is None
+
+
+def test_truncation_keeps_leading_dimensions_at_unit_length():
+    vectors = np.array([[3.0, 4.0, 12.0], [0.0, 0.0, 1.0]], dtype=np.float32)
+
+    reduced = TruncationReducer(2).reduce(vectors)
+
+    assert reduced[0] == pytest.approx([0.6, 0.8])
+    # A vector with nothing in the kept dimensions stays zero instead of NaN
+    assert reduced[1] == pytest.approx([0.0, 0.0])
+    assert TruncationReducer(2).reduce_one([3.0, 4.0, 12.0]) == pytest.approx([0.6, 0.8])
+
+
+def test_truncation_cannot_add_dimensions():
+    with pytest.raises(ValueError, match="Cannot truncate"):
+        TruncationReducer(8).reduce(np.ones((1, 4), dtype=np.float32))
+
+
+def test_pca_keeps_nearest_neighbours_of_low_rank_data():
+    vectors = low_rank_embeddings(300, 64, rank=8)
+
+    projection = PcaProjection.fit(vectors, 16)
+    reduced = projection.reduce(vectors)
+
+    assert reduced.shape == (300, 16)
+    assert np.linalg.norm(reduced, axis=1) == pytest.approx(np.ones(300), abs=1e-5)
+    assert projection.explained_variance > 0.99
+    assert projection.samples == 300
+    assert projection.fitted_components == 16
+
+    assert recall_at_k(vectors, reduced, 10) >= 0.9
+
+
+def test_full_rank_projection_keeps_every_neighbour():
+    # Fewer chunks than dimensions, like the shipped knowledge base: the
+    # projection keeps all of their variance, so it must keep their ranking too
+    vectors = np.random.default_rng(3).normal(loc=0.5, size=(120, 256)).astype(np.float32)
+
+    projection = PcaProjection.fit(vectors, 128)
+
+    assert projection.explained_variance == pytest.approx(1.0)
+    assert recall_at_k(vectors, projection.reduce(vectors), 10) == pytest.approx(1.0)
+
+
+def test_pca_with_fewer_samples_than_dimensions_pads_with_zeros():
+    vectors = low_rank_embeddings(10, 64, rank=8)
+
+    projection = PcaProjection.fit(vectors, 32)
+
+    assert projection.dimensions == 32
+    assert projection.fitted_components == 10
+    assert not projection.components[10:].any()
+    assert projection.reduce(vectors).shape == (10, 32)
+
+
+def test_pca_rejects_impossible_fits():
+    with pytest.raises(ValueError, match="Cannot project"):
+        PcaProjection.fit(np.ones((10, 4), dtype=np.float32), 8)
+    with pytest.raises(ValueError, match="at least 2 chunks"):
+        PcaProjection.fit(np.ones((1, 4), dtype=np.float32), 2)
+    with pytest.raises(ValueError, match="expects 64-dimension"):
+        PcaProjection.fit(low_rank_embeddings(20, 64, rank=4), 8).reduce(np.ones((1, 32), dtype=np.float32))
+
+
+def test_pca_id_identifies_the_parameters():
+    vectors = low_rank_embeddings(50, 32, rank=4)
+
+    first = PcaProjection.fit(vectors, 8)
+
+    assert first.id.startswith("pca-8-")
+    assert first.id == PcaProjection.fit(vectors, 8).id
+    assert first.id != PcaProjection.fit(low_rank_embeddings(50, 32, rank=4, seed=1), 8).id
+
+
+def test_projection_round_trips_through_the_database():
+    projection = PcaProjection.fit(low_rank_embeddings(50, 32, rank=4), 8)
+    cursor = FakeCursor()
+
+    save_projection(cursor, "github", "openai/text-embedding-3-small", projection, active=False)
+    # The API names GitHub Models' model without the publisher prefix
+    loaded = load_projection(cursor, "github", "text-embedding-3-small", 8, projection.id)
+
+    assert loaded.id == projection.id
+    assert loaded.samples == 50
+    assert loaded.explained_variance == pytest.approx(projection.explained_variance)
+    vectors = low_rank_embeddings(5, 32, rank=4, seed=2)
+    assert loaded.reduce(vectors) == pytest.approx(projection.reduce(vectors))
+    assert load_projection(cursor, "github", "text-embedding-3-small", 16, projection.id) is None
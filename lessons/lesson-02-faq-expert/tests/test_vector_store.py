@@ -0,0 +1,122 @@
+"""
+Contract tests for the writable vector stores.
+
+Runs the same upsert / search / filtered search / delete checks against the
+in-process store and Qdrant's local mode, so both behave like pgvector for
+the indexer and the agent. Run with: python -m pytest tests
+"""
+
+import uuid
+import pytest
+from src.vector_store import ChunkRecord, InMemoryVectorStore, QdrantVectorStore
+
+DOC_A = str(uuid.uuid4())
+DOC_B = str(uuid.uuid4())
+
+
+def record(document_id: str, chunk_index: int, embedding, filename: str, content_hash: str = None) -> ChunkRecord:
+    return ChunkRecord(
+        document_id=document_id,
+        chunk_index=chunk_index,
+        content=f"{filename} chunk {chunk_index}",
+        embedding=embedding,
+        metadata={"content_hash": content_hash} if content_hash else {},
+        title=filename.removesuffix(".md"),
+        filename=filename
+    )
+
+
+@pytest.fixture(params=["memory", "qdrant"])
+def store(request):
+    if request.param == "memory":
+        return InMemoryVectorStore()
+    pytest.importorskip("qdrant_client")
+    return QdrantVectorStore(location=":memory:", collection=f"test_{uuid.uuid4().hex}")
+
+
+@pytest.fixture
+def filled(store):
+    store.upsert_batch([
+        record(DOC_A, 0, [1.0, 0.0, 0.0], "billing.md", "a0"),
+        record(DOC_A, 1, [0.7, 0.7, 0.0], "billing.md", "a1"),
+        record(DOC_A, 2, [0.0, 1.0, 0.0], "billing.md", "a2"),
+        record(DOC_B, 0, [0.9, 0.1, 0.0], "security.md", "b0"),
+        record(DOC_B, 1, [0.0, 0.0, 1.0], "security.md", "b1"),
+    ])
+    return store
+
+
+def positions(results):
+    return [(result["document_id"], result["chunk_index"]) for result in results]
+
+
+def test_search_returns_nearest_first(filled):
+    results = filled.search([1.0, 0.0, 0.0], top_k=3)
+
+    assert positions(results) == [(DOC_A, 0), (DOC_B, 0), (DOC_A, 1)]
+    assert results[0]["similarity"] == pytest.approx(1.0, abs=1e-5)
+    assert results[0]["similarity"] >= results[1]["similarity"] >= results[2]["similarity"]
+    assert results[0]["content"] == "billing.md chunk 0"
+    assert results[0]["title"] == "billing"
+    assert results[0]["filename"] == "billing.md"
+    assert results[0]["metadata"] == {"content_hash": "a0"}
+
+
+def test_search_is_limited_to_top_k(filled):
+    assert len(filled.search([1.0, 1.0, 1.0], top_k=2)) == 2
+    assert len(filled.search([1.0, 1.0, 1.0], top_k=10)) == 5
+
+
+@pytest.mark.parametrize("filters", [
+    {"document_id": DOC_B},
+    {"filename": "security.md"},
+    {"filename": ["security.md"]},
+])
+def test_filtered_search_only_returns_matching_chunks(filled, filters):
+    results = filled.search_filtered([1.0, 0.0, 0.0], top_k=5, filters=filters)
+
+    assert positions(results) == [(DOC_B, 0), (DOC_B, 1)]
+
+
+def test_filtered_search_accepts_several_values(filled):
+    results = filled.search_filtered([0.0, 0.0, 1.0], top_k=5, filters={"filename": ["billing.md", "security.md"]})
+
+    assert len(results) == 5
+    assert positions(results)[0] == (DOC_B, 1)
+
+
+def test_upsert_replaces_chunk_at_same_position(filled):
+    filled.upsert_batch([record(DOC_B, 1, [1.0, 0.0, 0.0], "security.md", "b1-edited")])
+
+    results = filled.search_filtered([1.0, 0.0, 0.0], top_k=5, filters={"document_id": DOC_B})
+    assert positions(results) == [(DOC_B, 1), (DOC_B, 0)]
+    assert results[0]["metadata"] == {"content_hash": "b1-edited"}
+    assert len(filled.search([1.0, 0.0, 0.0], top_k=10)) == 5
+
+
+def test_upsert_without_embedding_stops_serving_old_vector(filled):
+    filled.upsert_batch([record(DOC_A, 0, None, "billing.md")])
+
+    assert (DOC_A, 0) not in positions(filled.search([1.0, 0.0, 0.0], top_k=10))
+
+
+def test_delete_document_removes_all_its_chunks(filled):
+    filled.delete_document(DOC_A)
+
+    assert positions(filled.search([1.0, 0.0, 0.0], top_k=10)) == [(DOC_B, 0), (DOC_B, 1)]
+    assert filled.get_chunk_embeddings(DOC_A) == {}
+
+
+def test_delete_chunks_from_truncates_document(filled):
+    filled.delete_chunks_from(DOC_A, 1)
+
+    results = filled.search_filtered([0.0, 1.0, 0.0], top_k=10, filters={"document_id": DOC_A})
+    assert positions(results) == [(DOC_A, 0)]
+    assert len(filled.search([0.0, 1.0, 0.0], top_k=10)) == 3
+
+
+def test_get_chunk_embeddings_keyed_by_content_hash(filled):
+    embeddings = filled.get_chunk_embeddings(DOC_B)
+
+    assert set(embeddings) == {"b0", "b1"}
+    assert embeddings["b1"] == pytest.approx([0.0, 0.0, 1.0], abs=1e-5)
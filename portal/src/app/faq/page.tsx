@@ -61,6 +61,11 @@ export default function FAQPage() {
     setResponse(null);
 
     try {
+      if (aiEnabled) {
+        await streamAnswer(question.trim());
+        return;
+      }
+
       const res = await fetch('http://localhost:8002/ask', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
@@ -81,6 +86,53 @@ export default function FAQPage() {
     }
   };
 
+  // Render the answer incrementally from the /ask/stream Server-Sent Events
+  const streamAnswer = async (text: string) => {
+    const res = await fetch('http://localhost:8002/ask/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ question: text })
+    });
+
+    if (!res.ok || !res.body) {
+      throw new Error('Failed to get answer');
+    }
+
+    let current: FAQResponse = { question: text, answer: '', mode: 'ai-rag-tool', sources: [] };
+    setResponse(current);
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const messages = buffer.split('\n\n');
+      buffer = messages.pop() || '';
+
+      for (const message of messages) {
+        const event = message.match(/^event: (.*)$/m)?.[1];
+        const data = message.match(/^data: (.*)$/m)?.[1];
+        if (!event || !data) continue;
+
+        const payload = JSON.parse(data);
+        if (event === 'token') {
+          current = { ...current, answer: current.answer + payload.text };
+        } else if (event === 'search') {
+          current = { ...current, sources: [...(current.sources || []), ...payload.sources] };
+        } else if (event === 'metrics') {
+          current = { ...current, ...payload };
+        } else if (event === 'error') {
+          throw new Error(payload.detail);
+        }
+        setResponse(current);
+      }
+    }
+  };
+
   const sampleQuestions = [
     "How much does FlowCRM cost?",
     "How do I import contacts from a CSV file?",
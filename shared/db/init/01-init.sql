@@ -157,12 +157,80 @@ CREATE TABLE IF NOT EXISTS kb_chunks (
     document_id UUID NOT NULL REFERENCES kb_documents(id) ON DELETE CASCADE,
     chunk_index INTEGER NOT NULL,
     content TEXT NOT NULL,
-    embedding vector(768), -- Ollama nomic-embed-text embeddings are 768 dimensions
+    embedding vector(768), -- Ollama nomic-embed-text embeddings are 768 dimensions (EMBEDDING_REDUCED_DIMENSIONS, 768 by default, when EMBEDDING_REDUCTION is set; resize the column to store fewer)
     metadata JSONB,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     UNIQUE(document_id, chunk_index)
 );
 
+-- Semantic Answer Cache (Lesson 2)
+-- Untyped vector column: question embeddings follow whichever provider is configured.
+-- Without a fixed dimension there is no ANN index, so the table is kept small
+-- (ANSWER_CACHE_TTL expiry, ANSWER_CACHE_MAX_ENTRIES cap) and lookups scan it
+CREATE TABLE IF NOT EXISTS kb_answer_cache (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    question TEXT NOT NULL,
+    embedding vector NOT NULL,
+    embedding_model VARCHAR(255) NOT NULL,
+    answer TEXT NOT NULL,
+    sources JSONB NOT NULL,
+    search_queries JSONB,
+    cited_files TEXT[] NOT NULL DEFAULT '{}',
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP
+);
+
+-- Indexer Embedding Cache (Lesson 2)
+-- Content-addressed: reused across runs, renamed files and provider switches
+CREATE TABLE IF NOT EXISTS kb_embedding_cache (
+    provider VARCHAR(50) NOT NULL,
+    model VARCHAR(255) NOT NULL,
+    dimensions INTEGER NOT NULL,
+    text_hash CHAR(64) NOT NULL, -- sha256 of the contextualized chunk text
+    embedding vector NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (provider, model, dimensions, text_hash)
+);
+
+-- Embedding Dimensionality Reduction (Lesson 2, EMBEDDING_REDUCTION=pca)
+-- PCA projections fitted by the indexer; the active one is applied to queries
+CREATE TABLE IF NOT EXISTS kb_embedding_projections (
+    id VARCHAR(64) PRIMARY KEY, -- pca-<dimensions>-<digest of the parameters>
+    provider VARCHAR(50) NOT NULL,
+    model VARCHAR(255) NOT NULL,
+    source_dimensions INTEGER NOT NULL,
+    dimensions INTEGER NOT NULL,
+    components BYTEA NOT NULL, -- float32[dimensions][source_dimensions], applied to uncentered embeddings
+    explained_variance REAL, -- share of the embeddings' squared length kept
+    samples INTEGER,
+    active BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Indexing Runs and Per-Document Checkpoints (Lesson 2)
+CREATE TABLE IF NOT EXISTS kb_index_runs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    status VARCHAR(20) NOT NULL DEFAULT 'running', -- running, completed, abandoned
+    full_reindex BOOLEAN NOT NULL DEFAULT FALSE,
+    rebuild BOOLEAN NOT NULL DEFAULT FALSE, -- Built a new index generation (kb_chunks_next)
+    embedding_model VARCHAR(255),
+    summary JSONB,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS kb_index_run_documents (
+    run_id UUID NOT NULL REFERENCES kb_index_runs(id) ON DELETE CASCADE,
+    filepath VARCHAR(1000) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending', -- pending, embedded, committed, failed
+    file_hash CHAR(64),
+    error TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (run_id, filepath)
+);
+
 -- Create indexes for better performance
 CREATE INDEX idx_tickets_status ON support_tickets(status);
 CREATE INDEX idx_tickets_created ON support_tickets(created_at DESC);
@@ -173,9 +241,29 @@ CREATE INDEX idx_audit_agent ON agent_audit_log(agent_name, timestamp DESC);
 
 -- Indexes for knowledge base
 CREATE INDEX idx_kb_documents_filepath ON kb_documents(filepath);
+-- Index rebuilds (python -m src.indexer --rebuild) copy these definitions to
+-- the shadow table, keeping the names: idx_kb_chunks_* always belongs to the live table
 CREATE INDEX idx_kb_chunks_document ON kb_chunks(document_id);
 -- Vector similarity search index (using HNSW algorithm)
 CREATE INDEX idx_kb_chunks_embedding ON kb_chunks USING hnsw (embedding vector_cosine_ops);
+-- Lexical indexes for hybrid search (full-text and trigram word similarity)
+CREATE INDEX idx_kb_chunks_content_fts ON kb_chunks USING gin (to_tsvector('english', content));
+CREATE INDEX idx_kb_chunks_content_trgm ON kb_chunks USING gin (content gin_trgm_ops);
+-- Answer cache invalidation by cited file
+CREATE INDEX idx_kb_answer_cache_files ON kb_answer_cache USING gin (cited_files);
+-- Answer cache lookups (per model, within the TTL) and expiry
+CREATE INDEX idx_kb_answer_cache_model ON kb_answer_cache(embedding_model, created_at DESC);
+-- Embedding cache garbage collection
+CREATE INDEX idx_kb_embedding_cache_last_used ON kb_embedding_cache(last_used_at);
+CREATE INDEX idx_kb_chunks_content_hash ON kb_chunks ((metadata->>'content_hash'));
+-- Near-duplicate chunks (INDEXER_DEDUP): LSH band lookup and duplicate -> canonical references
+CREATE INDEX idx_kb_chunks_lsh ON kb_chunks USING gin ((metadata->'lsh'));
+CREATE INDEX idx_kb_chunks_duplicate_of ON kb_chunks ((metadata->>'duplicate_of'));
+-- At most one active PCA projection per embedding model
+CREATE UNIQUE INDEX idx_kb_embedding_projections_active ON kb_embedding_projections(provider, model) WHERE active;
+-- Resuming runs and finding quarantined documents
+CREATE INDEX idx_kb_index_runs_status ON kb_index_runs(status, started_at DESC);
+CREATE INDEX idx_kb_index_run_documents_filepath ON kb_index_run_documents(filepath, updated_at DESC);
 
 -- Success message
 DO $$